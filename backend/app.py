@@ -1,31 +1,47 @@
-from flask import Flask, render_template, jsonify, Response, request, send_from_directory
+import time
+STARTUP_STARTED = time.perf_counter()  # baseline for the startup-time report
+
+from flask import Flask, render_template, jsonify, Response, request, send_from_directory, send_file
 
+import atexit
+import functools
 import threading
-from io import StringIO, BytesIO
-import csv
-import time
 import logging
 import os
-from datetime import datetime
+import tempfile
 import webbrowser
 from flask_cors import CORS
-import matplotlib.pyplot as plt
 
 # Import tracking modules
-from mouse_tracker import MouseBehaviorTracker
-from window_tracker import WindowTracker
-from copy_tracker import CopyTracker
+from mouse_tracker import PynputMouseSource
+from window_tracker import Win32WindowSource
+from copy_tracker import PyperclipSource
 from network_lockdown import NetworkLockdown
-from peripheral_detector import PeripheralDetector
+from peripheral_detector import WmiPeripheralSource
 import face_detector
-from voice_detector import VoiceDetector
-from cheating_detector import CheatingDetector
-from camera_detector import CameraDetector
+from face_engine import FaceScoringEngine, decode_frame
+from session_registry import SessionRegistry, ExamSession, DEFAULT_SESSION, validate_session_id
+from event_bus import EventBus, RiskCoalescer
+from event_dispatcher import EventDispatcher
+from event_index import EventIndex, MAX_QUERY_PAGE
+from event_journal import EventJournal
+from risk_ledger import RiskLedger, RISK_TRACKERS
+from event_ingest import NotDurable, UnsupportedBatch, decode_batch, ingest_batch
+from csv_export import iter_log, merge_by_timestamp, stream_csv, gzip_chunks
+from detector_registry import DetectorRegistry
+from audio_capture import get_audio_capture
+from camera_broker import get_broker
+from trace_replay import TraceRecorder, TraceReplayer
 
 # Configure paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIST = os.path.abspath(os.path.join(BASE_DIR, '../frontend/dist'))
 
+# Heavy detectors (sklearn, torch, OpenCV cascades, PyAudio) load lazily: on first use
+# or on the warm-up thread started in __main__. See /api/health.
+detectors = DetectorRegistry()
+detectors.record_phase("app imports", time.perf_counter() - STARTUP_STARTED)
+
 # Initialize Flask app
 # Change this line in your Flask app initialization
 app = Flask(__name__,
@@ -47,70 +63,225 @@ if os.path.exists(FRONTEND_DIST):
     if os.path.exists(os.path.join(FRONTEND_DIST, 'assets')):
         print("Files in assets:", os.listdir(os.path.join(FRONTEND_DIST, 'assets')))
 
+# Internal event bus feeding the /api/stream push channel
+event_bus = EventBus()
+RISK_PUSH_MAX_RATE = float(os.environ.get('RISK_PUSH_MAX_RATE', 2.0))  # risk updates per second
+
+# Every session's trackers post their events' risk to the session's RiskLedger, which
+# also keeps scores decaying with RISK_HALF_LIFE and summed over the last RISK_WINDOW.
+RISK_HALF_LIFE = float(os.environ.get('RISK_HALF_LIFE', 300))  # seconds
+RISK_WINDOW = float(os.environ.get('RISK_WINDOW', 60))  # seconds
+KICKOUT_RISK = 1000
+
+# Risk calculation
+def get_status(score):
+    if score >= 100: return "Direct kick out"
+    elif score >= 80: return "Warning-2"
+    elif score >= 70: return "Warning-1"
+    else: return "Safe"
+
+def session_risk_ledger(session_id):
+    session = sessions.get(session_id)
+    return session.risk if session is not None else None
+
 # Initialize cheating detector
-cheating_detector = CheatingDetector()
+cheating_detector = detectors.register('cheating_detector', 'cheating_detector',
+                                       lambda m: m.CheatingDetector(risk_ledger=session_risk_ledger))
+DETECTION_INTERVAL = float(os.environ.get('DETECTION_INTERVAL', 2.0))  # seconds between model scoring passes
 
 # Initialize camera detector
-camera_detector = CameraDetector()
-
-# Global state for exam status
-exam_status = {
-    'is_paused': False,
-    'pause_reason': None,
-    'last_activity': None
-}
-
-# Event callbacks
-def mouse_event_callback(event):
-    logging.info(f"Mouse Event: {event}")
-    # Add cheating detection for mouse events
-    detection_data = {
-        'mouse_events': [event],
-        'timestamp': datetime.now().isoformat()
-    }
-    detection_result = cheating_detector.detect_cheating(detection_data)
-    if detection_result['should_pause']:
-        exam_status['is_paused'] = True
-        exam_status['pause_reason'] = detection_result['reasons']
-        exam_status['last_activity'] = datetime.now().isoformat()
-
-def window_event_callback(event):
-    logging.info(f"Window Event: {event}")
-    # Add cheating detection for window events
-    detection_data = {
-        'window_events': [event],
-        'timestamp': datetime.now().isoformat()
-    }
-    detection_result = cheating_detector.detect_cheating(detection_data)
-    if detection_result['should_pause']:
-        exam_status['is_paused'] = True
-        exam_status['pause_reason'] = detection_result['reasons']
-        exam_status['last_activity'] = datetime.now().isoformat()
+camera_detector = detectors.register('camera_detector', 'camera_detector', lambda m: m.CameraDetector())
 
-def copy_event_callback(event):
-    logging.info(f"Copy Event: {event}")
+def pause_exam(session, reasons):
+    event_bus.publish('exam_status', session.pause(reasons), session.session_id)
 
-def peripheral_event_callback(event):
-    logging.info(f"Peripheral Event: {event}")
+# Event handling runs on dispatcher workers, off the tracker threads.
+def handle_tracker_event(item):
+    session_id, source, event = item
+    logging.info(f"[{session_id}] {source.capitalize()} Event: {event}")
+    # O(1) sliding-window feature update; the model scores on a fixed cadence below.
+    cheating_detector.observe(session_id, source, event)
 
-def voice_event_callback(event):
-    logging.info(f"Voice Event: {event}")
+def handle_detection_result(session_id, detection_result):
+    session = sessions.get(session_id)
+    if session is not None and detection_result['should_pause']:
+        pause_exam(session, detection_result['reasons'])
+
+event_dispatcher = EventDispatcher(handle_tracker_event, workers=2, queue_size=10000, name="TrackerEventDispatcher")
 
-# Initialize trackers
-mouse_tracker = MouseBehaviorTracker(speed_threshold=1500, angle_threshold=90, callback=mouse_event_callback)
-window_tracker = WindowTracker(poll_interval=0.5, callback=window_event_callback)
-copy_tracker = CopyTracker(poll_interval=1.0, callback=copy_event_callback)
+# Event callbacks: only enqueue, so the pynput hook and polling loops never block.
+def tracker_event_callback(session_id, source, event):
+    event_dispatcher.submit((session_id, source, event))
+
+def voice_event_callback(event):
+    event_dispatcher.submit((DEFAULT_SESSION, 'voice', event))
+
+# Session traces (see trace_replay.py): TRACE_RECORD=<file> records what the trackers'
+# sources observe, plus the microphone/camera with TRACE_RECORD_MEDIA=audio,video.
+# TRACE_REPLAY=<file> feeds a recorded trace through the pipeline instead of the live
+# sources, at TRACE_REPLAY_SPEED (1 = recorded pace, 0 = as fast as possible).
+TRACE_RECORD = os.environ.get('TRACE_RECORD')
+TRACE_RECORD_MEDIA = [m for m in os.environ.get('TRACE_RECORD_MEDIA', '').split(',') if m]
+TRACE_REPLAY = os.environ.get('TRACE_REPLAY')
+TRACE_REPLAY_SPEED = float(os.environ.get('TRACE_REPLAY_SPEED', 1.0))
+trace_recorder = TraceRecorder() if TRACE_RECORD else None
+
+def live_source(source):
+    return trace_recorder.wrap(source) if trace_recorder is not None else source
+
+# Exam state is journaled to JOURNAL_DIR (backend/journal when run as a script) and
+# recovered from it on startup, so a crash or a reload doesn't lose a running exam.
+# JOURNAL_DIR= (empty) turns journaling off. The reloader's watcher process, which only
+# restarts the server, leaves the journal to the server process.
+USE_RELOADER = not (TRACE_RECORD or TRACE_REPLAY)
+JOURNAL_DIR = os.environ.get('JOURNAL_DIR', os.path.join(BASE_DIR, 'journal') if __name__ == '__main__' else '')
+JOURNAL_FSYNC = os.environ.get('JOURNAL_FSYNC', '1') != '0'
+JOURNAL_SNAPSHOT_INTERVAL = float(os.environ.get('JOURNAL_SNAPSHOT_INTERVAL', 300))  # seconds
+reloader_watcher = (__name__ == '__main__' and USE_RELOADER and os.environ.get('WERKZEUG_RUN_MAIN') != 'true')
+journal = None
+if JOURNAL_DIR and not reloader_watcher:
+    journal = EventJournal(JOURNAL_DIR, fsync=JOURNAL_FSYNC, snapshot_interval=JOURNAL_SNAPSHOT_INTERVAL).open()
+    atexit.register(journal.close)
+
+# One ExamSession per candidate, each with its own trackers; sessions are created through
+# /api/sessions. Session-scoped routes answer for the local session at their usual path
+# and for any session under /<prefix>/sessions/<session_id>/..., see session_route.
+SESSION_SHARDS = int(os.environ.get('SESSION_SHARDS', 16))
+
+def create_session(session_id, **kwargs):
+    ledger = RiskLedger(half_life=RISK_HALF_LIFE, window_seconds=RISK_WINDOW, classify=get_status)
+    session = ExamSession(session_id, callback=tracker_event_callback, risk_ledger=ledger, **kwargs)
+    if journal is not None:
+        session.attach_journal(journal)  # Restores what was recovered for the session
+    session.attach(event_bus)  # Every session's logs publish into the bus tagged with its ID.
+    return session
+
+sessions = SessionRegistry(create_session, shards=SESSION_SHARDS)
+
+# The candidate at this machine: live OS inputs, the camera and the microphone.
+local_session = sessions.create(
+    DEFAULT_SESSION,
+    sources={
+        'mouse': live_source(PynputMouseSource()),
+        'window': live_source(Win32WindowSource()),
+        'copy': live_source(PyperclipSource()),
+        'peripheral': live_source(WmiPeripheralSource())
+    },
+    face_session=face_detector.default_session,
+    voice_log=lambda: voice_detector.event_log,
+    camera_log=lambda: camera_detector.get_suspicious_events())
+if journal is not None:
+    # Sessions that were running when the process last stopped
+    for session_id in journal.recovered_sessions():
+        sessions.get_or_create(session_id)
 network_lockdown = NetworkLockdown(allowed_exe="C:\\Path\\to\\exam_browser.exe")
-peripheral_detector = PeripheralDetector(callback=peripheral_event_callback)
-voice_detector = VoiceDetector(callback=voice_event_callback, threshold=0.0002)
-voice_detector.calibrate_threshold()
 
-# Risk calculation
-def get_status(score):
-    if score >= 100: return "Direct kick out"
-    elif score >= 80: return "Warning-2"
-    elif score >= 70: return "Warning-1"
-    else: return "Safe"
+def create_voice_detector(module):
+    detector = module.VoiceDetector(callback=voice_event_callback, threshold=0.0002)
+    detector.calibrate_threshold()  # Samples ambient noise for a few seconds.
+    return detector
+
+voice_detector = detectors.register('voice_detector', 'voice_detector', create_voice_detector)
+face_model = detectors.register('face_model', 'face_detector', lambda m: m.get_mtcnn())
+# Frames sessions' agents upload (/api/face_frame) score in shared MTCNN batches; started on the first one.
+face_engine = FaceScoringEngine(detector=face_model, sessions=sessions)
+FACE_FRAME_TIMEOUT = float(os.environ.get('FACE_FRAME_TIMEOUT', 5.0))  # seconds an upload waits for its score
+graph_renderer = detectors.register('graph_renderer', 'graph_renderer',
+                                    lambda m: m.GraphRenderer(max_points=2000), warm=False)
+
+# Every session's events are also indexed in SQLite for post-exam queries (/api/events/query),
+# at EVENT_INDEX_PATH (backend/event_index.sqlite3 when run as a script; empty turns it off).
+EVENT_INDEX_PATH = os.environ.get('EVENT_INDEX_PATH',
+                                  os.path.join(BASE_DIR, 'event_index.sqlite3') if __name__ == '__main__' else '')
+
+def indexed_logs():
+    """(session_id, tracker, log) for every log the event index catches up from."""
+    for session in sessions:
+        for name, log in session.loaded_logs().items():
+            yield session.session_id, name, log
+    # The local session's detector-owned logs, without loading a detector for them.
+    if voice_detector.is_ready():
+        yield DEFAULT_SESSION, 'voice', voice_detector.event_log
+    if camera_detector.is_ready():
+        yield DEFAULT_SESSION, 'camera', camera_detector.suspicious_events
+    if cheating_detector.is_ready():
+        yield DEFAULT_SESSION, 'suspicious_activity', cheating_detector.suspicious_activities
+        for session_id, log in list(cheating_detector.session_activities.items()):
+            yield session_id, 'suspicious_activity', log
+
+event_index = None
+if EVENT_INDEX_PATH and not reloader_watcher:
+    event_index = EventIndex(EVENT_INDEX_PATH, bus=event_bus, sources=indexed_logs)
+    event_index.start()
+    atexit.register(event_index.close)
+
+# Lazy detectors attach their logs to the journal, the local session's risk ledger and the bus
+# once initialized; they belong to the local session.
+if journal is not None:
+    voice_detector.when_ready(lambda detector: journal.register(detector.event_log, DEFAULT_SESSION, 'voice'))
+    camera_detector.when_ready(
+        lambda detector: journal.register(detector.suspicious_events, DEFAULT_SESSION, 'camera'))
+# After the journal, so recovered events count too.
+voice_detector.when_ready(lambda detector: detector.event_log.attach_ledger(local_session.risk, 'voice'))
+camera_detector.when_ready(
+    lambda detector: detector.suspicious_events.attach_ledger(local_session.risk, 'camera'))
+voice_detector.when_ready(lambda detector: detector.event_log.attach(event_bus, 'voice', DEFAULT_SESSION))
+voice_detector.when_ready(lambda detector: detector.start())  # Continuous VAD
+camera_detector.when_ready(
+    lambda detector: detector.suspicious_events.attach(event_bus, 'camera', DEFAULT_SESSION))
+cheating_detector.when_ready(
+    lambda detector: detector.suspicious_activities.attach(event_bus, 'suspicious_activity', DEFAULT_SESSION))
+
+# Incremental event polling
+MAX_EVENT_PAGE = 1000
+
+# Graphs are rendered once per log change and downsampled past this many points
+MAX_GRAPH_POINTS = 10000
+
+def event_log_response(log):
+    """
+    Serve an EventLog to a polling client. Without `since` the whole log is returned as
+    a list, as before. With `since=<seq>` only newer events are returned, at most
+    `limit` (capped at MAX_EVENT_PAGE) per page, along with the cursor for the next
+    poll. Both forms carry an ETag so an unchanged log costs a 304.
+    """
+    since = request.args.get('since', type=int)
+    limit = min(request.args.get('limit', MAX_EVENT_PAGE, type=int), MAX_EVENT_PAGE)
+    etag = f"{log.generation}-{log.last_seq}-{since}-{limit}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif since is None:
+        response = jsonify(log.snapshot())
+    else:
+        events, next_cursor, has_more = log.since(since, max(limit, 1))
+        response = jsonify({
+            "events": events,
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        })
+    response.set_etag(etag, weak=True)
+    return response
+
+def session_route(rule, **options):
+    """
+    Register a per-session route twice: at `rule` for the local session, and under
+    /<prefix>/sessions/<session_id>/ for any session, e.g. /api/risk and
+    /api/sessions/seat-17/risk. The view is called with the ExamSession first; an
+    unknown session ID gets a 404.
+    """
+    prefix, rest = rule.lstrip('/').split('/', 1)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def scoped(session_id=DEFAULT_SESSION, **kwargs):
+            session = sessions.get(session_id)
+            if session is None:
+                return jsonify({'error': f"Unknown session {session_id!r}"}), 404
+            return view(session, **kwargs)
+        app.add_url_rule(rule, view_func=scoped, **options)
+        app.add_url_rule(f'/{prefix}/sessions/<session_id>/{rest}', view_func=scoped, **options)
+        return scoped
+    return decorator
 
 # Frontend routes - SPA handling
 @app.route('/')
@@ -136,52 +307,178 @@ def admin_dashboard():
 def video_feed():
     return Response(face_detector.gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/api/mouse_events')
-def api_mouse_events():
-    return jsonify(mouse_tracker.event_log)
-
-@app.route('/api/window_events')
-def api_window_events():
-    return jsonify(window_tracker.event_log)
-
-@app.route('/api/copy_events')
-def api_copy_events():
-    return jsonify(copy_tracker.event_log)
-
-@app.route('/api/peripheral_events')
-def api_peripheral_events():
-    return jsonify(peripheral_detector.event_log)
-
-@app.route('/api/face_risk')
-def api_face_risk():
+@app.route('/api/health')
+def api_health():
+    """Readiness of each lazily loaded detector plus the startup-time breakdown"""
+    health = detectors.health()
+    return jsonify(health), 200 if health['status'] == 'ready' else 503
+
+@app.route('/api/video_stats')
+def api_video_stats():
+    """Capture/inference/encode rates and dropped-frame counts for the video pipeline"""
+    return jsonify({**face_detector.get_pipeline_stats(), 'face_engine': face_engine.get_stats()})
+
+@app.route('/api/audio_stats')
+def api_audio_stats():
+    """Shared microphone capture: captured vs wall time, callback gaps and per-consumer lag"""
+    return jsonify(get_audio_capture().get_stats())
+
+@app.route('/api/dispatcher_stats')
+def api_dispatcher_stats():
+    """Queue depth, drop count and latency histograms of the tracker event dispatcher"""
+    return jsonify(event_dispatcher.get_stats())
+
+@app.route('/api/event_index_stats')
+def api_event_index_stats():
+    """Rows indexed, batch timing and backlog of the SQLite event index"""
+    if event_index is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **event_index.get_stats()})
+
+@app.route('/api/journal_stats')
+def api_journal_stats():
+    """Journal commits, bytes, snapshots and what the last startup recovered"""
+    if journal is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **journal.get_stats()})
+
+@session_route('/api/mouse_events')
+def api_mouse_events(session):
+    return event_log_response(session.log('mouse'))
+
+@session_route('/api/window_events')
+def api_window_events(session):
+    return event_log_response(session.log('window'))
+
+@session_route('/api/copy_events')
+def api_copy_events(session):
+    return event_log_response(session.log('copy'))
+
+@session_route('/api/peripheral_events')
+def api_peripheral_events(session):
+    return event_log_response(session.log('peripheral'))
+
+@session_route('/api/face_risk')
+def api_face_risk(session):
     return jsonify({
-        "face_risk": face_detector.eye_risk_score,
-        "face_events": face_detector.eye_risk_events,
-        "scoring_started": face_detector.scoring_started
+        "face_risk": session.face.risk_score,
+        "face_events": session.face.risk_events.snapshot(),
+        "scoring_started": session.face.scoring_started
     })
 
-@app.route('/api/risk')
-def api_risk():
-    risks = {
-        "mouse_risk": 0,
-        "window_risk": getattr(window_tracker, 'risk_score', 0),
-        "copy_risk": getattr(copy_tracker, 'risk_score', 0),
-        "peripheral_risk": getattr(peripheral_detector, 'risk_score', 0),
-        "face_risk": face_detector.eye_risk_score,
-        "voice_risk": getattr(voice_detector, 'risk_score', 0)
+@session_route('/api/face_events')
+def api_face_events(session):
+    return event_log_response(session.log('face'))
+
+@session_route('/api/face_frame', methods=['POST'])
+def api_face_frame(session):
+    """
+    One webcam frame (an encoded image, e.g. JPEG) from the agent on a candidate's
+    machine, scored into the session's face risk in MTCNN batches shared with the
+    other sessions; `t` is the capture time (Unix seconds, default now). Returns the
+    face boxes and eye points to draw, or a null overlay if there is nothing to draw
+    or a newer frame from the session replaced this one before it was scored.
+    """
+    try:
+        frame = decode_frame(request.get_data(cache=False))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    face_engine.start()
+    try:
+        overlay = face_engine.submit(session.session_id, frame, request.args.get('t', type=float)).result(
+            timeout=FACE_FRAME_TIMEOUT)
+    except TimeoutError:
+        return jsonify({'error': 'Face scoring timed out'}), 503
+    except RuntimeError as e:  # MTCNN (torch) unavailable
+        return jsonify({'error': str(e)}), 501
+    return jsonify({'overlay': overlay, 'face_risk': session.face.risk_score})
+
+def compute_risk(session_id=DEFAULT_SESSION):
+    """Risk snapshot of one session, or None if there is no such session"""
+    session = sessions.get(session_id)
+    if session is None:
+        return None
+    # One read of the session's ledger: every score is from the same moment, and the
+    # statuses were classified as risk was posted.
+    risk = session.risk.snapshot()
+    totals, status = risk['totals'], risk['status']
+    return {
+        **{f"{name}_risk": (totals[name], status[name]) for name in RISK_TRACKERS},
+        "aggregate": (totals['aggregate'], status['aggregate']),
+        "kickout": totals['aggregate'] >= KICKOUT_RISK,
+        # Scores decaying with a RISK_HALF_LIFE half-life, and summed over the last RISK_WINDOW
+        "decayed": risk['decayed'],
+        "recent": risk['recent']
     }
-    
-    aggregate = sum(risks.values())
-    kickout_flag = aggregate >= 1000
-    
-    return jsonify({
-        **{k: (v, get_status(v)) for k, v in risks.items()},
-        "aggregate": (aggregate, get_status(aggregate)),
-        "kickout": kickout_flag
-    })
 
-@app.route('/api/register_copy', methods=['POST'])
-def register_copy():
+@session_route('/api/risk')
+def api_risk(session):
+    return jsonify(compute_risk(session.session_id))
+
+def sse_response(session_id):
+    """
+    Server-Sent Events push channel. `topics` is an optional comma-separated filter,
+    e.g. ?topics=risk,exam_status,camera; by default every topic is streamed.
+    """
+    topics = [t for t in request.args.get('topics', '').split(',') if t] or None
+    return Response(event_bus.sse_stream(topics, session_id=session_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@session_route('/api/stream')
+def api_stream(session):
+    return sse_response(session.session_id)
+
+# Session administration
+@app.route('/api/sessions', methods=['GET'])
+def list_sessions():
+    """Every exam session with its pause state and aggregate risk"""
+    summaries = []
+    for session in sessions:
+        risk = compute_risk(session.session_id)
+        if risk is None:
+            continue  # Removed meanwhile
+        summaries.append({
+            'session_id': session.session_id,
+            'created_at': session.created_at,
+            'exam_status': session.get_status(),
+            'aggregate': risk['aggregate'],
+            'kickout': risk['kickout']
+        })
+    summaries.sort(key=lambda summary: summary['created_at'])
+    return jsonify({'sessions': summaries, 'count': len(summaries)})
+
+@app.route('/api/sessions', methods=['POST'])
+def create_exam_session():
+    """Open a session for a candidate: {"session_id": "seat-17"}"""
+    session_id = (request.json or {}).get('session_id')
+    try:
+        validate_session_id(session_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        session = sessions.create(session_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'session_id': session.session_id}), 201
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def end_exam_session(session_id):
+    """End a candidate's session and drop its state"""
+    if session_id == DEFAULT_SESSION:
+        return jsonify({'success': False, 'error': 'The local session cannot be removed'}), 400
+    if sessions.remove(session_id) is None:
+        return jsonify({'success': False, 'error': f"Unknown session {session_id!r}"}), 404
+    if cheating_detector.is_ready():
+        cheating_detector.remove_session(session_id)
+    return jsonify({'success': True})
+
+@app.route('/api/sessions/stream')
+def api_sessions_stream():
+    """Every session's events in one SSE stream, each wrapped with its session_id"""
+    return sse_response(None)
+
+@session_route('/api/register_copy', methods=['POST'])
+def register_copy(session):
     data = request.json
     if data and 'content' in data:
         event = {
@@ -191,11 +488,72 @@ def register_copy():
             "word_count": len(data['content'].split()),
             "full_content": data['content']
         }
-        copy_tracker.event_log.append(event)
+        session.copy_tracker.event_log.append(event)
         logging.info(f"Registered copy event: {event}")
         return jsonify({"status": "success"}), 200
     return jsonify({"status": "error"}), 400
 
+def list_arg(name):
+    """Values of a query parameter given repeatedly and/or comma-separated"""
+    return [value.strip() for arg in request.args.getlist(name) for value in arg.split(',') if value.strip()]
+
+@session_route('/api/events/query')
+def query_events(session):
+    """
+    Indexed events of the session across trackers, oldest first, filtered by
+    start/end (Unix time), tracker and type (comma-separated), min_risk/max_risk and
+    min_duration/max_duration, e.g. ?tracker=window&min_duration=30 for every window
+    switch longer than 30 s. Pages of at most `limit` events; pass `cursor` from the
+    previous page's next_cursor to continue.
+    """
+    if event_index is None:
+        return jsonify({'error': 'The event index is disabled (EVENT_INDEX_PATH)'}), 503
+    filters = {}
+    for name in ('start', 'end', 'min_risk', 'max_risk', 'min_duration', 'max_duration'):
+        value = request.args.get(name)
+        if value is not None:
+            try:
+                filters[name] = float(value)
+            except ValueError:
+                return jsonify({'error': f"{name} must be a number"}), 400
+    try:
+        events, next_cursor, has_more = event_index.query(
+            session.session_id, trackers=list_arg('tracker'), event_types=list_arg('type'),
+            cursor=request.args.get('cursor'), limit=request.args.get('limit', MAX_QUERY_PAGE, type=int),
+            **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        "events": events,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
+
+@session_route('/api/ingest', methods=['POST'])
+def ingest(session):
+    """
+    Batched tracker input from the agent on a candidate's machine: NDJSON or msgpack
+    records, optionally gzip/zstd compressed (Content-Encoding), each numbered with
+    the agent's per-session seq. See event_ingest for the record kinds. Retried
+    records are skipped and out-of-order ones held until the gap fills; the response
+    carries "ack", the highest seq applied, for the agent to resend from. A 503 means
+    the journal could not get the batch on disk; the agent resends it.
+    """
+    try:
+        records = decode_batch(request.get_data(cache=False), request.content_type,
+                               request.headers.get('Content-Encoding'))
+    except UnsupportedBatch as e:
+        return jsonify({'error': str(e)}), 415
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(ingest_batch(session, records))
+    except NotDurable as e:
+        # Applied but not journaled: the agent resends, and the retry waits for the journal again.
+        return jsonify({'error': str(e)}), 503
+
 @app.route('/api/network_lockdown', methods=['GET'])
 def api_network_lockdown():
     state = request.args.get("state", "").lower()
@@ -215,6 +573,14 @@ def stop_video_endpoint():
 @app.route('/api/test_voice_detection', methods=['POST'])
 def test_voice_detection():
     try:
+        if voice_detector.is_running:
+            # Continuous VAD is already listening; report its state instead of recording.
+            status = voice_detector.get_status()
+            return jsonify({
+                "voice_detected": status["speaking"],
+                "recording_path": None,
+                "vad": status
+            })
         has_voice, recording_file = voice_detector.detect_voice()
         return jsonify({
             "voice_detected": has_voice,
@@ -224,19 +590,30 @@ def test_voice_detection():
         logging.error(f"Voice detection error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/voice_events')
-def voice_events():
-    return jsonify(voice_detector.event_log)
+@session_route('/api/voice_events')
+def voice_events(session):
+    return event_log_response(session.log('voice'))
 
 @app.route('/api/camera_status', methods=['GET'])
 def get_camera_status():
     """Get current camera detection status"""
     return jsonify(camera_detector.get_current_status())
 
-@app.route('/api/camera_events', methods=['GET'])
-def get_camera_events():
-    """Get all camera-based suspicious events"""
-    return jsonify(camera_detector.get_suspicious_events())
+@session_route('/api/camera_events', methods=['GET'])
+def get_camera_events(session):
+    """Get camera-based suspicious events (all, or newer than `since`)"""
+    return event_log_response(session.log('camera'))
+
+@app.route('/api/evidence/<evidence_id>', methods=['GET'])
+def get_evidence(evidence_id):
+    """Fetch the thumbnail referenced by a camera event's evidence_id"""
+    path = camera_detector.evidence_store.get_path(evidence_id)
+    if path is None or not os.path.exists(path):
+        return jsonify({'error': 'Evidence not found'}), 404
+    response = send_file(path, mimetype=camera_detector.evidence_store.mimetype)
+    # Content-addressed, so a given ID always maps to the same bytes.
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 @app.route('/api/start_camera', methods=['POST'])
 def start_camera():
@@ -270,16 +647,16 @@ def stop_camera():
             'error': str(e)
         }), 500
 
-@app.route('/api/cheating_detection', methods=['POST'])
-def cheating_detection():
+@session_route('/api/cheating_detection', methods=['POST'])
+def cheating_detection(session):
     """Endpoint for cheating detection"""
     try:
         data = request.json
-        detection_result = cheating_detector.detect_cheating(data)
+        detection_result = cheating_detector.detect_cheating(data, session.session_id)
         
-        # Get camera status
-        camera_status = camera_detector.get_current_status()
-        camera_events = camera_detector.get_suspicious_events()
+        # Get camera status (the camera is the local candidate's)
+        camera_status = camera_detector.get_current_status() if session is local_session else None
+        camera_events = session.log('camera')
         
         # Combine detection results
         combined_result = {
@@ -290,15 +667,13 @@ def cheating_detection():
         }
         
         if combined_result['should_pause']:
-            exam_status['is_paused'] = True
-            exam_status['pause_reason'] = combined_result['reasons']
-            exam_status['last_activity'] = datetime.now().isoformat()
+            pause_exam(session, combined_result['reasons'])
         
         return jsonify({
             'success': True,
             'detection_result': combined_result,
             'camera_status': camera_status,
-            'exam_status': exam_status
+            'exam_status': session.get_status()
         })
     except Exception as e:
         logging.error(f"Error in cheating detection: {str(e)}")
@@ -307,31 +682,31 @@ def cheating_detection():
             'error': str(e)
         }), 500
 
-@app.route('/api/exam_status', methods=['GET'])
-def get_exam_status():
+@session_route('/api/exam_status', methods=['GET'])
+def get_exam_status(session):
     """Get current exam status"""
-    return jsonify(exam_status)
+    return jsonify(session.get_status())
 
-@app.route('/api/resume_exam', methods=['POST'])
-def resume_exam():
+@session_route('/api/resume_exam', methods=['POST'])
+def resume_exam(session):
     """Resume the exam after admin approval"""
-    if not exam_status['is_paused']:
+    status = session.resume()
+    if status is None:
         return jsonify({
             'success': False,
             'message': 'Exam is not paused'
         }), 400
     
-    exam_status['is_paused'] = False
-    exam_status['pause_reason'] = None
+    event_bus.publish('exam_status', status, session.session_id)
     return jsonify({
         'success': True,
         'message': 'Exam resumed successfully'
     })
 
-@app.route('/api/suspicious_activities', methods=['GET'])
-def get_suspicious_activities():
-    """Get list of all suspicious activities"""
-    return jsonify(cheating_detector.get_suspicious_activities())
+@session_route('/api/suspicious_activities', methods=['GET'])
+def get_suspicious_activities(session):
+    """Get suspicious activities (all, or newer than `since`)"""
+    return event_log_response(cheating_detector.get_suspicious_activities(session.session_id))
 
 # Fallback route for SPA client-side routing
 # Replace the existing catch_all route with this simplified version
@@ -342,172 +717,144 @@ def catch_all(path):
 
 
 # CSV export endpoints
-@app.route('/download/mouse_csv')
-def download_mouse_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'speed', 'angle_diff', 'position'])
-    for event in mouse_tracker.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('event', ''),
-            event.get('speed', ''),
-            event.get('angle_diff', ''),
-            event.get('position', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=mouse_events.csv"})
-
-
-@app.route('/download/window_csv')
-def download_window_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'window', 'duration'])
-    for event in window_tracker.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('window', ''),
-            event.get('duration', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=window_events.csv"})
-
-@app.route('/download/copy_csv')
-def download_copy_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'content_preview', 'word_count', 'full_content'])
-    for event in copy_tracker.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('event', ''),
-            event.get('content_preview', ''),
-            event.get('word_count', ''),
-            event.get('full_content', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=copy_events.csv"})
-
-@app.route('/download/peripheral_csv')
-def download_peripheral_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'device'])
-    for event in peripheral_detector.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('device', event.get('Caption', 'Unknown'))
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=peripheral_events.csv"})
-
-@app.route('/download/face_csv')
-def download_face_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'risk', 'details'])
-    for event in face_detector.eye_risk_events:
-        details = ""
-        if event.get("faces_detected"):
-            details = f"Faces: {event['faces_detected']}"
-        elif event.get("duration"):
-            details = f"Duration: {event['duration']:.2f} s, intervals: {event.get('intervals','')}"
-        elif event.get("vertical_diff"):
-            details = f"Vertical diff: {event['vertical_diff']:.2f}"
-        cw.writerow([event.get('timestamp', ''), event.get('event', ''), event.get('risk', ''), details])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=face_events.csv"})
-
-@app.route('/download/voice_csv')
-def download_voice_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'duration', 'risk_score', 'recording_file'])
-    for event in voice_detector.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('event', ''),
-            event.get('duration', ''),
-            event.get('risk_score', ''),
-            event.get('recording_file', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=voice_events.csv"})
-
-@app.route('/download/graph_csv')
-def download_graph_csv():
-    data = []
-    for event in face_detector.eye_risk_events:
-        data.append({
-            "timestamp": event.get("timestamp", ""),
-            "risk": event.get("risk", ""),
-            "source": "face"
-        })
-    for event in voice_detector.event_log:
-        data.append({
-            "timestamp": event.get("timestamp", ""),
-            "risk": event.get("risk_score", ""),
-            "source": "voice"
-        })
-    data.sort(key=lambda x: x["timestamp"])
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["timestamp", "risk", "source"])
-    for item in data:
-        cw.writerow([item["timestamp"], item["risk"], item["source"]])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=graph_data.csv"})
+def csv_response(filename, header, rows):
+    """
+    Stream a CSV download row by row instead of building it in memory. The body is
+    gzip-encoded when the client accepts it (or asks with ?gzip=1).
+    """
+    chunks = stream_csv(header, rows)
+    headers = {"Content-Disposition": f"attachment;filename={filename}", "Vary": "Accept-Encoding"}
+    if request.accept_encodings['gzip'] or request.args.get('gzip', type=int):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(chunks, mimetype="text/csv", headers=headers)
+
+@session_route('/download/mouse_csv')
+def download_mouse_csv(session):
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('event', ''),
+        event.get('speed', ''),
+        event.get('angle_diff', ''),
+        event.get('position', '')
+    ] for event in iter_log(session.log('mouse')))
+    return csv_response("mouse_events.csv", ['timestamp', 'event', 'speed', 'angle_diff', 'position'], rows)
+
+
+@session_route('/download/window_csv')
+def download_window_csv(session):
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('window', ''),
+        event.get('duration', '')
+    ] for event in iter_log(session.log('window')))
+    return csv_response("window_events.csv", ['timestamp', 'window', 'duration'], rows)
+
+@session_route('/download/copy_csv')
+def download_copy_csv(session):
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('event', ''),
+        event.get('content_preview', ''),
+        event.get('word_count', ''),
+        event.get('full_content', '')
+    ] for event in iter_log(session.log('copy')))
+    return csv_response("copy_events.csv",
+                        ['timestamp', 'event', 'content_preview', 'word_count', 'full_content'], rows)
+
+@session_route('/download/peripheral_csv')
+def download_peripheral_csv(session):
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('device', event.get('Caption', 'Unknown'))
+    ] for event in iter_log(session.log('peripheral')))
+    return csv_response("peripheral_events.csv", ['timestamp', 'device'], rows)
+
+def face_csv_row(event):
+    details = ""
+    if event.get("faces_detected"):
+        details = f"Faces: {event['faces_detected']}"
+    elif event.get("duration"):
+        details = f"Duration: {event['duration']:.2f} s, intervals: {event.get('intervals','')}"
+    elif event.get("vertical_diff"):
+        details = f"Vertical diff: {event['vertical_diff']:.2f}"
+    return [event.get('timestamp', ''), event.get('event', ''), event.get('risk', ''), details]
+
+@session_route('/download/face_csv')
+def download_face_csv(session):
+    rows = (face_csv_row(event) for event in iter_log(session.log('face')))
+    return csv_response("face_events.csv", ['timestamp', 'event', 'risk', 'details'], rows)
+
+@session_route('/download/voice_csv')
+def download_voice_csv(session):
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('event', ''),
+        event.get('duration', ''),
+        event.get('risk_score', ''),
+        event.get('recording_file', '')
+    ] for event in iter_log(session.log('voice')))
+    return csv_response("voice_events.csv", ['timestamp', 'event', 'duration', 'risk_score', 'recording_file'], rows)
+
+@session_route('/download/graph_csv')
+def download_graph_csv(session):
+    # Both logs are appended in time order, so a k-way merge replaces the full sort.
+    face_rows = ([event.get("timestamp", ""), event.get("risk", ""), "face"]
+                 for event in iter_log(session.log('face')))
+    voice_rows = ([event.get("timestamp", ""), event.get("risk_score", ""), "voice"]
+                  for event in iter_log(session.log('voice')))
+    return csv_response("graph_data.csv", ["timestamp", "risk", "source"],
+                        merge_by_timestamp(face_rows, voice_rows))
+
+@session_route('/download/session_bundle')
+def download_session_bundle(session):
+    """Zip of typed columnar files (Parquet by default, ?format=arrow for Arrow IPC), one per tracker"""
+    from columnar_export import FORMATS as EXPORT_FORMATS, write_session_bundle  # pyarrow loads on first export
+    fmt = request.args.get('format', 'parquet')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format, expected one of {sorted(EXPORT_FORMATS)}"}), 400
+    session_id = session.session_id
+    bundle = tempfile.TemporaryFile()
+    try:
+        write_session_bundle(session.logs(), bundle, fmt, session_id)
+    except RuntimeError as e:
+        bundle.close()
+        return jsonify({'error': str(e)}), 501
+    bundle.seek(0)
+    return send_file(bundle, mimetype="application/zip", as_attachment=True,
+                     download_name=f"session_{session_id}_{fmt}.zip")
 
 # Visualization endpoints
-@app.route('/graph/<event_type>')
-def graph_event(event_type):
-    if event_type == 'mouse':
-        events = mouse_tracker.event_log
-    elif event_type == 'window':
-        events = window_tracker.event_log
-    elif event_type == 'copy':
-        events = copy_tracker.event_log
-    elif event_type == 'peripheral':
-        events = peripheral_detector.event_log
-    elif event_type == 'face':
-        events = face_detector.eye_risk_events
-    elif event_type == 'voice':
-        events = voice_detector.event_log
-    else:
-        return "Invalid event type", 400
+GRAPH_EVENT_TYPES = ('mouse', 'window', 'copy', 'peripheral', 'face', 'voice')
 
-    times = []
-    values = []
-    for event in events:
-        t = event.get('timestamp')
-        if t is not None:
-            times.append(t)
-            val = event.get('risk', 1)
-            values.append(val)
-    if not times:
-        return "No data available", 404
-
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.plot(times, values, marker='o', linestyle='-', color='cyan')
-    ax.set_xlabel('Timestamp')
-    ax.set_ylabel('Risk Value' if any('risk' in e for e in events) else 'Event Count')
-    ax.set_title(f'{event_type.capitalize()} Events Graph')
-    ax.grid(True)
-    fig.tight_layout()
-
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close(fig)
-    return Response(buf.getvalue(), mimetype='image/png')
+def graph_response(session, event_type, build):
+    """Look up the session's log for the event type and serve `build(log)` with a weak ETag on its last seq"""
+    if event_type not in GRAPH_EVENT_TYPES:
+        return "Invalid event type", 400
+    log = session.log(event_type)
+    etag = "-".join(map(str, graph_renderer.cache_key(event_type, log))) + f"-{request.query_string.decode()}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = build(log)
+    response.set_etag(etag, weak=True)
+    return response
+
+@session_route('/graph/<event_type>')
+def graph_event(session, event_type):
+    def build(log):
+        png = graph_renderer.render_png(event_type, log)
+        if png is None:
+            return Response("No data available", status=404)
+        return Response(png, mimetype='image/png')
+    return graph_response(session, event_type, build)
+
+@session_route('/api/graph/<event_type>')
+def api_graph_series(session, event_type):
+    """Downsampled (timestamp, value) series for client-side charts (?max_points=, capped)"""
+    max_points = min(request.args.get('max_points', graph_renderer.max_points, type=int), MAX_GRAPH_POINTS)
+    return graph_response(session, event_type,
+                          lambda log: jsonify(graph_renderer.series(event_type, log, max(max_points, 3))))
 
 # Kickout page
 @app.route('/kickout')
@@ -534,10 +881,42 @@ if __name__ == '__main__':
     # Auto-open browser
     threading.Thread(target=lambda: webbrowser.open("http://127.0.0.1:5000/"), daemon=True).start()
     
-    # Start all trackers
-    trackers = [mouse_tracker, window_tracker, copy_tracker, peripheral_detector]
-    for tracker in trackers:
-        threading.Thread(target=tracker.start, daemon=True).start()
+    # Start detection workers before the trackers that feed them
+    event_dispatcher.start()
+    cheating_detector.when_ready(
+        lambda detector: detector.start_scoring(interval=DETECTION_INTERVAL, on_result=handle_detection_result))
+
+    trace_replayer = None
+    if TRACE_REPLAY:
+        trace_replayer = TraceReplayer(TRACE_REPLAY, speed=TRACE_REPLAY_SPEED)
+        atexit.register(trace_replayer.cleanup)
+        # Recorded camera/microphone stand in for the devices before any detector opens them.
+        video_source = trace_replayer.video_capture_factory()
+        if video_source is not None:
+            get_broker().source = video_source
+        audio_source = trace_replayer.audio_source_factory()
+        if audio_source is not None:
+            get_audio_capture().source_factory = audio_source
+
+    # Load the heavy detectors in the background; Flask starts serving meanwhile.
+    detectors.record_phase("app setup", time.perf_counter() - STARTUP_STARTED)
+    detectors.warm_up()
+
+    if trace_replayer is not None:
+        trace_replayer.start(**local_session.trackers())
+    else:
+        # Start the local candidate's trackers
+        local_session.start()
+
+    if trace_recorder is not None:
+        if 'audio' in TRACE_RECORD_MEDIA:
+            trace_recorder.record_audio(get_audio_capture())
+        if 'video' in TRACE_RECORD_MEDIA:
+            trace_recorder.record_video(get_broker())
+        atexit.register(trace_recorder.save, TRACE_RECORD)
+
+    # Push coalesced per-session risk snapshots to /api/stream subscribers
+    RiskCoalescer(event_bus, compute_risk, sessions.ids, max_rate=RISK_PUSH_MAX_RATE).start()
 
-    # Run Flask app
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Run Flask app (the reloader would run a second, recording/replaying copy of the app)
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=USE_RELOADER)
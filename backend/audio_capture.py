@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from voice_activity import AudioRingBuffer, DeviceAudioSource
+
+logger = logging.getLogger("AudioCapture")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class AudioSubscription:
+    """
+    One consumer's cursor into the capture service's shared ring. Every consumer
+    reads the same contiguous sample stream at its own pace; a consumer that falls
+    more than the ring's length behind loses the oldest audio and the loss is counted.
+    """
+
+    def __init__(self, capture, name, start_index):
+        self.capture = capture
+        self.name = name
+        self.cursor = start_index  # absolute index of the next sample to read
+        self.consumed = 0
+        self.lost = 0
+        self.closed = False
+
+    @property
+    def rate(self):
+        return self.capture.rate
+
+    @property
+    def active(self):
+        """False once closed, or once the source has ended and everything has been read."""
+        if self.closed:
+            return False
+        return self.capture.running or self.cursor < self.capture.ring.written
+
+    def read(self, min_samples, max_samples=None, timeout=None):
+        """
+        Wait until `min_samples` unread samples are available (or the source ends),
+        then return (samples, start_index) with up to `max_samples` of them. Returns
+        an empty array if nothing arrived within `timeout`.
+        """
+        ring = self.capture.ring
+        if not ring.wait_for(self.cursor + min_samples, timeout) and self.capture.running:
+            return np.empty(0, dtype=np.int16), self.cursor
+        samples, start = ring.read(self.cursor, max_samples or ring.capacity)
+        self.lost += start - self.cursor
+        self.cursor = start + len(samples)
+        self.consumed += len(samples)
+        return samples, start
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.capture.unsubscribe(self)
+
+    def get_stats(self):
+        return {
+            "name": self.name,
+            "consumed_seconds": round(self.consumed / self.rate, 3) if self.rate else 0,
+            "lost_seconds": round(self.lost / self.rate, 3) if self.rate else 0,
+            "lag_seconds": round((self.capture.ring.written - self.cursor) / self.rate, 3) if self.rate else 0
+        }
+
+
+class AudioCaptureService:
+    """
+    Owns the audio input once and fans its samples out to every consumer (streaming
+    VAD, clip recording, CameraDetector's voice counter) through one shared
+    AudioRingBuffer, the way CameraBroker shares the webcam. The source runs in
+    callback mode, so capture is continuous with no gaps between consumers' blocks.
+    The device opens when the first subscriber arrives and closes when the last
+    one leaves.
+    """
+
+    def __init__(self, source_factory=None, rate=16000, ring_seconds=60):
+        self.source_factory = source_factory or (lambda: DeviceAudioSource(rate=rate))
+        self.rate = rate
+        self.ring_seconds = ring_seconds
+        self.ring = AudioRingBuffer(int(rate * ring_seconds))
+        self.source = None
+        self.running = False
+        self.subscribers = []
+        self.started_at = None  # wall time of sample index 0
+        self.callbacks = 0
+        self.max_callback_interval = 0.0
+        self._last_callback = None
+        self._lock = threading.Lock()
+        self._lifecycle_lock = threading.RLock()
+
+    def subscribe(self, name):
+        """New consumer reading from the live edge of the stream (from sample 0 if this opens it)."""
+        with self._lifecycle_lock:
+            opening = not self.running
+            if opening:
+                self._start()
+            with self._lock:
+                subscription = AudioSubscription(self, name, 0 if opening else self.ring.written)
+                self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lifecycle_lock:
+            with self._lock:
+                if subscription in self.subscribers:
+                    self.subscribers.remove(subscription)
+                remaining = len(self.subscribers)
+            if remaining == 0:
+                self._stop()
+
+    def _start(self):
+        source = self.source_factory()
+        self.rate = source.rate
+        self.ring = AudioRingBuffer(int(self.rate * self.ring_seconds))
+        self.callbacks = 0
+        self.max_callback_interval = 0.0
+        self._last_callback = None
+        self.started_at = time.time()
+        self.running = True
+        try:
+            source.start(self._on_samples, on_end=self._on_end)
+        except Exception as e:
+            self.running = False
+            self.ring.close()
+            logger.error("Cannot open audio input: %s", e)
+            return False
+        self.source = source
+        logger.info("Audio capture started at %d Hz.", self.rate)
+        return True
+
+    def _stop(self):
+        self.running = False
+        self.ring.close()
+        if self.source is not None:
+            self.source.stop()
+            self.source = None
+            logger.info("Audio capture released its input.")
+
+    def _on_samples(self, samples):
+        now = time.perf_counter()
+        if self._last_callback is not None:
+            self.max_callback_interval = max(self.max_callback_interval, now - self._last_callback)
+        self._last_callback = now
+        self.callbacks += 1
+        self.ring.write(samples)
+
+    def _on_end(self):
+        self.running = False
+        self.ring.close()
+
+    def sample_time(self, index):
+        """Wall-clock time of absolute sample `index`, on the capture's sample clock."""
+        return self.started_at + index / self.rate
+
+    def get_stats(self):
+        with self._lock:
+            subscribers = [s.get_stats() for s in self.subscribers]
+        captured = self.ring.written / self.rate if self.rate else 0
+        elapsed = time.time() - self.started_at if self.started_at and self.running else None
+        return {
+            "running": self.running,
+            "rate": self.rate,
+            "captured_seconds": round(captured, 3),
+            # Wall time not covered by captured audio (device gaps, start-up latency).
+            "gap_seconds": round(max(0.0, elapsed - captured), 3) if elapsed is not None else None,
+            "callbacks": self.callbacks,
+            "max_callback_interval_ms": round(self.max_callback_interval * 1000, 2),
+            "input_overflows": getattr(self.source, "input_overflows", 0),
+            "subscribers": subscribers
+        }
+
+
+_capture = None
+_capture_lock = threading.Lock()
+
+
+def get_audio_capture():
+    """Process-wide capture service shared by VoiceDetector and CameraDetector."""
+    global _capture
+    with _capture_lock:
+        if _capture is None:
+            _capture = AudioCaptureService()
+        return _capture
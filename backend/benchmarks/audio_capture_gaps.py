@@ -0,0 +1,122 @@
+"""
+Capture gap time: the old CameraDetector loop (sounddevice.rec + wait per 0.5 s
+block, reopening the stream every time) versus a consumer of the shared
+AudioCaptureService reading the same 0.5 s blocks from one continuous stream.
+
+A gap is wall time during which no audio was being captured. For the old loop it
+is each iteration's wall time minus the block's duration (stream open/close plus
+processing between blocks); for the capture service it is wall time not covered
+by captured samples plus any samples the consumer lost.
+
+Run from backend/ (needs a microphone):
+    python -m benchmarks.audio_capture_gaps --seconds 30
+Without audio hardware, --simulate replaces the device with a paced synthetic
+source and sounddevice.rec with a sleep, so only loop overhead is measured.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from audio_capture import AudioCaptureService
+
+
+class SimulatedInput:
+    """Callback-mode source emitting noise blocks in real time, like a PortAudio stream."""
+
+    def __init__(self, rate=16000, block_size=480):
+        self.rate = rate
+        self.block_size = block_size
+        self.running = False
+        self.thread = None
+
+    def start(self, on_samples, on_end=None):
+        self.running = True
+        rng = np.random.default_rng(0)
+
+        def run():
+            started = time.perf_counter()
+            sent = 0
+            while self.running:
+                on_samples((rng.normal(0, 300, self.block_size)).astype(np.int16))
+                sent += self.block_size
+                delay = started + sent / self.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+
+def legacy_loop(seconds, block_seconds, rate, simulate):
+    """Mirror of the removed CameraDetector._audio_monitoring_loop."""
+    if simulate:
+        def rec(frames):
+            time.sleep(frames / rate)
+            return np.zeros((frames, 1), dtype=np.float32)
+    else:
+        import sounddevice as sd
+
+        def rec(frames):
+            data = sd.rec(frames, samplerate=rate, channels=1, dtype='float32')
+            sd.wait()
+            return data
+
+    frames = int(block_seconds * rate)
+    gaps = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        audio_data = rec(frames)
+        np.abs(audio_data).mean()
+        gaps.append(time.perf_counter() - start - block_seconds)
+    return gaps
+
+
+def service_loop(seconds, block_seconds, rate, simulate):
+    factory = (lambda: SimulatedInput(rate)) if simulate else None
+    capture = AudioCaptureService(source_factory=factory, rate=rate)
+    subscription = capture.subscribe("benchmark")
+    block = int(block_seconds * capture.rate)
+    blocks = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        samples, start = subscription.read(block, block, timeout=1.0)
+        if len(samples) == block:
+            np.abs(samples.astype(np.float32) / 32768.0).mean()
+            blocks.append(start)
+    stats = capture.get_stats()
+    subscription.close()
+    # Consecutive blocks must start exactly one block apart; anything else was lost.
+    discontinuities = sum(b - a - block for a, b in zip(blocks, blocks[1:]))
+    return stats, len(blocks), discontinuities / capture.rate, subscription.lost / capture.rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--block", type=float, default=0.5)
+    parser.add_argument("--simulate", action="store_true")
+    args = parser.parse_args()
+
+    gaps = legacy_loop(args.seconds, args.block, 44100, args.simulate)
+    total_gap = sum(max(g, 0) for g in gaps)
+    print(f"legacy sd.rec loop: {len(gaps)} blocks, gap {total_gap * 1000:.1f} ms total "
+          f"({total_gap / args.seconds:.2%} of wall time), mean {np.mean(gaps) * 1000:.2f} ms, "
+          f"max {max(gaps) * 1000:.2f} ms per block")
+
+    stats, count, discontinuity, lost = service_loop(args.seconds, args.block, 16000, args.simulate)
+    print(f"capture service:    {count} blocks, gap {stats['gap_seconds'] * 1000:.1f} ms total "
+          f"({stats['gap_seconds'] / args.seconds:.2%} of wall time, incl. start-up), "
+          f"between blocks {discontinuity * 1000:.1f} ms, lost {lost * 1000:.1f} ms, "
+          f"max callback interval {stats['max_callback_interval_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Insert throughput and query latency of the SQLite event index (event_index.py) at
+exam-archive scale.
+
+Reported:
+  inserts   events/sec through EventIndex.insert (row building, JSON encoding and one
+            transaction per --batch) for --events synthetic events, per million so
+            slowdown as the indexes grow shows up, plus the database size
+  bus path  events/sec and drops for events published on an EventBus and indexed by
+            the background writer, as app.py runs it
+  queries   latency percentiles of the review queries /api/events/query serves,
+            against the full database
+
+The synthetic archive is --sessions 3-hour sessions recorded in parallel, events in
+time order: mostly mouse anomalies, then face, window switches, copies, voice and the
+odd peripheral or camera event.
+
+Run from backend/:
+    python -m benchmarks.event_index_scale --events 10000000 --sessions 200
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from event_bus import EventBus
+from event_index import EventIndex, index_row
+
+TRACKERS = ["mouse", "face", "window", "copy", "voice", "peripheral", "camera"]
+TRACKER_SHARES = [0.82, 0.06, 0.05, 0.03, 0.03, 0.005, 0.005]
+SESSION_SECONDS = 3 * 3600
+START = 1760000000.0
+
+
+def make_event(tracker, t, seq, rng):
+    if tracker == "mouse":
+        event = {"timestamp": t, "event": "High speed" if rng.random() < 0.7 else "Mouse click Button.left",
+                 "speed": rng.uniform(1500, 4000), "position": (rng.randrange(1920), rng.randrange(1080))}
+    elif tracker == "face":
+        event = {"timestamp": t, "event": "Looking Away", "risk": 10, "duration": rng.uniform(10, 40),
+                 "intervals": 1}
+    elif tracker == "window":
+        duration = rng.expovariate(1 / 20)
+        event = {"timestamp": t, "window": "Search - Browser", "duration": duration,
+                 "risk": 20 + int(duration // 20) * 10, "details": "Tab switch"}
+    elif tracker == "copy":
+        event = {"timestamp": t, "event": "Copy-Paste Detected", "content_preview": "lorem ipsum " * 4,
+                 "word_count": 30, "risk": 30, "multiplier": 1, "event_count": 1}
+    elif tracker == "voice":
+        event = {"timestamp": t, "event": "Voice segment ended", "duration": rng.uniform(0.5, 8)}
+    elif tracker == "peripheral":
+        event = {"timestamp": t, "device": "USB Mass Storage Device", "risk": 35}
+    else:
+        event = {"timestamp": t, "event_type": "phone_detected", "confidence": 0.9, "evidence_id": "abc"}
+    event["seq"] = seq
+    return event
+
+
+class Archive:
+    """Synthetic events of `sessions` parallel sessions, generated in time order batch by batch."""
+
+    def __init__(self, total, sessions, seed=0):
+        self.total = total
+        self.sessions = sessions
+        self.per_session = total // sessions
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.seqs = {}
+        self.generated = 0
+
+    def time_of(self, n):
+        return START + (n // self.sessions) * SESSION_SECONDS / self.per_session
+
+    def batch(self, size):
+        size = min(size, self.total - self.generated)
+        trackers = self.np_rng.choice(len(TRACKERS), size=size, p=TRACKER_SHARES)
+        events = []
+        for offset, tracker_index in enumerate(trackers.tolist()):
+            n = self.generated + offset
+            session_id = f"seat-{n % self.sessions:04d}"
+            tracker = TRACKERS[tracker_index]
+            seq = self.seqs.get((session_id, tracker), 0) + 1
+            self.seqs[(session_id, tracker)] = seq
+            events.append((session_id, tracker, make_event(tracker, self.time_of(n), seq, self.rng)))
+        self.generated += size
+        return events
+
+
+def insert_archive(index, archive, batch_size):
+    print(f"\ninserts ({archive.total} events, {archive.sessions} sessions, {batch_size}-event transactions)")
+    print(f"{'events':>10} {'events/s':>10} {'MB':>8}")
+    elapsed = window_elapsed = 0.0
+    window_events = 0
+    report_every = max(archive.total // 10, batch_size)
+    next_report = report_every
+    while archive.generated < archive.total:
+        events = archive.batch(batch_size)
+        started = time.perf_counter()
+        now = time.time()
+        index.insert([index_row(session_id, tracker, 0, event, now) for session_id, tracker, event in events])
+        took = time.perf_counter() - started
+        elapsed += took
+        window_elapsed += took
+        window_events += len(events)
+        if archive.generated >= next_report or archive.generated == archive.total:
+            print(f"{archive.generated:>10} {window_events / window_elapsed:>10.0f} "
+                  f"{index.get_stats()['size_bytes'] / 1e6:>8.0f}")
+            window_elapsed, window_events = 0.0, 0
+            next_report += report_every
+    print(f"total: {archive.total / elapsed:.0f} events/s over {elapsed:.1f} s of inserting")
+
+
+def bus_path(directory, events, batch_size):
+    bus = EventBus()
+    index = EventIndex(os.path.join(directory, "bus.sqlite3"), bus=bus, batch_size=batch_size, flush_interval=0.1)
+    index.start()
+    archive = Archive(events, 20, seed=1)
+    started = time.perf_counter()
+    while archive.generated < archive.total:
+        for session_id, tracker, event in archive.batch(batch_size):
+            bus.publish(tracker, event, session_id)
+    published = time.perf_counter() - started
+    while index.stats["inserted"] < events and index.get_stats()["queued"]:
+        time.sleep(0.05)
+    index.stop()
+    elapsed = time.perf_counter() - started
+    stats = index.get_stats()
+    index.close()
+    print(f"\nbus path: {events} events published in {published:.1f} s, indexed {stats['inserted']} in "
+          f"{elapsed:.1f} s ({stats['inserted'] / elapsed:.0f} events/s), {stats['dropped']} dropped")
+
+
+def percentiles(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50:8.2f}  p95 {p95:8.2f}  p99 {p99:8.2f} ms"
+
+
+def run_queries(index, archive, repeats):
+    rng = random.Random(2)
+    session = lambda: f"seat-{rng.randrange(archive.sessions):04d}"
+    moment = lambda: START + rng.uniform(0, SESSION_SECONDS - 600)
+    queries = {
+        "window switches > 30 s": lambda: index.query(session(), trackers=["window"], min_duration=30),
+        "10 min, all trackers": lambda: (lambda t: index.query(session(), start=t, end=t + 600))(moment()),
+        "type in session": lambda: index.query(session(), event_types=["Copy-Paste Detected"]),
+        "risk >= 30, 1 h": lambda: (lambda t: index.query(session(), start=t, end=t + 3600, min_risk=30))(moment()),
+        "type, 10 min": lambda: (lambda t: index.query(session(), event_types=["Looking Away"], start=t,
+                                                        end=t + 600))(moment()),
+    }
+
+    def ten_pages():
+        events, cursor, has_more = index.query(session(), limit=100)
+        for _ in range(9):
+            events, cursor, has_more = index.query(session(), limit=100, cursor=cursor)
+
+    queries["10 pages of 100"] = ten_pages
+    print(f"\nqueries ({repeats} each, first page of up to 1000 events unless noted)")
+    for name, run in queries.items():
+        latencies = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<28} {percentiles(latencies)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=5000, help="Events per insert transaction")
+    parser.add_argument("--bus-events", type=int, default=200_000, help="Events for the bus path run")
+    parser.add_argument("--repeats", type=int, default=50, help="Runs of each query")
+    parser.add_argument("--dir", help="Where to put the database; a temporary directory by default")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    directory = args.dir or tempfile.mkdtemp(prefix="event-index-bench-")
+    try:
+        index = EventIndex(os.path.join(directory, "events.sqlite3"), batch_size=args.batch)
+        archive = Archive(args.events, args.sessions)
+        insert_archive(index, archive, args.batch)
+        run_queries(index, archive, args.repeats)
+        index.close()
+        if args.bus_events:
+            bus_path(directory, args.bus_events, args.batch)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
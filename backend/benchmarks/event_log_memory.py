@@ -0,0 +1,69 @@
+"""
+Memory per million mouse events: plain list of dicts versus the columnar EventLog.
+
+Run from backend/:
+    python -m benchmarks.event_log_memory --events 1000000
+"""
+import argparse
+import gc
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from event_log import EventLog
+
+MOUSE_SCHEMA = {
+    "timestamp": "float", "event": "str", "speed": "float", "angle_diff": "float",
+    "dx": "int", "dy": "int", "position": "xy"
+}
+
+
+def mouse_events(count):
+    t = 1700000000.0
+    for i in range(count):
+        t += 0.004
+        position = (i % 1920, (i * 7) % 1080)
+        if i % 3 == 0:
+            yield {"timestamp": t, "event": "High speed", "speed": 1500.0 + i % 500, "position": position}
+        elif i % 3 == 1:
+            yield {"timestamp": t, "event": "Abrupt direction change", "angle_diff": 90.0 + i % 90, "position": position}
+        else:
+            yield {"timestamp": t, "event": "Mouse scroll", "dx": 0, "dy": -1, "position": position}
+
+
+def measure(name, make_log, count):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    log = make_log()
+    for event in mouse_events(count):
+        log.append(event)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_million = current * 1_000_000 / count / 2 ** 20
+    print(f"{name:<28} {current / 2 ** 20:>10.1f} {per_million:>12.1f} {current / count:>10.1f} "
+          f"{peak / 2 ** 20:>9.1f} {count / elapsed:>12.0f}")
+    return log
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'storage':<28} {'MiB':>10} {'MiB/1M ev':>12} {'B/event':>10} {'peak MiB':>9} {'appends/s':>12}")
+    measure("list of dicts", list, args.events)
+    measure("EventLog (all in memory)",
+            lambda: EventLog(MOUSE_SCHEMA, capacity=args.events, spill=False), args.events)
+    spill_dir = tempfile.mkdtemp(prefix="eventlog-bench-")
+    try:
+        measure("EventLog (100k + spill)",
+                lambda: EventLog(MOUSE_SCHEMA, capacity=100_000, spill_dir=spill_dir), args.events)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Frames/sec per CPU core of FaceScoringEngine.process_batch for different batch sizes.
+
+Run from backend/:
+    python -m benchmarks.face_engine_batching --image path/to/face.jpg
+
+Without --image a synthetic 640x480 frame is used, which exercises the full P-Net
+pyramid but rarely reaches the later MTCNN stages; use a real face image for numbers
+that match exam traffic.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from face_engine import FaceScoringEngine
+
+
+def load_frame(path, width, height):
+    if path:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise SystemExit(f"Cannot read image: {path}")
+        return cv2.resize(frame, (width, height))
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    cv2.ellipse(frame, (width // 2, height // 2), (90, 120), 0, 0, 360, (150, 180, 220), -1)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Face image used as every session's frame")
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--frames", type=int, default=64, help="Frames scored per batch size")
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads (cores)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    frame = load_frame(args.image, args.width, args.height)
+    engine = FaceScoringEngine()
+
+    # Warm up MTCNN so the first measured batch does not include lazy allocations.
+    engine.process_batch([("warmup", frame, time.time())])
+
+    print(f"{'batch':>6} {'frames':>7} {'seconds':>9} {'fps':>8} {'fps/core':>9}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        batches = max(1, args.frames // batch_size)
+        items = [(f"session-{i}", frame, 0.0) for i in range(batch_size)]
+        start = time.perf_counter()
+        for _ in range(batches):
+            engine.process_batch(items)
+        elapsed = time.perf_counter() - start
+        frames = batches * batch_size
+        fps = frames / elapsed
+        print(f"{batch_size:>6} {frames:>7} {elapsed:>9.2f} {fps:>8.2f} {fps / args.threads:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
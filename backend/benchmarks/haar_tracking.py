@@ -0,0 +1,160 @@
+"""
+CameraDetector analysis cost and agreement: the legacy path (full-frame Haar face
+detection plus whole-face eye search on every frame) versus tracking mode
+(downscaled detection every K frames or on tracker loss, template tracking in
+between, eye search in the upper face only).
+
+Every frame of the recording is fed to _analyze_frame of each detector in turn.
+Reported per mode: ms/frame for the whole analysis and for faces+eyes alone
+(phone detection is unchanged and timed separately), plus agreement with the
+legacy detector on face count, the primary face box (IoU >= 0.5), the
+"two eyes found" decision, and the suspicious events each run would log.
+
+Run from backend/:
+    python -m benchmarks.haar_tracking --video exam_session.mp4
+    python -m benchmarks.haar_tracking --image face.jpg --frames 300
+
+--image builds a clip by panning and zooming a still photo across a noisy
+background; use a recorded webcam session for numbers that match exam traffic.
+"""
+import argparse
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from camera_detector import CameraDetector
+
+
+def load_video(path, max_frames):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {path}")
+    frames = []
+    while len(frames) < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def synthetic_clip(path, count, width, height):
+    """Still photo scaled to ~half the frame height, drifting and zooming slowly."""
+    image = cv2.imread(path)
+    if image is None:
+        raise SystemExit(f"Cannot read image: {path}")
+    rng = np.random.default_rng(0)
+    # Smooth wall-like gradient; sensor noise is added per frame.
+    ramp = np.linspace(70, 130, width, dtype=np.float32)
+    background = np.repeat(np.tile(ramp, (height, 1))[:, :, None], 3, axis=2).astype(np.uint8)
+    frames = []
+    for i in range(count):
+        t = i / max(1, count - 1)
+        size = int(height * (0.5 + 0.15 * np.sin(2 * np.pi * t)))
+        face = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+        x = int((width - size) * (0.5 + 0.4 * np.sin(4 * np.pi * t)))
+        y = int((height - size) * (0.5 + 0.3 * np.cos(2 * np.pi * t)))
+        frame = background.copy()
+        frame[y:y + size, x:x + size] = face
+        noise = rng.normal(0, 4, size=frame.shape)
+        frames.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def run(frames, **options):
+    detector = CameraDetector(broker=object(), evidence_store=object(), audio_capture=object(), **options)
+    events = Counter()
+    detector._log_suspicious_event = lambda event_type: events.update([event_type])
+    phone_seconds = [0.0]
+    detect_phone = detector._detect_phone
+
+    def timed_detect_phone(face, gray):
+        start = time.perf_counter()
+        detect_phone(face, gray)
+        phone_seconds[0] += time.perf_counter() - start
+
+    detector._detect_phone = timed_detect_phone
+    results = []
+    start = time.perf_counter()
+    for frame in frames:
+        detector.last_frame = frame
+        detector._analyze_frame(frame)
+        results.append(([tuple(int(v) for v in face) for face in detector.last_faces], detector.last_eye_count))
+    elapsed = time.perf_counter() - start
+    stats = detector.face_tracker.get_stats() if detector.face_tracker else None
+    return results, elapsed, phone_seconds[0], events, stats
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter)
+
+
+def agreement(reference, results):
+    count_same = box_same = box_total = eyes_same = eyes_total = 0
+    for (ref_faces, ref_eyes), (faces, eyes) in zip(reference, results):
+        count_same += len(ref_faces) == len(faces)
+        if ref_faces and faces:
+            box_total += 1
+            box_same += iou(ref_faces[0], faces[0]) >= 0.5
+            if ref_eyes is not None and eyes is not None:
+                eyes_total += 1
+                eyes_same += (ref_eyes >= 2) == (eyes >= 2)
+    return {
+        "face_count": count_same / len(reference),
+        "primary_box": box_same / box_total if box_total else None,
+        "two_eyes": eyes_same / eyes_total if eyes_total else None
+    }
+
+
+def percent(value):
+    return f"{value:.1%}" if value is not None else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--video", help="Recorded webcam session")
+    source.add_argument("--image", help="Face photo to synthesize a clip from")
+    parser.add_argument("--frames", type=int, default=600, help="Frames analyzed (max)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--detect-every", default="3,5,10")
+    parser.add_argument("--scale", type=float, default=0.6, help="Detection downscale in tracking mode")
+    args = parser.parse_args()
+
+    if args.video:
+        frames = load_video(args.video, args.frames)
+    else:
+        frames = synthetic_clip(args.image, args.frames, args.width, args.height)
+    if not frames:
+        raise SystemExit("No frames to analyze")
+    print(f"{len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    cv2.setNumThreads(1)
+    reference, elapsed, phone, events, _ = run(frames, tracking=False)
+    print(f"{'mode':<18} {'ms/frame':>9} {'faces+eyes':>11} {'phone':>7} {'detections':>11} "
+          f"{'count':>7} {'box':>7} {'eyes':>7}  events")
+    n = len(frames)
+    print(f"{'legacy':<18} {elapsed * 1000 / n:>9.2f} {(elapsed - phone) * 1000 / n:>11.2f} "
+          f"{phone * 1000 / n:>7.2f} {n:>11} {'-':>7} {'-':>7} {'-':>7}  {dict(events)}")
+    for k in [int(v) for v in args.detect_every.split(",")]:
+        results, elapsed, phone, events, stats = run(frames, tracking=True, detect_every=k,
+                                                     detection_scale=args.scale)
+        agree = agreement(reference, results)
+        print(f"{f'tracking K={k}':<18} {elapsed * 1000 / n:>9.2f} {(elapsed - phone) * 1000 / n:>11.2f} "
+              f"{phone * 1000 / n:>7.2f} {stats['detections']:>11} {percent(agree['face_count']):>7} "
+              f"{percent(agree['primary_box']):>7} {percent(agree['two_eyes']):>7}  {dict(events)}")
+
+
+if __name__ == "__main__":
+    main()
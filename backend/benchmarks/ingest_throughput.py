@@ -0,0 +1,249 @@
+"""
+Throughput of /api/ingest against a local stand-in for the candidate-machine agent.
+
+StandInAgent produces one session's records the way an agent would: mouse samples
+at 60 Hz with occasional clicks and flicks, tab switches, clipboard changes, a
+device plug-in and voice/face summaries, numbered with a per-session seq and
+uploaded in batches.
+
+Reported:
+  codecs      bytes per record, client encode and server decode (decompress, parse,
+              validate) cost per record for NDJSON/msgpack x identity/gzip/zstd
+  end-to-end  POST /api/sessions/<id>/ingest through app.py's WSGI app (Flask
+              test client, no sockets) from W worker threads, each uploading for
+              its own sessions: records/sec in total and per worker, and request
+              latency. A share of batches is re-sent (--retry-rate) and a share
+              sent ahead of the previous batch (--reorder-rate), to exercise
+              dedupe and ordering.
+After each run every session's ack must equal the records sent, and the first
+session's logs must match a reference session fed the same records in order.
+
+Run from backend/:
+    python -m benchmarks.ingest_throughput --workers 1,2,4 --batch 500
+"""
+import argparse
+import gzip
+import json
+import logging
+import math
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from event_ingest import apply_record, decode_batch, msgpack, zstandard
+from session_registry import ExamSession, LOG_NAMES
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "msgpack": "application/msgpack"}
+
+
+class StandInAgent:
+    """Generates one session's records like the candidate-machine agent."""
+
+    def __init__(self, seed=0, start=None):
+        self.rng = random.Random(seed)
+        self.seq = 0
+        self.t = start if start is not None else time.time()
+        self.tab = 0
+
+    def _record(self, kind, **payload):
+        self.seq += 1
+        return {"seq": self.seq, "kind": kind, "t": round(self.t, 4), **payload}
+
+    def records(self, count):
+        out = []
+        while len(out) < count:
+            self.t += 1 / 60
+            step = self.seq
+            angle = 2 * math.pi * 0.3 * self.t
+            x, y = 800 + 200 * math.cos(angle), 500 + 200 * math.sin(angle)
+            if step % 180 < 2:
+                x += 300  # A flick
+            out.append(self._record("move", x=int(x), y=int(y)))
+            roll = self.rng.random()
+            if roll < 0.02:
+                out.append(self._record("click", x=int(x), y=int(y), button="Button.left", pressed=True))
+            elif roll < 0.022:
+                self.tab += 1
+                out.append(self._record("window", value="Exam" if self.tab % 2 == 0 else "Search - Browser"))
+            elif roll < 0.023:
+                out.append(self._record("clipboard", value=f"notes {self.seq} " * self.rng.randint(1, 20)))
+            elif roll < 0.0235:
+                out.append(self._record("voice", event="Speech", duration=round(self.rng.uniform(0.5, 4), 2)))
+            elif roll < 0.024:
+                out.append(self._record("face", event="Looking Away", risk=10, duration=12.0, intervals=1))
+            elif roll < 0.02405:
+                out.append(self._record("device", value="USB Mass Storage Device"))
+        # Keep seq contiguous across batches: give back the numbers of what doesn't fit.
+        self.seq -= len(out) - count
+        return out[:count]
+
+
+def encode(records, fmt, encoding, level=None):
+    """Body and headers for one upload."""
+    if fmt == "ndjson":
+        body = "\n".join(json.dumps(record, separators=(",", ":")) for record in records).encode()
+    else:
+        body = b"".join(msgpack.packb(record) for record in records)
+    headers = {"Content-Type": CONTENT_TYPES[fmt]}
+    if encoding == "gzip":
+        body = gzip.compress(body, compresslevel=level or 6)
+        headers["Content-Encoding"] = "gzip"
+    elif encoding == "zstd":
+        body = zstandard.ZstdCompressor(level=level or 3).compress(body)
+        headers["Content-Encoding"] = "zstd"
+    return body, headers
+
+
+def available_codecs():
+    formats = ["ndjson"] + (["msgpack"] if msgpack is not None else [])
+    encodings = ["identity", "gzip"] + (["zstd"] if zstandard is not None else [])
+    return [(fmt, encoding) for fmt in formats for encoding in encodings]
+
+
+def codec_table(batch_size, repeats=20):
+    print(f"\ncodecs ({batch_size}-record batches)")
+    print(f"{'format':<9}{'encoding':<10}{'bytes/rec':>10}{'encode us/rec':>15}{'decode us/rec':>15}")
+    records = StandInAgent(seed=1).records(batch_size)
+    for fmt, encoding in available_codecs():
+        started = time.perf_counter()
+        for _ in range(repeats):
+            body, headers = encode(records, fmt, encoding)
+        encode_us = (time.perf_counter() - started) / repeats / batch_size * 1e6
+        started = time.perf_counter()
+        for _ in range(repeats):
+            decode_batch(body, headers["Content-Type"], headers.get("Content-Encoding"))
+        decode_us = (time.perf_counter() - started) / repeats / batch_size * 1e6
+        print(f"{fmt:<9}{encoding:<10}{len(body) / batch_size:>10.1f}{encode_us:>15.2f}{decode_us:>15.2f}")
+
+
+class UploadWorker:
+    """One uploading thread: encodes and posts batches for its sessions round-robin."""
+
+    def __init__(self, flask_app, session_ids, batches, fmt, encoding, retry_rate, reorder_rate, seed):
+        self.client = flask_app.test_client()
+        self.session_ids = session_ids
+        self.batches = batches
+        self.fmt = fmt
+        self.encoding = encoding
+        self.retry_rate = retry_rate
+        self.reorder_rate = reorder_rate
+        self.rng = random.Random(seed)
+        self.sent_records = {session_id: [] for session_id in session_ids}
+        self.records = 0
+        self.latencies = []
+        self.errors = 0
+
+    def _post(self, session_id, body, headers):
+        started = time.perf_counter()
+        response = self.client.post(f"/api/sessions/{session_id}/ingest", data=body, headers=headers)
+        self.latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            self.errors += 1
+
+    def run(self):
+        queued = {session_id: [] for session_id in self.session_ids}
+        for batch in range(self.batches):
+            for session_id, records in self.batches_for_round(batch):
+                body, headers = encode(records, self.fmt, self.encoding)
+                if self.rng.random() < self.reorder_rate and batch + 1 < self.batches:
+                    queued[session_id].append((body, headers, len(records)))  # Sent after the next batch
+                    continue
+                self._post(session_id, body, headers)
+                self.records += len(records)
+                if self.rng.random() < self.retry_rate:
+                    self._post(session_id, body, headers)  # Retried as if the response was lost
+                for held_body, held_headers, held_count in queued[session_id]:
+                    self._post(session_id, held_body, held_headers)
+                    self.records += held_count
+                queued[session_id] = []
+
+    def batches_for_round(self, batch):
+        for session_id in self.session_ids:
+            yield session_id, self.prepared[session_id][batch]
+
+    def prepare(self, batch_size):
+        """Generate every batch up front so the clock measures uploading only."""
+        self.prepared = {}
+        for session_id in self.session_ids:
+            agent = StandInAgent(seed=zlib.crc32(session_id.encode()))
+            self.prepared[session_id] = [agent.records(batch_size) for _ in range(self.batches)]
+            self.sent_records[session_id] = [r for batch in self.prepared[session_id] for r in batch]
+
+
+def end_to_end(exam_app, workers, sessions_per_worker, batches, batch_size, fmt, encoding, args):
+    session_ids = [f"ingest-{fmt}-{encoding}-{workers}-{i}" for i in range(workers * sessions_per_worker)]
+    for session_id in session_ids:
+        exam_app.sessions.create(session_id)
+    uploaders = [UploadWorker(exam_app.app, session_ids[i::workers], batches, fmt, encoding,
+                              args.retry_rate, args.reorder_rate, seed=i) for i in range(workers)]
+    for uploader in uploaders:
+        uploader.prepare(batch_size)
+    threads = [threading.Thread(target=uploader.run) for uploader in uploaders]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    records = sum(uploader.records for uploader in uploaders)
+    latencies = [latency for uploader in uploaders for latency in uploader.latencies]
+    errors = sum(uploader.errors for uploader in uploaders)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{fmt:<9}{encoding:<10}{workers:>8}{records / elapsed:>12.0f}{records / elapsed / workers:>14.0f}"
+          f"{p50:>10.2f}{p99:>10.2f}{errors:>8}")
+
+    # Every record applied exactly once, in order.
+    expected = {sid: len(records) for uploader in uploaders for sid, records in uploader.sent_records.items()}
+    for session_id in session_ids:
+        session = exam_app.sessions.get(session_id)
+        assert session.ingest_cursor == expected[session_id], (session_id, session.ingest_cursor)
+        assert not session.ingest_pending
+    reference = ExamSession("reference")
+    first = session_ids[0]
+    for record in uploaders[0].sent_records[first]:
+        apply_record(reference, record)
+    session = exam_app.sessions.get(first)
+    for name in LOG_NAMES:
+        if name != "camera":
+            assert len(session.log(name)) == len(reference.log(name)), name
+    for session_id in session_ids:
+        exam_app.sessions.remove(session_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated uploading thread counts")
+    parser.add_argument("--sessions-per-worker", type=int, default=4)
+    parser.add_argument("--batches", type=int, default=20, help="Batches per session")
+    parser.add_argument("--batch", type=int, default=500, help="Records per batch")
+    parser.add_argument("--retry-rate", type=float, default=0.05)
+    parser.add_argument("--reorder-rate", type=float, default=0.05)
+    parser.add_argument("--verbose", action="store_true", help="Keep tracker and dispatcher logging")
+    args = parser.parse_args()
+
+    import app as exam_app
+    if not args.verbose:
+        logging.disable(logging.WARNING)  # Trackers log every detection.
+    exam_app.cheating_detector.get()
+    exam_app.event_dispatcher.start()
+
+    codec_table(args.batch)
+    print(f"\nend-to-end ({args.batch}-record batches, {args.sessions_per_worker} sessions per worker, "
+          f"{args.retry_rate:.0%} retried, {args.reorder_rate:.0%} reordered)")
+    print(f"{'format':<9}{'encoding':<10}{'workers':>8}{'records/s':>12}{'per worker':>14}"
+          f"{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for workers in (int(n) for n in args.workers.split(",")):
+        for fmt, encoding in available_codecs():
+            end_to_end(exam_app, workers, args.sessions_per_worker, args.batches, args.batch, fmt, encoding, args)
+    stats = exam_app.event_dispatcher.get_stats()
+    print(f"\ndispatcher: {stats['processed']} events, {stats['dropped']} dropped, "
+          f"queue latency p99 <= {stats['queue_latency']['p99_ms']} ms")
+    exam_app.event_dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
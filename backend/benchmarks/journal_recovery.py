@@ -0,0 +1,215 @@
+"""
+Write throughput and recovery time of the event journal (event_journal.py).
+
+Reported:
+  writes         events/sec appended through journaled EventLogs from T threads, and
+                 what reaching disk cost: commits (fsyncs), events per commit, MB/s;
+                 "none" is the same EventLogs without a journal
+  durable acks   append + wait() round trips from W threads, as /api/ingest does
+                 before acknowledging a batch: acks/sec, latency and how many
+                 records shared each fsync (group commit)
+  3-hour session a synthetic session (benchmarks.replay_pipeline.synthetic_trace)
+                 replayed as fast as possible into a journaled ExamSession, then
+                 recovered into a fresh one the way app.py does on startup: from
+                 the journal alone, and from a snapshot plus the journal after it.
+                 The recovered logs, risk scores and pause state are checked
+                 against the original.
+
+Everything is written under --dir (a temporary directory by default), so point it
+at the disk the server would use. Run from backend/:
+    python -m benchmarks.journal_recovery --hours 3
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.replay_pipeline import synthetic_trace
+from event_journal import EventJournal
+from event_log import EventLog
+from session_registry import ExamSession
+from trace_replay import TraceReplayer
+
+# A mouse anomaly as MouseBehaviorTracker logs it.
+MOUSE_SCHEMA = {"timestamp": "float", "event": "str", "speed": "float", "angle": "float", "position": "xy"}
+
+
+def journal_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def new_journal(directory, fsync=True):
+    shutil.rmtree(directory, ignore_errors=True)
+    # Snapshots only when the benchmark asks for one.
+    return EventJournal(directory, fsync=fsync, snapshot_interval=0, snapshot_bytes=0).open()
+
+
+def write_throughput(directory, threads, seconds, fsync):
+    """fsync: True / False, or None for no journal at all."""
+    journal = new_journal(directory, fsync) if fsync is not None else None
+    logs = []
+    for i in range(threads):
+        log = EventLog(schema=MOUSE_SCHEMA)
+        if journal is not None:
+            journal.open_session(f"writer-{i}")
+            journal.register(log, f"writer-{i}", "mouse")
+        logs.append(log)
+    appended = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def write(i):
+        log, count = logs[i], 0
+        while time.perf_counter() < deadline:
+            for _ in range(100):
+                log.append({"timestamp": time.time(), "event": "Sudden Speed Change", "speed": 2150.5,
+                            "angle": 97.3, "position": (812, 433)})
+            count += 100
+        appended[i] = count
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=write, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    total = sum(appended)
+    if journal is None:
+        print(f"{threads:>7} {'none':>6} {total / (time.perf_counter() - started):>12.0f}")
+        return
+    journal.sync()
+    elapsed = time.perf_counter() - started
+    stats = journal.get_stats()
+    journal.close()
+    print(f"{threads:>7} {'on' if fsync else 'off':>6} {total / elapsed:>12.0f} {stats['commits']:>8} "
+          f"{total / max(stats['commits'], 1):>12.0f} {stats['bytes_written'] / elapsed / 1e6:>8.1f}")
+
+
+def durable_acks(directory, threads, seconds):
+    journal = new_journal(directory)
+    journal.open_session("acks")
+    latencies = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + seconds
+
+    def acknowledge(i):
+        cursor = 0
+        while time.perf_counter() < deadline:
+            cursor += 1
+            started = time.perf_counter()
+            journal.wait(journal.record_ingest_cursor("acks", cursor))
+            latencies[i].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=acknowledge, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    stats = journal.get_stats()
+    journal.close()
+    values = [v for thread_latencies in latencies for v in thread_latencies]
+    p50, p99 = np.percentile(values, [50, 99])
+    print(f"{threads:>7} {len(values) / elapsed:>10.0f} {p50:>9.2f} {p99:>9.2f} "
+          f"{len(values) / max(stats['commits'], 1):>14.1f}")
+
+
+def session_summary(session):
+    return {
+        "events": {name: len(session.log(name)) for name in ("mouse", "window", "copy", "peripheral", "face")},
+        "risk": session.risk_scores(),
+        "status": session.get_status(),
+        "last_mouse": session.log("mouse")[-1] if len(session.log("mouse")) else None
+    }
+
+
+def recover(directory):
+    """Recover like app.py: open the journal, then let the session attach to it."""
+    started = time.perf_counter()
+    journal = EventJournal(directory, snapshot_interval=0, snapshot_bytes=0).open()
+    session = ExamSession("candidate")
+    session.attach_journal(journal)
+    elapsed = time.perf_counter() - started
+    return journal, session, elapsed
+
+
+def long_session(directory, hours, mouse_hz):
+    trace_dir = tempfile.mkdtemp(prefix="journal-bench-")
+    try:
+        path = os.path.join(trace_dir, "session.trace")
+        print(f"\n{hours:g}-hour session: generating a {mouse_hz:g} Hz trace...")
+        synthetic_trace(path, hours * 3600, mouse_hz=mouse_hz)
+        replayer = TraceReplayer(path, speed=0)
+
+        journal = new_journal(directory)
+        session = ExamSession("candidate")
+        session.attach_journal(journal)
+        stats = replayer.run(**session.trackers())
+        session.mouse_tracker.flush()
+        session.pause(["Replay finished"])
+        started = time.perf_counter()
+        journal.sync()
+        flushed = time.perf_counter() - started
+        journal_stats = journal.get_stats()
+        expected = session_summary(session)
+        print(f"replayed {stats['observations']} observations in {stats['seconds']:.1f} s "
+              f"({stats['observations_per_second']:.0f}/s) with journaling; "
+              f"{journal_stats['appended']} records, {journal_stats['bytes_written'] / 1e6:.1f} MB in "
+              f"{journal_stats['commits']} commits, final sync {flushed * 1000:.1f} ms")
+        print(f"events per log: {expected['events']}")
+        journal.close()
+
+        journal, recovered, elapsed = recover(directory)
+        assert session_summary(recovered) == expected, (session_summary(recovered), expected)
+        print(f"recovery from the journal alone: {elapsed:.2f} s "
+              f"({journal.stats['recovery']['replayed_records']} records, {journal_size(directory) / 1e6:.1f} MB)")
+
+        started = time.perf_counter()
+        snapshot = journal.snapshot()
+        snapshot_seconds = time.perf_counter() - started
+        journal.close()
+        journal, recovered, elapsed = recover(directory)
+        assert session_summary(recovered) == expected
+        print(f"snapshot: {snapshot_seconds:.2f} s, {os.path.getsize(snapshot) / 1e6:.1f} MB; "
+              f"recovery from the snapshot: {elapsed:.2f} s")
+        journal.close()
+    finally:
+        shutil.rmtree(trace_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", help="Journal directory to use (emptied first); a temporary one by default")
+    parser.add_argument("--threads", default="1,4", help="Comma-separated writer thread counts")
+    parser.add_argument("--ack-threads", default="1,8,32", help="Comma-separated acknowledging thread counts")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration of each throughput run")
+    parser.add_argument("--hours", type=float, default=3.0, help="Length of the simulated session")
+    parser.add_argument("--mouse-hz", type=float, default=60.0, help="Mouse samples per second in the session")
+    parser.add_argument("--verbose", action="store_true", help="Keep tracker logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)  # Trackers log every detection.
+    base = tempfile.mkdtemp(prefix="journal-bench-") if args.dir is None else None
+    directory = args.dir or os.path.join(base, "journal")
+    try:
+        print("writes")
+        print(f"{'threads':>7} {'fsync':>6} {'events/s':>12} {'commits':>8} {'events/commit':>12} {'MB/s':>8}")
+        for threads in (int(n) for n in args.threads.split(",")):
+            for fsync in (True, False, None):
+                write_throughput(directory, threads, args.seconds, fsync)
+        print("\ndurable acks")
+        print(f"{'threads':>7} {'acks/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'records/fsync':>14}")
+        for threads in (int(n) for n in args.ack_threads.split(",")):
+            durable_acks(directory, threads, args.seconds)
+        long_session(directory, args.hours, args.mouse_hz)
+    finally:
+        shutil.rmtree(base or directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
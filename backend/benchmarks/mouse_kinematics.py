@@ -0,0 +1,102 @@
+"""
+Replay a synthetic mouse trace through MouseBehaviorTracker's per-sample path and its
+vectorized batch path, comparing throughput and the samples each one flags.
+
+Run from backend/:
+    python -m benchmarks.mouse_kinematics --samples 1000000 --batch-ms 100
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from mouse_tracker import MouseBehaviorTracker
+
+
+def synthetic_trace(count, seed=0):
+    """Random-walk cursor at ~250 Hz with occasional flicks, reversals and pauses."""
+    rng = np.random.default_rng(seed)
+    dt = rng.uniform(0.002, 0.006, count)
+    dt[rng.random(count) < 0.01] = 0.0  # duplicate timestamps happen with real hooks
+    t = 1_700_000_000.0 + np.cumsum(dt)
+    step = rng.normal(0, 2, (count, 2))
+    flicks = rng.random(count) < 0.02
+    step[flicks] *= 15
+    step[rng.random(count) < 0.05] = 0  # stationary samples
+    reversal = rng.random(count) < 0.03
+    step[reversal] *= -1
+    xy = np.clip(np.cumsum(step, axis=0).round() + [960, 540], 0, [1919, 1079])
+    return np.column_stack([t, xy])
+
+
+def run_per_sample(trace, speed_threshold, angle_threshold):
+    tracker = MouseBehaviorTracker(speed_threshold, angle_threshold)
+    tracker.logger.setLevel(logging.ERROR)  # measure detection, not console I/O
+    flagged_speed, flagged_angle = [], []
+    start = time.perf_counter()
+    for t, x, y in trace.tolist():
+        before = len(tracker.event_log)
+        tracker._handle_move(t, int(x), int(y))
+        if len(tracker.event_log) != before:
+            for event in tracker.event_log[before:]:
+                (flagged_speed if event["event"] == "High speed" else flagged_angle).append(event["timestamp"])
+    elapsed = time.perf_counter() - start
+    return elapsed, flagged_speed, flagged_angle, len(tracker.event_log)
+
+
+def run_batched(trace, speed_threshold, angle_threshold, batch_ms):
+    tracker = MouseBehaviorTracker(speed_threshold, angle_threshold, batch_interval_ms=batch_ms)
+    tracker.logger.setLevel(logging.ERROR)
+    flagged_speed, flagged_angle = [], []
+    # Cut the trace into batches by time, as the flush thread would.
+    bounds = np.searchsorted(trace[:, 0], np.arange(trace[0, 0], trace[-1, 0] + batch_ms / 1000, batch_ms / 1000))
+    bounds = np.unique(np.concatenate([bounds, [len(trace)]]))
+    start = time.perf_counter()
+    lo = 0
+    for hi in bounds:
+        if hi > lo:
+            k = tracker.process_batch(trace[lo:hi])
+            flagged_speed.extend(k["t"][k["high_speed"]].tolist())
+            flagged_angle.extend(k["t"][k["abrupt"]].tolist())
+            lo = hi
+    elapsed = time.perf_counter() - start
+    return elapsed, flagged_speed, flagged_angle, len(tracker.event_log)
+
+
+def hook_cost(trace, batch_ms):
+    """Seconds per sample spent on the input hook thread in batch mode (buffer append only)."""
+    tracker = MouseBehaviorTracker(batch_interval_ms=batch_ms)
+    samples = trace.tolist()
+    start = time.perf_counter()
+    for t, x, y in samples:
+        tracker._buffer_sample(t, x, y)
+        if tracker._count == tracker.buffer_size:
+            tracker._swap_buffers()
+    return (time.perf_counter() - start) / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--batch-ms", type=float, default=100)
+    parser.add_argument("--speed-threshold", type=float, default=1500)
+    parser.add_argument("--angle-threshold", type=float, default=90)
+    args = parser.parse_args()
+
+    trace = synthetic_trace(args.samples)
+    legacy = run_per_sample(trace, args.speed_threshold, args.angle_threshold)
+    batched = run_batched(trace, args.speed_threshold, args.angle_threshold, args.batch_ms)
+
+    print(f"{'mode':<12} {'seconds':>9} {'samples/s':>12} {'speed hits':>11} {'angle hits':>11} {'events':>9}")
+    for name, (elapsed, speed_hits, angle_hits, events) in (("per-sample", legacy), ("batched", batched)):
+        print(f"{name:<12} {elapsed:>9.2f} {args.samples / elapsed:>12.0f} {len(speed_hits):>11} "
+              f"{len(angle_hits):>11} {events:>9}")
+    same = legacy[1] == batched[1] and legacy[2] == batched[2]
+    print(f"speedup {legacy[0] / batched[0]:.1f}x; flagged samples identical: {same}")
+    print(f"input hook cost: per-sample {legacy[0] / args.samples * 1e6:.2f} us, "
+          f"batched {hook_cost(trace, args.batch_ms) * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Phone-region scoring cost: the old _detect_phone loop (grayscale conversion,
+adaptive threshold, Canny and findContours per region) versus
+phone_detection.score_regions (one pass over the union of all regions, edge
+density from an integral image), for the four fixed regions and for the fixed
+regions plus a sliding grid.
+
+Faces are located once per frame with the full-frame Haar cascade, then every
+variant scores the same regions. Agreement is the share of frames where the
+one-pass decision (any region over a threshold) matches the old per-region
+loop over the same regions; area agreement is the share of regions whose
+contour-area test (area ratio over AREA_RATIO_THRESHOLD) matches, which the
+edge-density test can't mask. Every other frame gets a phone outline beside the
+face with a cable running off the bottom of the frame.
+
+Run from backend/:
+    python -m benchmarks.phone_regions --video exam_session.mp4
+    python -m benchmarks.phone_regions --image face.jpg --frames 200 --grid 5x4
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.haar_tracking import load_video, synthetic_clip
+from phone_detection import phone_regions, score_regions, EDGE_DENSITY_THRESHOLD, AREA_RATIO_THRESHOLD
+
+
+def legacy_detect(frame, regions, stop_at_hit=True):
+    """
+    Mirror of the removed per-region CameraDetector._detect_phone loop. With
+    stop_at_hit=False every region is scored, as on a frame with no phone.
+    """
+    hit = False
+    for y1, y2, x1, x2 in regions:
+        roi = frame[y1:y2, x1:x2]
+        if roi.size == 0:
+            continue
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY_INV, 7, 2)
+        edges = cv2.Canny(gray, 30, 100)
+        edge_density = np.sum(edges > 0) / (edges.size + 1e-6)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            area_ratio = cv2.contourArea(max(contours, key=cv2.contourArea)) / (roi.shape[0] * roi.shape[1])
+            if edge_density > EDGE_DENSITY_THRESHOLD or area_ratio > AREA_RATIO_THRESHOLD:
+                hit = True
+                if stop_at_hit:
+                    break
+    return hit
+
+
+def legacy_area_hits(frame, regions):
+    """Per region, whether the old loop's largest contour passed AREA_RATIO_THRESHOLD."""
+    hits = []
+    for y1, y2, x1, x2 in regions:
+        gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY_INV, 7, 2)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        area = max((cv2.contourArea(c) for c in contours), default=0)
+        hits.append(area / (thresh.shape[0] * thresh.shape[1]) > AREA_RATIO_THRESHOLD)
+    return np.array(hits)
+
+
+def add_phone(frame, face):
+    """A phone-sized outline right of the face, its cable running to the bottom edge."""
+    x, y, w, h = (int(v) for v in face)
+    frame = frame.copy()
+    left, top = x + w + 60, y
+    cv2.rectangle(frame, (left, top), (left + w // 2, top + h), (20, 20, 20), 2)
+    cv2.line(frame, (left + w // 4, top + h), (left + w // 4, frame.shape[0] - 1), (20, 20, 20), 2)
+    return frame
+
+
+def single_pass_detect(frame, regions):
+    # The detector already has the grayscale frame; converting here keeps the comparison fair.
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    edge_density, area_ratio = score_regions(gray, regions)
+    return bool(np.any((edge_density > EDGE_DENSITY_THRESHOLD) | (area_ratio > AREA_RATIO_THRESHOLD)))
+
+
+def timed(detect, cases):
+    start = time.perf_counter()
+    decisions = [detect(frame, regions) for frame, regions in cases]
+    return (time.perf_counter() - start) * 1000 / len(cases), decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--video", help="Recorded webcam session")
+    source.add_argument("--image", help="Face photo to synthesize a clip from")
+    parser.add_argument("--frames", type=int, default=300, help="Frames analyzed (max)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--grid", default="5x4", help="Sliding grid added to the fixed regions, COLSxROWS")
+    args = parser.parse_args()
+
+    frames = load_video(args.video, args.frames) if args.video else \
+        synthetic_clip(args.image, args.frames, args.width, args.height)
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    faces = []
+    for i, frame in enumerate(frames):
+        found = cascade.detectMultiScale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1.3, 5)
+        if len(found):
+            faces.append((add_phone(frame, found[0]) if i % 2 else frame, found[0]))
+    if not faces:
+        raise SystemExit("No faces found in the input")
+    print(f"{len(faces)} frames with a face at {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    cv2.setNumThreads(1)
+    grid = tuple(int(v) for v in args.grid.lower().split("x"))
+    # The per-region loop stops at the first hit, so its cost depends on the hit rate;
+    # "all regions" is its cost when nothing is found and every region is scored.
+    print(f"{'regions':<14} {'count':>6} {'per-region ms':>14} {'all regions ms':>15} "
+          f"{'one-pass ms':>12} {'hit rate':>9} {'agreement':>10} {'area agreement':>15}")
+    for label, region_grid in (("fixed", None), (f"fixed+{args.grid}", grid)):
+        cases = [(frame, phone_regions(face, frame.shape, region_grid)) for frame, face in faces]
+        legacy_ms, legacy = timed(legacy_detect, cases)
+        full_ms, _ = timed(lambda frame, regions: legacy_detect(frame, regions, stop_at_hit=False), cases)
+        single_ms, single = timed(single_pass_detect, cases)
+        agree = np.mean([a == b for a, b in zip(legacy, single)])
+        area_agree = np.mean(np.concatenate([
+            legacy_area_hits(frame, regions) ==
+            (score_regions(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), regions)[1] > AREA_RATIO_THRESHOLD)
+            for frame, regions in cases]))
+        count = np.mean([len(regions) for _, regions in cases])
+        print(f"{label:<14} {count:>6.1f} {legacy_ms:>14.2f} {full_ms:>15.2f} "
+              f"{single_ms:>12.2f} {np.mean(legacy):>9.1%} {agree:>10.1%} {area_agree:>15.1%}")
+
+
+if __name__ == "__main__":
+    main()
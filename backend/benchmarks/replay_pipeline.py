@@ -0,0 +1,179 @@
+"""
+Headless pipeline benchmark: replays a session trace (see trace_replay.py) into the
+trackers and measures how the rest of the pipeline keeps up.
+
+Reported:
+  observations/sec   tracker inputs delivered by the replayer
+  events/sec         tracker events published on the event bus, per topic
+  end-to-end latency from delivering the observation that completes a detection
+                     to the event reaching an /api/stream (event bus) subscriber
+  dispatcher         queue latency and drops on the way to the cheating detector
+
+By default the trackers, dispatcher and bus are app.py's own (importing app needs
+Flask and the detector dependencies; the cheating detector is warmed up first).
+--standalone wires fresh trackers to an EventDispatcher and EventBus the same way
+app.py does, with a no-op handler in place of the cheating detector.
+
+Run from backend/:
+    python -m benchmarks.replay_pipeline --trace session.trace --speed 0
+    python -m benchmarks.replay_pipeline --synthetic 600 --standalone
+Record a trace by running the app with TRACE_RECORD=session.trace.
+"""
+import argparse
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from trace_replay import TraceRecorder, TraceReplayer
+
+
+def synthetic_trace(path, seconds, mouse_hz=125, seed=0):
+    """
+    Plausible exam session: the pointer circles slowly with a fast flick every few
+    seconds, clicks and scrolls, tab switches every ~15 s, a copy every ~20 s, a
+    second monitor halfway through and a USB device near the end.
+    """
+    rng = np.random.default_rng(seed)
+    recorder = TraceRecorder()
+    start = recorder.started_at
+    step = 1.0 / mouse_hz
+    flick_every = int(3 * mouse_hz)
+    x, y = 800.0, 500.0
+    for i in range(int(seconds * mouse_hz)):
+        t = i * step
+        if i % flick_every < 5:
+            x += 40 if (i // flick_every) % 2 else -40  # ~5000 px/s, reversing each flick
+        else:
+            angle = 2 * math.pi * 0.3 * t
+            x += 200 * 2 * math.pi * 0.3 * -math.sin(angle) * step
+            y += 200 * 2 * math.pi * 0.3 * math.cos(angle) * step
+        recorder.record_move(start + t, int(x + rng.normal(0, 0.3)), int(y))
+    for t in np.arange(1.0, seconds, 2.0):
+        recorder.record("click", start + t, x=int(x), y=int(y), button="Button.left", pressed=True)
+    for t in np.arange(5.0, seconds, 10.0):
+        recorder.record("scroll", start + t, x=int(x), y=int(y), dx=0, dy=-1)
+    titles = ["Exam - Secure Browser", "Google - Search", "Notes.txt - Notepad"]
+    for n, t in enumerate(np.arange(0.0, seconds, 15.0)):
+        recorder.record("window", start + t, value=titles[0] if n % 2 == 0 else titles[n // 2 % 2 + 1])
+    for n, t in enumerate(np.arange(20.0, seconds, 20.0)):
+        recorder.record("clipboard", start + t, value=" ".join(f"word{n}_{k}" for k in range(30)))
+    recorder.record("monitors", start, value=1)
+    recorder.record("monitors", start + seconds / 2, value=2)
+    recorder.record("device", start + seconds * 0.9, value="USB Mass Storage Device")
+    return recorder.save(path)
+
+
+def standalone_pipeline():
+    """The tracker -> dispatcher / event bus wiring of app.py, without Flask or the detectors."""
+    from copy_tracker import CopyTracker
+    from event_bus import EventBus
+    from event_dispatcher import EventDispatcher
+    from mouse_tracker import MouseBehaviorTracker
+    from peripheral_detector import PeripheralDetector
+    from window_tracker import WindowTracker
+
+    bus = EventBus()
+    dispatcher = EventDispatcher(lambda item: None, workers=2, queue_size=10000, name="BenchmarkDispatcher")
+    trackers = {
+        "mouse_tracker": MouseBehaviorTracker(speed_threshold=1500, angle_threshold=90,
+                                              callback=lambda e: dispatcher.submit(("mouse", e))),
+        "window_tracker": WindowTracker(poll_interval=0.5, callback=lambda e: dispatcher.submit(("window", e))),
+        "copy_tracker": CopyTracker(poll_interval=1.0, callback=lambda e: dispatcher.submit(("copy", e))),
+        "peripheral_detector": PeripheralDetector(callback=lambda e: dispatcher.submit(("peripheral", e)))
+    }
+    for topic, name in (("mouse", "mouse_tracker"), ("window", "window_tracker"),
+                        ("copy", "copy_tracker"), ("peripheral", "peripheral_detector")):
+        trackers[name].event_log.attach(bus, topic)
+    return trackers, dispatcher, bus
+
+
+def app_pipeline():
+    import app as exam_app
+    exam_app.cheating_detector.get()  # Load the model now rather than inside the measurement.
+    return exam_app.local_session.trackers(), exam_app.event_dispatcher, exam_app.event_bus
+
+
+def trigger_time(topic, event):
+    """Virtual time of the observation that completed the detection behind `event`."""
+    if topic == "window":
+        return event["timestamp"] + event["duration"]  # logged when the next window appears
+    return event.get("timestamp")
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50:.3f} ms, p95 {p95:.3f} ms, p99 {p99:.3f} ms, max {max(values):.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="Recorded session trace")
+    source.add_argument("--synthetic", type=float, metavar="SECONDS", help="Generate a synthetic trace this long")
+    parser.add_argument("--speed", type=float, default=0, help="Replay speed; 0 = as fast as possible")
+    parser.add_argument("--standalone", action="store_true", help="Use a Flask-free copy of the app wiring")
+    args = parser.parse_args()
+
+    path = args.trace
+    if args.synthetic:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.trace")
+        synthetic_trace(path, args.synthetic)
+    print(f"trace: {path} ({os.path.getsize(path) / 1024:.1f} KiB)")
+
+    trackers, dispatcher, bus = standalone_pipeline() if args.standalone else app_pipeline()
+    dispatcher.start()
+    replayer = TraceReplayer(path, speed=args.speed)
+    subscription = bus.subscribe(topics=["mouse", "window", "copy", "peripheral"], queue_size=10_000_000)
+    received = []
+    receiving = threading.Event()
+    receiving.set()
+
+    def receive():
+        while receiving.is_set():
+            message = subscription.get(timeout=0.1)
+            if message is not None:
+                received.append((time.perf_counter(), message[1], message[2]))
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    stats = replayer.run(**trackers)
+    # Let the dispatcher and the subscriber drain.
+    deadline = time.perf_counter() + 10
+    while dispatcher.queue.qsize() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    receiving.clear()
+    receiver.join()
+    subscription.close()
+    dispatcher.stop()
+    replayer.cleanup()
+
+    print(f"replayed {stats['observations']} observations ({stats['trace_seconds']:.1f} s of session) "
+          f"in {stats['seconds']:.2f} s: {stats['observations_per_second']:.0f} observations/sec")
+    counts = Counter(topic for _, topic, _ in received)
+    for topic, count in sorted(counts.items()):
+        print(f"  {topic:<11} {count:>8} events  {count / stats['seconds']:>10.1f} events/sec")
+    latencies = {}
+    for arrived, topic, event in received:
+        injected = replayer.injection_time(trigger_time(topic, event))
+        if injected is not None:
+            latencies.setdefault(topic, []).append((arrived - injected) * 1000)
+    print("end-to-end latency (observation delivered -> bus subscriber):")
+    for topic, values in sorted(latencies.items()):
+        print(f"  {topic:<11} {percentiles(values)}")
+    print(f"  {'all':<11} {percentiles([v for values in latencies.values() for v in values])}")
+    dispatch = dispatcher.get_stats()
+    print(f"dispatcher: {dispatch['processed']} processed, {dispatch['dropped']} dropped, "
+          f"queue latency p50 <= {dispatch['queue_latency']['p50_ms']} ms, "
+          f"p99 <= {dispatch['queue_latency']['p99_ms']} ms, max depth {dispatch['max_queue_depth']}")
+
+
+if __name__ == "__main__":
+    main()
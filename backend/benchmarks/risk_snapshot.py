@@ -0,0 +1,152 @@
+"""
+Cost and consistency of per-session risk through the RiskLedger (risk_ledger.py).
+
+Reported:
+  posts        risk deltas/sec posted from T threads into one ledger, directly and
+               through EventLog appends as the trackers do
+  snapshots    latency of RiskLedger.snapshot (what /api/risk reads) after N deltas
+               have been posted, with the rolling window holding --window-events of
+               them; it should not grow with N
+  torn reads   writers add 1 to the window and then the copy tracker, over and over,
+               while readers take snapshots. A consistent snapshot has window - copy
+               of 0 or 1; "attributes" reads the trackers' risk_score attributes one
+               after the other, as /api/risk used to, "ledger" reads snapshots. Runs
+               with a 10 us thread switch interval, so threads interleave between
+               reads the way they would on separate cores
+
+Run from backend/:
+    python -m benchmarks.risk_snapshot --threads 1,4
+"""
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+from event_log import EventLog
+from risk_ledger import RiskLedger
+from window_tracker import WindowTracker
+
+
+def posts(threads, seconds, through_log):
+    ledger = RiskLedger()
+    logs = []
+    for _ in range(threads):
+        log = EventLog(schema={"timestamp": "float", "window": "str", "duration": "float", "risk": "int"})
+        log.attach_ledger(ledger, "window")
+        logs.append(log)
+    posted = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def write(i):
+        count = 0
+        while time.perf_counter() < deadline:
+            for _ in range(100):
+                if through_log:
+                    logs[i].append({"timestamp": time.time(), "window": "Search", "duration": 3.0, "risk": 20})
+                else:
+                    ledger.post("window", 20)
+            count += 100
+        posted[i] = count
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=write, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    assert ledger.snapshot()["totals"]["window"] == 20 * sum(posted)
+    print(f"{threads:>7} {'EventLog' if through_log else 'ledger':>9} {sum(posted) / elapsed:>12.0f}")
+
+
+def snapshots(total, window_events, repeats):
+    clock = [0.0]
+    ledger = RiskLedger(clock=lambda: clock[0])
+    trackers = list(ledger.weights)
+    # Spread the deltas so the last window_events fall inside the 60 s window.
+    step = ledger.window_seconds / max(window_events, 1)
+    for i in range(total):
+        clock[0] = i * step
+        ledger.post(trackers[i % len(trackers)], 10, clock[0])
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        ledger.snapshot()
+        latencies.append((time.perf_counter() - started) * 1e6)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{total:>10} {window_events:>14} {p50:>9.1f} {p99:>9.1f}")
+
+
+def torn_reads(seconds, readers):
+    window_tracker, copy_tracker = WindowTracker(), WindowTracker()
+    ledger = RiskLedger()
+    running = [True]
+
+    def write():
+        while running[0]:
+            window_tracker.risk_score += 1
+            ledger.post("window", 1)
+            copy_tracker.risk_score += 1
+            ledger.post("copy", 1)
+
+    def read(how, results):
+        reads = torn = 0
+        while running[0]:
+            if how == "attributes":
+                # As ExamSession.risk_scores read them
+                risks = {"window_risk": getattr(window_tracker, "risk_score", 0),
+                         "copy_risk": getattr(copy_tracker, "risk_score", 0)}
+                window, copy = risks["window_risk"], risks["copy_risk"]
+            else:
+                totals = ledger.snapshot()["totals"]
+                window, copy = totals["window"], totals["copy"]
+            reads += 1
+            torn += not 0 <= window - copy <= 1
+        results.append((reads, torn))
+
+    results = {"attributes": [], "ledger": []}
+    threads = [threading.Thread(target=write)]
+    threads += [threading.Thread(target=read, args=(how, results[how])) for how in results for _ in range(readers)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        running[0] = False
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    for how, counts in results.items():
+        reads, torn = sum(r for r, _ in counts), sum(t for _, t in counts)
+        print(f"{how:<11} {reads:>10} {torn:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", default="1,4", help="Comma-separated posting thread counts")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Duration of each timed run")
+    parser.add_argument("--posted", default="1000,100000,1000000", help="Comma-separated delta counts")
+    parser.add_argument("--window-events", type=int, default=1000, help="Deltas inside the rolling window")
+    parser.add_argument("--repeats", type=int, default=10000, help="Snapshots timed per count")
+    args = parser.parse_args()
+
+    print("posts")
+    print(f"{'threads':>7} {'via':>9} {'deltas/s':>12}")
+    for threads in (int(n) for n in args.threads.split(",")):
+        for through_log in (False, True):
+            posts(threads, args.seconds, through_log)
+    print("\nsnapshots")
+    print(f"{'posted':>10} {'in window':>14} {'p50 us':>9} {'p99 us':>9}")
+    for total in (int(n) for n in args.posted.split(",")):
+        snapshots(total, args.window_events, args.repeats)
+    print("\ntorn reads")
+    print(f"{'read':<11} {'reads':>10} {'torn':>8}")
+    torn_reads(args.seconds, readers=2)
+
+
+if __name__ == "__main__":
+    main()
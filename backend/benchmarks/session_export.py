@@ -0,0 +1,87 @@
+"""
+Export time, file size and read-back time for one mouse event log: the streaming CSV
+route (plain and gzip) versus the columnar Parquet and Arrow exports.
+
+Run from backend/:
+    python -m benchmarks.session_export --events 1000000
+"""
+import argparse
+import csv
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+import columnar_export
+from benchmarks.event_log_memory import MOUSE_SCHEMA, mouse_events
+from csv_export import gzip_chunks, iter_log, stream_csv
+from event_log import EventLog
+
+MOUSE_HEADER = ['timestamp', 'event', 'speed', 'angle_diff', 'position']
+
+
+def mouse_rows(log):
+    # Same columns as /download/mouse_csv.
+    return ([event.get(name, '') for name in MOUSE_HEADER] for event in iter_log(log))
+
+
+def export_csv(log, path, compress):
+    chunks = stream_csv(MOUSE_HEADER, mouse_rows(log))
+    with open(path, "wb") as f:
+        if compress:
+            for data in gzip_chunks(chunks):
+                f.write(data)
+        else:
+            for chunk in chunks:
+                f.write(chunk.encode("utf-8"))
+
+
+def read_csv(path, compress):
+    opener = gzip.open if compress else open
+    with opener(path, "rt", newline="") as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    args = parser.parse_args()
+    columnar_export.logger.setLevel(logging.INFO)
+
+    log = EventLog(MOUSE_SCHEMA, capacity=args.events, spill=False)
+    for event in mouse_events(args.events):
+        log.append(event)
+
+    out_dir = tempfile.mkdtemp(prefix="export-bench-")
+    cases = [
+        ("csv", "mouse.csv", lambda p: export_csv(log, p, False), lambda p: read_csv(p, False)),
+        ("csv + gzip", "mouse.csv.gz", lambda p: export_csv(log, p, True), lambda p: read_csv(p, True)),
+        ("parquet (zstd)", "mouse.parquet", lambda p: columnar_export.export_log(log, p, "parquet"),
+         lambda p: pq.read_table(p).num_rows),
+        ("arrow ipc (zstd)", "mouse.arrow", lambda p: columnar_export.export_log(log, p, "arrow"),
+         lambda p: ipc.open_file(p).read_all().num_rows),
+    ]
+    print(f"{'format':<18} {'export s':>9} {'MiB':>8} {'B/event':>8} {'read s':>8} {'rows':>9}")
+    try:
+        for name, filename, write, read in cases:
+            path = os.path.join(out_dir, filename)
+            start = time.perf_counter()
+            write(path)
+            exported = time.perf_counter() - start
+            size = os.path.getsize(path)
+            start = time.perf_counter()
+            rows = read(path)
+            read_back = time.perf_counter() - start
+            print(f"{name:<18} {exported:>9.2f} {size / 2 ** 20:>8.1f} {size / args.events:>8.1f} "
+                  f"{read_back:>8.2f} {rows:>9}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
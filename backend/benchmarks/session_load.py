@@ -0,0 +1,222 @@
+"""
+Load test for multi-session hosting: N simulated candidates at once, each with its
+own ExamSession, fed with tracker input while dashboard clients poll every session.
+
+For each session count the benchmark
+  creates the sessions through POST /api/sessions,
+  feeds every session mouse samples at --mouse-hz, a tab switch every ~10 s and a
+  copy every ~30 s, pushed into its trackers under the session lock,
+  polls every session once per --poll-interval with the requests a proctor
+  dashboard makes: /api/sessions/<id>/risk, .../mouse_events?since=<cursor> and
+  .../exam_status, plus GET /api/sessions for the overview once a second,
+and reports per-endpoint latency percentiles, achieved vs target request and feed
+rates, and the tracker event dispatcher's queue latency and drops.
+
+Requests go through app.py's WSGI app in-process (Flask test client), so latency is
+the server side only, without sockets. Logging is silenced unless --verbose.
+The registry's shard count comes from SESSION_SHARDS.
+
+Run from backend/:
+    python -m benchmarks.session_load --sessions 10,100,500 --duration 10
+"""
+import argparse
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+class SessionFeeder:
+    """Simulated input for a slice of the sessions, on one thread."""
+
+    def __init__(self, sessions, mouse_hz, seed):
+        self.sessions = sessions
+        self.interval = 1.0 / mouse_hz
+        self.rng = np.random.default_rng(seed)
+        self.observations = 0
+        self.late_ticks = 0
+        self.ticks = 0
+        self.running = False
+        # Per session: phase on the circle, next tab switch and next copy.
+        self.phase = self.rng.uniform(0, 2 * math.pi, len(sessions))
+        now = time.time()
+        self.next_switch = now + self.rng.uniform(0, 10, len(sessions))
+        self.next_copy = now + self.rng.uniform(0, 30, len(sessions))
+        self.tabs = [0] * len(sessions)
+
+    def run(self):
+        self.running = True
+        next_tick = time.perf_counter()
+        while self.running:
+            now = time.time()
+            step = self.ticks * self.interval
+            for i, session in enumerate(self.sessions):
+                angle = self.phase[i] + 2 * math.pi * 0.3 * step
+                x, y = 800 + 200 * math.cos(angle), 500 + 200 * math.sin(angle)
+                if self.ticks % 50 < 2:
+                    x += 300 if (self.ticks // 50) % 2 else -300  # An occasional flick
+                with session.lock:
+                    session.mouse_tracker.on_move(int(x), int(y), timestamp=now)
+                    self.observations += 1
+                    if now >= self.next_switch[i]:
+                        self.tabs[i] += 1
+                        session.window_tracker.observe("Exam" if self.tabs[i] % 2 == 0 else "Search", now)
+                        self.next_switch[i] = now + self.rng.uniform(5, 15)
+                        self.observations += 1
+                    if now >= self.next_copy[i]:
+                        session.copy_tracker.observe(f"copied text {self.ticks} " * 8, now)
+                        self.next_copy[i] = now + self.rng.uniform(20, 40)
+                        self.observations += 1
+            self.ticks += 1
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late_ticks += 1
+
+    def stop(self):
+        self.running = False
+
+
+class DashboardClient:
+    """Polls a slice of the sessions, each once per `poll_interval`, on one thread."""
+
+    def __init__(self, flask_app, session_ids, poll_interval, overview=False):
+        self.client = flask_app.test_client()
+        self.session_ids = session_ids
+        self.poll_interval = poll_interval
+        self.overview = overview
+        self.cursors = dict.fromkeys(session_ids, 0)
+        self.latencies = defaultdict(list)
+        self.errors = 0
+        self.running = False
+
+    def _get(self, name, url):
+        started = time.perf_counter()
+        response = self.client.get(url)
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            self.errors += 1
+        return response
+
+    def run(self):
+        self.running = True
+        started = time.perf_counter()
+        spacing = self.poll_interval / max(len(self.session_ids), 1)
+        cycle = 0
+        next_overview = started
+        while self.running:
+            for position, session_id in enumerate(self.session_ids):
+                # Spread this client's sessions evenly over the poll interval.
+                due = started + cycle * self.poll_interval + position * spacing
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if not self.running:
+                    break
+                base = f"/api/sessions/{session_id}"
+                self._get("risk", f"{base}/risk")
+                events = self._get("mouse_events", f"{base}/mouse_events?since={self.cursors[session_id]}")
+                if events.status_code == 200:
+                    self.cursors[session_id] = events.get_json()["next_cursor"]
+                self._get("exam_status", f"{base}/exam_status")
+                if self.overview and time.perf_counter() >= next_overview:
+                    self._get("sessions_overview", "/api/sessions")
+                    next_overview += 1.0
+            cycle += 1
+
+    def stop(self):
+        self.running = False
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50:7.3f}  p95 {p95:7.3f}  p99 {p99:7.3f}  max {max(values):8.3f} ms"
+
+
+def run_level(exam_app, count, args):
+    client = exam_app.app.test_client()
+    session_ids = [f"load-{count}-{i}" for i in range(count)]
+    create_ms = []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        response = client.post("/api/sessions", json={"session_id": session_id})
+        create_ms.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 201, response.get_data(as_text=True)
+    sessions = [exam_app.sessions.get(session_id) for session_id in session_ids]
+
+    feeders = [SessionFeeder(sessions[i::args.feeders], args.mouse_hz, seed=i)
+               for i in range(min(args.feeders, count))]
+    clients = [DashboardClient(exam_app.app, session_ids[i::args.clients], args.poll_interval, overview=i == 0)
+               for i in range(min(args.clients, count))]
+    dispatcher = exam_app.event_dispatcher
+    processed_before, dropped_before = dispatcher.processed, dispatcher.dropped
+    threads = [threading.Thread(target=worker.run, daemon=True) for worker in feeders + clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    for worker in feeders + clients:
+        worker.stop()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = defaultdict(list)
+    for dashboard in clients:
+        for name, values in dashboard.latencies.items():
+            latencies[name].extend(values)
+    requests = sum(len(values) for values in latencies.values())
+    target_requests = 3 * count / args.poll_interval + 1
+    observations = sum(feeder.observations for feeder in feeders)
+    target_observations = count * args.mouse_hz
+    late = sum(feeder.late_ticks for feeder in feeders) / max(sum(feeder.ticks for feeder in feeders), 1)
+
+    print(f"\n== {count} sessions, {elapsed:.1f} s ==")
+    print(f"create session  {percentiles(create_ms)}")
+    for name in ("risk", "mouse_events", "exam_status", "sessions_overview"):
+        print(f"{name:<15} {percentiles(latencies[name])}")
+    print(f"requests: {requests / elapsed:.0f}/s (target {target_requests:.0f}/s), "
+          f"errors {sum(d.errors for d in clients)}")
+    print(f"feed: {observations / elapsed:.0f} observations/s (target {target_observations:.0f}/s), "
+          f"{late:.1%} of feeder ticks late")
+    stats = dispatcher.get_stats()
+    print(f"dispatcher: {stats['processed'] - processed_before} events, "
+          f"{stats['dropped'] - dropped_before} dropped, queue latency p99 <= {stats['queue_latency']['p99_ms']} ms, "
+          f"max depth {stats['max_queue_depth']}")
+
+    for session_id in session_ids:
+        client.delete(f"/api/sessions/{session_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="10,100,500", help="Comma-separated session counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per session count")
+    parser.add_argument("--mouse-hz", type=float, default=20.0, help="Mouse samples per second per session")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls of one session")
+    parser.add_argument("--clients", type=int, default=8, help="Dashboard polling threads")
+    parser.add_argument("--feeders", type=int, default=4, help="Input feeding threads")
+    parser.add_argument("--verbose", action="store_true", help="Keep tracker and dispatcher logging")
+    args = parser.parse_args()
+
+    import app as exam_app
+    if not args.verbose:
+        logging.disable(logging.WARNING)  # Trackers log every detection.
+    exam_app.cheating_detector.get()  # Load the model now rather than in the first dispatched event.
+    exam_app.event_dispatcher.start()
+    print(f"registry shards: {exam_app.SESSION_SHARDS}, mouse {args.mouse_hz:g} Hz/session, "
+          f"poll every {args.poll_interval:g} s/session, {args.clients} clients, {args.feeders} feeders")
+    for count in (int(n) for n in args.sessions.split(",")):
+        run_level(exam_app, count, args)
+    exam_app.event_dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
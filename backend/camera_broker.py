@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+
+import cv2
+
+from frame_pipeline import DropOldestQueue, RateMeter
+
+logger = logging.getLogger("CameraBroker")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class FrameSubscription:
+    """
+    One consumer's view of the broker's frames. Frames are the broker's decoded arrays
+    marked read-only, so every subscriber shares the same memory; copy before drawing.
+    """
+
+    def __init__(self, broker, name, max_fps=None, queue_size=1):
+        self.broker = broker
+        self.name = name
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.queue = DropOldestQueue(queue_size)
+        self.last_delivered = 0.0
+        self.delivered = 0
+        self.rate_skipped = 0
+        self.closed = False
+
+    @property
+    def active(self):
+        return not self.closed and self.broker.running
+
+    def offer(self, frame, timestamp):
+        if timestamp - self.last_delivered < self.min_interval:
+            self.rate_skipped += 1
+            return
+        self.last_delivered = timestamp
+        self.delivered += 1
+        self.queue.put((frame, timestamp))
+
+    def get(self, timeout=None):
+        """Return the newest (frame, timestamp) pair, or None if none arrived in time."""
+        return self.queue.get(timeout)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+    def get_stats(self):
+        return {
+            "name": self.name,
+            "max_fps": round(1.0 / self.min_interval, 2) if self.min_interval else None,
+            "delivered": self.delivered,
+            "rate_skipped": self.rate_skipped,
+            "dropped": self.queue.dropped
+        }
+
+
+class CameraBroker:
+    """
+    Owns a single capture device, decodes each frame once and fans it out to any number
+    of FrameSubscription consumers, each with its own rate limit. The device is opened
+    when the first subscriber arrives and released when the last one leaves.
+    """
+
+    def __init__(self, source=0):
+        # Device index, file path/URL, or a factory returning a VideoCapture-like object.
+        self.source = source
+        self.running = False
+        self.capture_meter = RateMeter()
+        self.subscribers = []
+        self.thread = None
+        self._lock = threading.Lock()
+        self._lifecycle_lock = threading.RLock()
+
+    def subscribe(self, name, max_fps=None, queue_size=1):
+        subscription = FrameSubscription(self, name, max_fps=max_fps, queue_size=queue_size)
+        with self._lifecycle_lock:
+            with self._lock:
+                self.subscribers.append(subscription)
+            if not self.running:
+                self._start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lifecycle_lock:
+            with self._lock:
+                if subscription in self.subscribers:
+                    self.subscribers.remove(subscription)
+                remaining = len(self.subscribers)
+            if remaining == 0:
+                self._stop()
+
+    def _start(self):
+        # A previous capture thread that exited on a read failure may still be releasing.
+        self._stop()
+        cap = self.source() if callable(self.source) else cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            logger.error("Cannot open webcam.")
+            cap.release()
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, args=(cap,), daemon=True)
+        self.thread.start()
+        logger.info("Camera broker opened device %s.", self.source)
+        return True
+
+    def _stop(self):
+        self.running = False
+        if self.thread is not None and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def _capture_loop(self, cap):
+        while self.running:
+            ret, frame = cap.read()
+            if not ret:
+                logger.error("Failed to capture frame.")
+                self.running = False
+                break
+            # Shared with every subscriber without copying, so forbid in-place writes.
+            frame.setflags(write=False)
+            timestamp = time.time()
+            self.capture_meter.tick()
+            with self._lock:
+                for subscription in self.subscribers:
+                    subscription.offer(frame, timestamp)
+        cap.release()
+        logger.info("Camera broker released device %s.", self.source)
+
+    def get_stats(self):
+        with self._lock:
+            subscribers = [s.get_stats() for s in self.subscribers]
+        return {
+            "running": self.running,
+            "capture_fps": round(self.capture_meter.rate(), 2),
+            "frames_captured": self.capture_meter.total,
+            "subscribers": subscribers
+        }
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker(source=0):
+    """Process-wide broker shared by face_detector and CameraDetector."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = CameraBroker(source)
+        return _broker
@@ -1,23 +1,46 @@
 import cv2
 import numpy as np
-from datetime import datetime
 import logging
 import threading
 import time
-import sounddevice as sd
-import scipy.io.wavfile as wav
 import os
 from typing import Dict, Any, List
+from camera_broker import get_broker
+from audio_capture import get_audio_capture
+from evidence_store import EvidenceStore
+from event_log import EventLog
+from face_tracking import HaarFaceTracker, detect_eyes
+from phone_detection import phone_regions, score_regions, EDGE_DENSITY_THRESHOLD, AREA_RATIO_THRESHOLD
+
+CAMERA_EVENT_SCHEMA = {
+    "timestamp": "float", "event_type": "str", "confidence": "float", "evidence_id": "str"
+}
+DEFAULT_EVIDENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "evidence")
 
 class CameraDetector:
-    def __init__(self):
-        self.camera = cv2.VideoCapture(0)
+    def __init__(self, broker=None, analysis_fps=10, evidence_store=None, audio_capture=None,
+                 tracking=True, detect_every=5, detection_scale=0.6, phone_grid=None):
+        # Frames come from the shared camera broker instead of a private VideoCapture.
+        self.broker = broker if broker is not None else get_broker()
+        self.analysis_fps = analysis_fps
+        self.subscription = None
+        # Suspicious events reference frames stored here instead of embedding them.
+        self.evidence_store = evidence_store if evidence_store is not None else EvidenceStore(DEFAULT_EVIDENCE_DIR)
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        # Tracking mode: downscaled detection every `detect_every` frames (or on tracker
+        # loss), template tracking in between and eye search limited to the upper face.
+        # tracking=False keeps the full-frame detection on every frame.
+        self.tracking = tracking
+        self.face_tracker = HaarFaceTracker(self.face_cascade, detect_every=detect_every,
+                                            detection_scale=detection_scale) if tracking else None
+        self.last_faces = []
+        self.last_eye_count = None
+        # Extra (cols, rows) sliding grid of phone regions on top of the four fixed ones.
+        self.phone_grid = phone_grid
         
-        # Initialize audio recording with more sensitive settings
-        self.audio_sample_rate = 44100
-        self.audio_channels = 1
+        # Audio comes from the shared capture service (same microphone stream as VoiceDetector).
+        self.audio_capture = audio_capture if audio_capture is not None else get_audio_capture()
         self.audio_duration = 0.5  # Reduced duration for faster response
         self.audio_threshold = 0.05  # Lower threshold for more sensitive voice detection
         self.is_recording = False
@@ -26,7 +49,7 @@ class CameraDetector:
         self.is_running = False
         self.detection_thread = None
         self.last_frame = None
-        self.suspicious_events = []
+        self.suspicious_events = EventLog(schema=CAMERA_EVENT_SCHEMA)
         self.face_detection_count = 0
         self.no_face_count = 0
         self.phone_detection_count = 0
@@ -49,6 +72,7 @@ class CameraDetector:
         """Start the camera and audio detection threads"""
         if not self.is_running:
             self.is_running = True
+            self.subscription = self.broker.subscribe("haar_cascade", max_fps=self.analysis_fps)
             self.detection_thread = threading.Thread(target=self._detection_loop)
             self.detection_thread.daemon = True
             self.detection_thread.start()
@@ -71,21 +95,25 @@ class CameraDetector:
         if self.audio_thread:
             self.audio_thread.join()
             
-        self.camera.release()
+        if self.subscription is not None:
+            self.subscription.close()
+            self.subscription = None
         logging.info("Camera and audio detection stopped")
 
     def _audio_monitoring_loop(self):
         """Monitor audio for voice detection with enhanced sensitivity"""
+        subscription = self.audio_capture.subscribe("camera_voice_counter")
+        block = int(self.audio_duration * subscription.rate)
         while self.is_recording:
             try:
-                # Record audio for a short duration
-                audio_data = sd.rec(
-                    int(self.audio_duration * self.audio_sample_rate),
-                    samplerate=self.audio_sample_rate,
-                    channels=self.audio_channels,
-                    dtype='float32'
-                )
-                sd.wait()
+                # Consecutive blocks of the continuous capture stream, with no gaps between them
+                samples, _ = subscription.read(block, block, timeout=1.0)
+                if len(samples) < block:
+                    if not subscription.active:
+                        logging.error("Audio capture stopped")
+                        time.sleep(1)
+                    continue
+                audio_data = samples.astype(np.float32) / 32768.0
                 
                 # Calculate audio level with enhanced sensitivity
                 audio_level = np.abs(audio_data).mean()
@@ -103,16 +131,21 @@ class CameraDetector:
             except Exception as e:
                 logging.error(f"Error in audio monitoring: {str(e)}")
                 time.sleep(0.1)
+        subscription.close()
 
     def _detection_loop(self):
         """Main detection loop"""
         while self.is_running:
             try:
-                ret, frame = self.camera.read()
-                if not ret:
-                    logging.error("Failed to capture frame")
+                item = self.subscription.get(timeout=1.0)
+                if item is None:
+                    if not self.subscription.active:
+                        logging.error("Failed to capture frame")
+                        time.sleep(1)
                     continue
 
+                # Read-only view shared with other broker subscribers.
+                frame, _ = item
                 self.last_frame = frame
                 self._analyze_frame(frame)
                 
@@ -122,8 +155,6 @@ class CameraDetector:
                        current_status['phone_detected'], 
                        current_status['looking_away']]):
                     logging.info(f"Current status: {current_status}")
-                
-                time.sleep(0.1)  # Reduce CPU usage
             except Exception as e:
                 logging.error(f"Error in detection loop: {str(e)}")
                 time.sleep(1)  # Wait a bit before retrying
@@ -134,7 +165,11 @@ class CameraDetector:
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
             # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+            if self.tracking:
+                faces = self.face_tracker.update(gray)
+            else:
+                faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+            self.last_faces = faces
             
             # Multiple faces detection
             if len(faces) > 1:
@@ -147,6 +182,7 @@ class CameraDetector:
 
             # No face detection
             if len(faces) == 0:
+                self.last_eye_count = None
                 self.no_face_count += 1
                 if self.no_face_count >= self.NO_FACE_THRESHOLD:
                     self._log_suspicious_event("Face not detected - possible absence")
@@ -155,7 +191,7 @@ class CameraDetector:
                 self.no_face_count = 0
                 self._analyze_face_position(faces[0], frame)
                 self._analyze_eye_contact(faces[0], gray)
-                self._detect_phone(faces[0], frame)
+                self._detect_phone(faces[0], gray)
         except Exception as e:
             logging.error(f"Error in frame analysis: {str(e)}")
 
@@ -178,9 +214,13 @@ class CameraDetector:
 
     def _analyze_eye_contact(self, face, gray):
         """Analyze if the person is looking at the screen"""
-        x, y, w, h = face
-        roi_gray = gray[y:y+h, x:x+w]
-        eyes = self.eye_cascade.detectMultiScale(roi_gray)
+        if self.tracking:
+            eyes = detect_eyes(self.eye_cascade, gray, face)
+        else:
+            x, y, w, h = face
+            roi_gray = gray[y:y+h, x:x+w]
+            eyes = self.eye_cascade.detectMultiScale(roi_gray)
+        self.last_eye_count = len(eyes)
         
         if len(eyes) < 2:  # Less than two eyes detected
             self.looking_away_count += 1
@@ -190,61 +230,16 @@ class CameraDetector:
         else:
             self.looking_away_count = 0
 
-    def _detect_phone(self, face, frame):
+    def _detect_phone(self, face, gray):
         """Enhanced phone detection with more sensitive parameters"""
-        x, y, w, h = face
-        
-        # Define multiple regions of interest for phone detection
-        regions = [
-            # 1. Near the face (holding phone to ear)
-            (max(0, y-100), min(frame.shape[0], y+h+100), 
-             max(0, x-100), min(frame.shape[1], x+w+100)),
-            
-            # 2. Below the face (looking down at phone)
-            (min(frame.shape[0], y+h), min(frame.shape[0], y+h+200),
-             max(0, x-150), min(frame.shape[1], x+w+150)),
-            
-            # 3. Left side of face (phone in left hand)
-            (max(0, y-100), min(frame.shape[0], y+h+100),
-             max(0, x-200), max(0, x-50)),
-            
-            # 4. Right side of face (phone in right hand)
-            (max(0, y-100), min(frame.shape[0], y+h+100),
-             min(frame.shape[1], x+w+50), min(frame.shape[1], x+w+200))
-        ]
-        
-        phone_detected = False
-        
-        for y1, y2, x1, x2 in regions:
-            roi = frame[y1:y2, x1:x2]
-            if roi.size == 0:
-                continue
-                
-            # Convert to grayscale
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            
-            # Apply adaptive thresholding with more sensitive parameters
-            thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                         cv2.THRESH_BINARY_INV, 7, 2)
-            
-            # Detect edges with lower thresholds for better sensitivity
-            edges = cv2.Canny(gray, 30, 100)
-            
-            # Calculate edge density
-            edge_density = np.sum(edges > 0) / (edges.size + 1e-6)
-            
-            # Calculate contour area ratio
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                max_contour = max(contours, key=cv2.contourArea)
-                contour_area = cv2.contourArea(max_contour)
-                area_ratio = contour_area / (roi.shape[0] * roi.shape[1])
-                
-                # More sensitive phone detection conditions
-                if edge_density > 0.1 or area_ratio > 0.15:  # Lowered thresholds
-                    phone_detected = True
-                    logging.info(f"Phone detected! Edge density: {edge_density}, Area ratio: {area_ratio}")
-                    break
+        # Threshold/edge maps are built once for all regions; see phone_detection.score_regions.
+        regions = phone_regions(face, gray.shape, self.phone_grid)
+        edge_density, area_ratio = score_regions(gray, regions)
+        hits = np.flatnonzero((edge_density > EDGE_DENSITY_THRESHOLD) | (area_ratio > AREA_RATIO_THRESHOLD))
+        phone_detected = len(hits) > 0
+        if phone_detected:
+            i = hits[0]
+            logging.info(f"Phone detected! Edge density: {edge_density[i]}, Area ratio: {area_ratio[i]}")
         
         if phone_detected:
             self.phone_detection_count += 1
@@ -258,15 +253,15 @@ class CameraDetector:
     def _log_suspicious_event(self, event_type: str):
         """Log a suspicious event"""
         event = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': time.time(),
             'event_type': event_type,
             'confidence': 0.9,  # Increased confidence
-            'frame': self.last_frame.tolist() if self.last_frame is not None else None
+            'evidence_id': self.evidence_store.put(self.last_frame)
         }
         self.suspicious_events.append(event)
         logging.warning(f"Suspicious activity detected: {event_type}")
 
-    def get_suspicious_events(self) -> List[Dict[str, Any]]:
+    def get_suspicious_events(self) -> EventLog:
         """Get all suspicious events"""
         return self.suspicious_events
 
@@ -289,10 +284,12 @@ class CameraDetector:
 
     def reset(self):
         """Reset the detector state"""
-        self.suspicious_events = []
+        self.suspicious_events = self.suspicious_events.fresh()
         self.face_detection_count = 0
         self.no_face_count = 0
         self.phone_detection_count = 0
         self.looking_away_count = 0
         self.voice_detection_count = 0
+        if self.face_tracker is not None:
+            self.face_tracker.reset()
         self.face_position_history = [] 
\ No newline at end of file
@@ -1,12 +1,124 @@
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Callable
 import logging
+import threading
+import time
+from collections import deque
 from datetime import datetime
 import json
+from event_log import EventLog
+
+# Reasons and per-feature values are stored with the event as JSON.
+SUSPICIOUS_ACTIVITY_SCHEMA = {
+    "timestamp": "float", "anomaly_score": "float", "weighted_score": "float"
+}
+
+def _is_click(event: Dict[str, Any]) -> bool:
+    # MouseBehaviorTracker logs clicks as "Mouse click <button>"; older logs used type="click".
+    return event.get('type') == 'click' or str(event.get('event', '')).startswith('Mouse click')
+
+
+def _is_switch(event: Dict[str, Any]) -> bool:
+    # Every WindowTracker event marks a switch away from `window`.
+    return event.get('type') == 'switch' or 'window' in event
+
+
+def _epoch(timestamp) -> float:
+    return timestamp.timestamp() if isinstance(timestamp, datetime) else float(timestamp)
+
+
+class _WindowedSum:
+    """Running sum and count of values whose timestamps fall inside a sliding window."""
 
-class CheatingDetector:
     def __init__(self):
+        self.items = deque()
+        self.total = 0.0
+
+    def add(self, timestamp: float, value: float = 1.0):
+        self.items.append((timestamp, value))
+        self.total += value
+
+    def evict(self, cutoff: float):
+        while self.items and self.items[0][0] < cutoff:
+            self.total -= self.items.popleft()[1]
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StreamingFeatureAggregator:
+    """
+    Maintains the CheatingDetector features for one session over a sliding time window.
+    Each event updates running sums in O(1); expired events are evicted from the front
+    of per-feature deques, so every event is added and removed exactly once.
+    """
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self.mouse_speed = _WindowedSum()
+        self.clicks = _WindowedSum()
+        self.window_switches = _WindowedSum()
+        self.copies = _WindowedSum()
+        self.peripherals = _WindowedSum()
+        self.voice_confidence = _WindowedSum()
+        self.face_risk = 0.0
+        self.first_seen = None
+        self.last_seen = None
+        self.events_since_score = 0
+        self._lock = threading.Lock()
+
+    def add(self, source: str, event: Dict[str, Any]):
+        timestamp = _epoch(event.get('timestamp', time.time()))
+        with self._lock:
+            if self.first_seen is None:
+                self.first_seen = timestamp
+            self.last_seen = timestamp if self.last_seen is None else max(self.last_seen, timestamp)
+            self.events_since_score += 1
+            if source == 'mouse':
+                self.mouse_speed.add(timestamp, event.get('speed', 0))
+                if _is_click(event):
+                    self.clicks.add(timestamp)
+            elif source == 'window':
+                if _is_switch(event):
+                    self.window_switches.add(timestamp)
+            elif source == 'copy':
+                self.copies.add(timestamp)
+            elif source == 'peripheral':
+                self.peripherals.add(timestamp)
+            elif source == 'voice':
+                self.voice_confidence.add(timestamp, event.get('confidence', 0))
+            elif source == 'face':
+                # Face risk is a cumulative score, like face_detector's risk_score.
+                self.face_risk += event.get('risk', 0)
+
+    def features(self, now: Optional[float] = None) -> np.ndarray:
+        """Feature vector in CheatingDetector.feature_names order."""
+        now = time.time() if now is None else now
+        cutoff = now - self.window_seconds
+        with self._lock:
+            for windowed in (self.mouse_speed, self.clicks, self.window_switches,
+                             self.copies, self.peripherals, self.voice_confidence):
+                windowed.evict(cutoff)
+            # Rates are per minute over the window, or over the session so far if shorter.
+            span_minutes = (min(self.window_seconds, now - self.first_seen) / 60) if self.first_seen is not None else 0
+            self.events_since_score = 0
+            return np.array([
+                self.mouse_speed.total / len(self.mouse_speed) if len(self.mouse_speed) else 0,
+                len(self.clicks) / span_minutes if span_minutes > 0 else 0,
+                len(self.window_switches) / span_minutes if span_minutes > 0 else 0,
+                len(self.copies),
+                len(self.peripherals),
+                self.face_risk,
+                self.voice_confidence.total / len(self.voice_confidence) if len(self.voice_confidence) else 0
+            ], dtype=float)
+
+
+class CheatingDetector:
+    def __init__(self, risk_ledger: Optional[Callable[[str], Any]] = None):
+        # risk_ledger(session_id) -> the session's RiskLedger (or None), which its
+        # suspicious activities count toward.
+        self.risk_ledger = risk_ledger
         self.model = IsolationForest(contamination=0.1, random_state=42)
         self.feature_names = [
             'mouse_speed', 'mouse_click_frequency', 'window_switch_frequency',
@@ -22,10 +134,20 @@ class CheatingDetector:
             'face_risk_score': 1.8,
             'voice_detection_score': 1.6
         }
-        self.suspicious_activities = []
+        # The default session's log; other sessions get their own via get_suspicious_activities.
+        self.suspicious_activities = EventLog(schema=SUSPICIOUS_ACTIVITY_SCHEMA)
+        self._attach_ledger(self.suspicious_activities, 'default')
+        self.session_activities: Dict[str, EventLog] = {}
         self.is_trained = False
         self.threshold = -0.5  # Anomaly score threshold
 
+        # Streaming per-session features, scored together on a fixed cadence.
+        self.window_seconds = 60.0
+        self.aggregators: Dict[str, StreamingFeatureAggregator] = {}
+        self._aggregators_lock = threading.Lock()
+        self.scoring_running = False
+        self.scoring_thread = None
+
     def extract_features(self, logs: Dict[str, Any]) -> np.ndarray:
         """Extract features from various log types"""
         features = np.zeros(len(self.feature_names))
@@ -39,7 +161,7 @@ class CheatingDetector:
                 features[0] = np.mean(speeds) if speeds else 0
                 
                 # Calculate click frequency (clicks per minute)
-                clicks = sum(1 for event in mouse_events if event.get('type') == 'click')
+                clicks = sum(1 for event in mouse_events if _is_click(event))
                 time_span = (mouse_events[-1]['timestamp'] - mouse_events[0]['timestamp']).total_seconds() / 60
                 features[1] = clicks / time_span if time_span > 0 else 0
 
@@ -47,7 +169,7 @@ class CheatingDetector:
         if 'window_events' in logs:
             window_events = logs['window_events']
             if window_events:
-                switches = sum(1 for event in window_events if event.get('type') == 'switch')
+                switches = sum(1 for event in window_events if _is_switch(event))
                 time_span = (window_events[-1]['timestamp'] - window_events[0]['timestamp']).total_seconds() / 60
                 features[2] = switches / time_span if time_span > 0 else 0
 
@@ -82,7 +204,7 @@ class CheatingDetector:
         self.is_trained = True
         logging.info("Cheating detection model trained successfully")
 
-    def detect_cheating(self, current_logs: Dict[str, Any]) -> Dict[str, Any]:
+    def detect_cheating(self, current_logs: Dict[str, Any], session_id: str = 'default') -> Dict[str, Any]:
         """Detect potential cheating based on current logs"""
         if not self.is_trained:
             return {
@@ -94,7 +216,10 @@ class CheatingDetector:
 
         features = self.extract_features(current_logs)
         anomaly_score = self.model.score_samples([features])[0]
-        
+        return self._evaluate(features, anomaly_score, session_id)
+
+    def _evaluate(self, features: np.ndarray, anomaly_score: float, session_id: str = 'default') -> Dict[str, Any]:
+        """Turn one feature vector and its anomaly score into a detection result"""
         # Calculate weighted anomaly score
         weighted_score = np.sum(features * np.array(list(self.feature_weights.values())))
         normalized_score = weighted_score / np.sum(list(self.feature_weights.values()))
@@ -121,8 +246,8 @@ class CheatingDetector:
 
         # Log suspicious activity
         if is_cheating:
-            self.suspicious_activities.append({
-                'timestamp': datetime.now().isoformat(),
+            self.get_suspicious_activities(session_id).append({
+                'timestamp': time.time(),
                 'anomaly_score': float(anomaly_score),
                 'weighted_score': float(normalized_score),
                 'reasons': reasons,
@@ -130,17 +255,99 @@ class CheatingDetector:
             })
 
         return {
-            'is_cheating': is_cheating,
+            'is_cheating': bool(is_cheating),
             'confidence': float(1 - (anomaly_score + 1) / 2),  # Normalize to [0,1]
             'reasons': reasons,
-            'should_pause': is_cheating and len(reasons) >= 2  # Pause if multiple suspicious activities
+            'should_pause': bool(is_cheating and len(reasons) >= 2)  # Pause if multiple suspicious activities
         }
 
-    def get_suspicious_activities(self) -> List[Dict[str, Any]]:
-        """Get list of all suspicious activities"""
-        return self.suspicious_activities
+    def observe(self, session_id: str, source: str, event: Dict[str, Any]):
+        """Fold one tracker event into the session's sliding-window features (O(1))"""
+        with self._aggregators_lock:
+            aggregator = self.aggregators.get(session_id)
+            if aggregator is None:
+                aggregator = StreamingFeatureAggregator(self.window_seconds)
+                self.aggregators[session_id] = aggregator
+        aggregator.add(source, event)
+
+    def remove_session(self, session_id: str):
+        with self._aggregators_lock:
+            self.aggregators.pop(session_id, None)
+            self.session_activities.pop(session_id, None)
+
+    def score_sessions(self, session_ids: Optional[List[str]] = None,
+                       now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Score the current window of every (or the given) session with one score_samples call"""
+        with self._aggregators_lock:
+            if session_ids is None:
+                session_ids = list(self.aggregators)
+            aggregators = [(sid, self.aggregators[sid]) for sid in session_ids if sid in self.aggregators]
+        if not aggregators:
+            return {}
+        if not self.is_trained:
+            return {sid: {
+                'is_cheating': False,
+                'confidence': 0,
+                'reasons': ['Model not trained yet'],
+                'should_pause': False
+            } for sid, _ in aggregators}
+
+        X = np.vstack([aggregator.features(now) for _, aggregator in aggregators])
+        anomaly_scores = self.model.score_samples(X)
+        return {sid: self._evaluate(features, anomaly_score, sid)
+                for (sid, _), features, anomaly_score in zip(aggregators, X, anomaly_scores)}
+
+    def start_scoring(self, interval: float = 2.0,
+                      on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        """Score all sessions every `interval` seconds on a background thread"""
+        if self.scoring_running:
+            return
+        self.scoring_running = True
+
+        def loop():
+            while self.scoring_running:
+                time.sleep(interval)
+                try:
+                    results = self.score_sessions()
+                except Exception as e:
+                    logging.error(f"Error scoring sessions: {str(e)}")
+                    continue
+                if on_result:
+                    for session_id, result in results.items():
+                        on_result(session_id, result)
+
+        self.scoring_thread = threading.Thread(target=loop, daemon=True)
+        self.scoring_thread.start()
+        logging.info(f"Cheating detection scoring every {interval}s")
+
+    def stop_scoring(self):
+        self.scoring_running = False
+        if self.scoring_thread:
+            self.scoring_thread.join()
+            self.scoring_thread = None
+
+    def get_suspicious_activities(self, session_id: str = 'default') -> EventLog:
+        """Get the suspicious activities logged for a session"""
+        if session_id == 'default':
+            return self.suspicious_activities
+        with self._aggregators_lock:
+            log = self.session_activities.get(session_id)
+            if log is None:
+                # Same schema and bus topic as the default session's log.
+                log = self.suspicious_activities.fresh()
+                log.attach(log.bus, log.topic, session_id)
+                self._attach_ledger(log, session_id)
+                self.session_activities[session_id] = log
+        return log
+
+    def _attach_ledger(self, log: EventLog, session_id: str):
+        ledger = self.risk_ledger(session_id) if self.risk_ledger else None
+        log.attach_ledger(ledger, 'suspicious_activity')
 
     def reset(self):
         """Reset the detector state"""
-        self.suspicious_activities = []
-        self.is_trained = False 
\ No newline at end of file
+        self.suspicious_activities = self.suspicious_activities.fresh()
+        self.is_trained = False
+        with self._aggregators_lock:
+            self.aggregators = {}
+            self.session_activities = {} 
\ No newline at end of file
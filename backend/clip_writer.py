@@ -0,0 +1,106 @@
+import logging
+import os
+import queue
+import threading
+import time
+import wave
+
+try:
+    import soundfile
+except ImportError:  # FLAC needs libsndfile; fall back to plain WAV without it.
+    soundfile = None
+
+logger = logging.getLogger("ClipWriter")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class ClipWriter:
+    """
+    Writes mono int16 audio clips on a background thread so the caller never waits
+    on encoding or disk. Clips are FLAC when soundfile is installed, else WAV.
+    `submit` picks the filename up front and returns it immediately; if the queue is
+    full the clip is dropped and counted. Files are written under a temporary name
+    and renamed into place, so a path that exists is always a complete clip.
+    """
+
+    def __init__(self, directory, fmt=None, queue_size=32):
+        self.directory = directory
+        self.format = fmt or ("flac" if soundfile is not None else "wav")
+        if self.format == "flac" and soundfile is None:
+            raise ValueError("FLAC clips require the soundfile package")
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.last_write_seconds = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Write everything already queued, then stop."""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, samples, rate, name):
+        """Queue `samples` to be written as <name>.<format>; returns the filename or None if dropped."""
+        filename = f"{name}.{self.format}"
+        try:
+            self.queue.put_nowait((samples, rate, filename))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Clip queue full, dropped %s", filename)
+            return None
+        return filename
+
+    def _run(self):
+        while self.running or not self.queue.empty():
+            try:
+                samples, rate, filename = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            path = os.path.join(self.directory, filename)
+            tmp_path = path + ".tmp"
+            start = time.perf_counter()
+            try:
+                if self.format == "flac":
+                    soundfile.write(tmp_path, samples, rate, format="FLAC", subtype="PCM_16")
+                else:
+                    with wave.open(tmp_path, "wb") as wf:
+                        wf.setnchannels(1)
+                        wf.setsampwidth(2)
+                        wf.setframerate(rate)
+                        wf.writeframes(samples.tobytes())
+                os.replace(tmp_path, path)
+            except Exception as e:
+                self.errors += 1
+                logger.error("Failed to write clip %s: %s", filename, e)
+                continue
+            self.last_write_seconds = time.perf_counter() - start
+            self.written += 1
+            self.bytes_written += os.path.getsize(path)
+
+    def get_stats(self):
+        return {
+            "format": self.format,
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "bytes_written": self.bytes_written,
+            "last_write_seconds": self.last_write_seconds
+        }
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+from event_log import lookup_strings
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Only the columnar exports need pyarrow.
+    pa = None
+
+logger = logging.getLogger("ColumnarExport")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Columnar export requires pyarrow (pip install pyarrow)")
+
+
+def arrow_schema(log):
+    """
+    Arrow schema for an EventLog: seq, then one typed, nullable column per schema
+    field ("xy" fields become <name>_x and <name>_y), then "extra" holding the JSON of
+    any fields outside the schema.
+    """
+    _require_pyarrow()
+    fields = [pa.field("seq", pa.int64(), nullable=False)]
+    for name, kind in log.schema.items():
+        if kind == "float":
+            fields.append(pa.field(name, pa.float64()))
+        elif kind == "int":
+            fields.append(pa.field(name, pa.int64()))
+        elif kind == "str":
+            fields.append(pa.field(name, pa.string()))
+        else:
+            fields.append(pa.field(f"{name}_x", pa.int64()))
+            fields.append(pa.field(f"{name}_y", pa.int64()))
+    fields.append(pa.field("extra", pa.string()))
+    return pa.schema(fields)
+
+
+def segment_to_batch(log, rows, strings, schema):
+    """Convert one structured segment and its string table from EventLog.segments into a RecordBatch."""
+    mask = rows["mask"]
+    arrays = [pa.array(rows["seq"])]
+    for bit, (name, kind) in enumerate(log.schema.items()):
+        absent = (mask & np.uint32(1 << bit)) == 0
+        column = rows[name]
+        if kind == "str":
+            arrays.append(pa.array(lookup_strings(np.where(absent, -1, column), strings), type=pa.string()))
+        elif kind == "xy":
+            arrays.append(pa.array(np.ascontiguousarray(column[:, 0]), mask=absent))
+            arrays.append(pa.array(np.ascontiguousarray(column[:, 1]), mask=absent))
+        else:
+            arrays.append(pa.array(column, mask=absent))
+    arrays.append(pa.array(lookup_strings(rows["extra"], strings), type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_log(log, path, fmt="parquet"):
+    """
+    Write every event currently in `log` to `path` as Parquet (one row group per
+    log segment, with column statistics) or as an Arrow IPC file. The file is written
+    next to `path` and renamed into place. Returns the number of rows written.
+    """
+    _require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    schema = arrow_schema(log)
+    tmp_path = path + ".tmp"
+    rows_written = 0
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(tmp_path, schema, compression="zstd", write_statistics=True)
+    else:
+        writer = ipc.new_file(tmp_path, schema, options=ipc.IpcWriteOptions(compression="zstd"))
+    try:
+        for rows, strings in log.segments():
+            batch = segment_to_batch(log, rows, strings, schema)
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=len(rows))
+            else:
+                writer.write_batch(batch)
+            rows_written += len(rows)
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return rows_written
+
+
+def export_session(logs, out_dir, fmt="parquet", session_id="default"):
+    """
+    Export each named log in `logs` to <out_dir>/<name><ext> and write a
+    manifest.json describing them. Returns the manifest.
+    """
+    _require_pyarrow()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"session_id": session_id, "format": fmt, "exported_at": time.time(), "files": {}}
+    for name, log in logs.items():
+        filename = name + FORMATS[fmt]
+        path = os.path.join(out_dir, filename)
+        start = time.perf_counter()
+        rows = export_log(log, path, fmt)
+        manifest["files"][name] = {
+            "file": filename,
+            "rows": rows,
+            "bytes": os.path.getsize(path),
+            "columns": arrow_schema(log).names
+        }
+        logger.debug("Exported %d %s events in %.3fs", rows, name, time.perf_counter() - start)
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def write_session_bundle(logs, fileobj, fmt="parquet", session_id="default"):
+    """
+    Export a session and write it as one zip archive to `fileobj`. The columnar
+    files are already compressed, so they are stored rather than deflated.
+    """
+    work_dir = tempfile.mkdtemp(prefix="session-export-")
+    try:
+        manifest = export_session(logs, work_dir, fmt, session_id)
+        with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED) as bundle:
+            bundle.write(os.path.join(work_dir, "manifest.json"), f"{session_id}/manifest.json")
+            for entry in manifest["files"].values():
+                bundle.write(os.path.join(work_dir, entry["file"]), f"{session_id}/{entry['file']}")
+        return manifest
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    from event_log import EventLog
+
+    demo = EventLog({"timestamp": "float", "event": "str", "speed": "float", "position": "xy"})
+    for i in range(25000):
+        demo.append({"timestamp": 1700000000 + i * 0.004, "event": "High speed",
+                     "speed": 1500.0 + i % 300, "position": (i % 1920, i % 1080)})
+    demo.append({"timestamp": 1700000100.0, "event": "Mouse click Button.left", "pressed": True})
+    out = tempfile.mkdtemp(prefix="export-demo-")
+    print(json.dumps(export_session({"mouse": demo}, out), indent=2))
+    table = pq.read_table(os.path.join(out, "mouse.parquet"))
+    print(table.schema)
+    print(pq.ParquetFile(os.path.join(out, "mouse.parquet")).metadata.row_group(0).column(1).statistics)
+    shutil.rmtree(out)
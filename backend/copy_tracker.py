@@ -1,14 +1,27 @@
 import time
 import threading
 import logging
-import pyperclip
+from event_log import EventLog
+
+
+class PyperclipSource:
+    """System clipboard text via pyperclip (the default CopyTracker source)."""
+
+    def paste(self):
+        import pyperclip  # Needs a clipboard backend; imported here so other sources work headless.
+        return pyperclip.paste()
 
 
 class CopyTracker:
-    def __init__(self, poll_interval=1.0, callback=None):
+    def __init__(self, poll_interval=1.0, callback=None, source=None):
         self.poll_interval = poll_interval
         self.callback = callback
-        self.event_log = []
+        # Anything with paste() -> clipboard text; see trace_replay for recorded sessions.
+        self.source = source if source is not None else PyperclipSource()
+        self.event_log = EventLog(schema={
+            "timestamp": "float", "event": "str", "content_preview": "str", "word_count": "int",
+            "risk": "int", "multiplier": "int", "event_count": "int", "full_content": "str"
+        })
         self.last_clipboard = ""
         self.running = False
         self.risk_score = 0  # cumulative risk score for copy events
@@ -24,47 +37,50 @@ class CopyTracker:
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
 
+    def observe(self, text, current_time):
+        """Process the clipboard contents as read at `current_time`."""
+        # Check if clipboard content has changed and is not empty.
+        if text != self.last_clipboard and text.strip() != "":
+            word_count = len(text.split())
+            # Base risk: +10 points per 10 words.
+            base_risk = (word_count // 10) * 10
+            # Check if the event is within 60 seconds of the previous event.
+            if self.last_event_time and (current_time - self.last_event_time) < 60:
+                self.event_count += 1
+            else:
+                self.event_count = 1
+            self.last_event_time = current_time
+
+            # Exponential multiplier: for instance, risk multiplied by 2^(n-1)
+            multiplier = 2 ** (self.event_count - 1)
+            risk_increment = base_risk * multiplier
+
+            self.risk_score += risk_increment
+
+            event = {
+                "timestamp": current_time,
+                "event": "Copy-Paste Detected",
+                "content_preview": text[:50],
+                "word_count": word_count,
+                "risk": risk_increment,
+                "multiplier": multiplier,
+                "event_count": self.event_count
+            }
+            self.event_log.append(event)
+            self.logger.info("Copy detected. Words: %d, Base risk: %d, Multiplier: %d, Total risk increment: %d",
+                             word_count, base_risk, multiplier, risk_increment)
+            if self.callback:
+                self.callback(event)
+            self.last_clipboard = text
+
     def poll_clipboard(self):
         while self.running:
             try:
-                text = pyperclip.paste()
+                text = self.source.paste()
             except Exception as e:
                 self.logger.error("Error reading clipboard: %s", e)
                 text = ""
-            # Check if clipboard content has changed and is not empty.
-            if text != self.last_clipboard and text.strip() != "":
-                current_time = time.time()
-                word_count = len(text.split())
-                # Base risk: +10 points per 10 words.
-                base_risk = (word_count // 10) * 10
-                # Check if the event is within 60 seconds of the previous event.
-                if self.last_event_time and (current_time - self.last_event_time) < 60:
-                    self.event_count += 1
-                else:
-                    self.event_count = 1
-                self.last_event_time = current_time
-
-                # Exponential multiplier: for instance, risk multiplied by 2^(n-1)
-                multiplier = 2 ** (self.event_count - 1)
-                risk_increment = base_risk * multiplier
-
-                self.risk_score += risk_increment
-
-                event = {
-                    "timestamp": current_time,
-                    "event": "Copy-Paste Detected",
-                    "content_preview": text[:50],
-                    "word_count": word_count,
-                    "risk": risk_increment,
-                    "multiplier": multiplier,
-                    "event_count": self.event_count
-                }
-                self.event_log.append(event)
-                self.logger.info("Copy detected. Words: %d, Base risk: %d, Multiplier: %d, Total risk increment: %d",
-                                 word_count, base_risk, multiplier, risk_increment)
-                if self.callback:
-                    self.callback(event)
-                self.last_clipboard = text
+            self.observe(text, time.time())
             time.sleep(self.poll_interval)
 
     def start(self):
@@ -0,0 +1,194 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger("DetectorRegistry")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class LazyComponent:
+    """
+    A detector that is imported and constructed on first use. Attribute access is
+    forwarded to the instance, so a LazyComponent can stand in for the module-level
+    detector objects app.py used to build at import time; the first access (or the
+    registry's warm-up thread, whichever comes first) pays the import and init cost
+    once, and concurrent callers wait for that single initialization.
+    """
+
+    def __init__(self, name, module, factory, warm=True):
+        self._name = name
+        self._module = module
+        self._factory = factory
+        self._warm = warm
+        self._instance = None
+        self._state = "pending"
+        self._error = None
+        self._import_seconds = None
+        self._init_seconds = None
+        self._ready_at = None
+        self._ready_callbacks = []
+        self._lock = threading.RLock()
+
+    def get(self):
+        """The initialized instance. Raises RuntimeError if initialization failed."""
+        if self._state == "ready":
+            return self._instance
+        with self._lock:
+            if self._state == "pending":
+                self._initialize()
+            if self._state == "failed":
+                raise RuntimeError(f"{self._name} failed to initialize: {self._error}")
+            return self._instance
+
+    def _initialize(self):
+        # Caller holds self._lock.
+        self._state = "initializing"
+        logger.info("Initializing %s...", self._name)
+        try:
+            start = time.perf_counter()
+            module = importlib.import_module(self._module)
+            self._import_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            instance = self._factory(module)
+            self._init_seconds = time.perf_counter() - start
+        except Exception as e:
+            self._state = "failed"
+            self._error = str(e)
+            logger.error("%s failed to initialize: %s", self._name, e)
+            return
+        self._instance = instance
+        self._ready_at = time.time()
+        self._state = "ready"
+        logger.info("%s ready (import %.2fs, init %.2fs)", self._name, self._import_seconds, self._init_seconds)
+        callbacks, self._ready_callbacks = self._ready_callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self._instance)
+        except Exception as e:
+            logger.error("%s ready callback failed: %s", self._name, e)
+
+    def when_ready(self, callback):
+        """Call `callback(instance)` once initialized: now if already ready, else right after init."""
+        with self._lock:
+            if self._state != "ready":
+                self._ready_callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def is_ready(self):
+        return self._state == "ready"
+
+    def status(self):
+        return {
+            "state": self._state,
+            "warm_up": self._warm,
+            "import_seconds": round(self._import_seconds, 3) if self._import_seconds is not None else None,
+            "init_seconds": round(self._init_seconds, 3) if self._init_seconds is not None else None,
+            "ready_at": self._ready_at,
+            "error": self._error
+        }
+
+    def __getattr__(self, attr):
+        # Only called for attributes not found on the component itself.
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+
+class DetectorRegistry:
+    """
+    Named LazyComponents plus a startup-time breakdown. `warm_up` initializes every
+    component registered with warm=True on a background thread, in registration
+    order, so the server can accept requests while detectors load.
+    """
+
+    def __init__(self):
+        self.components = {}
+        self.phases = []  # (name, seconds) recorded by the app during startup
+        self.created_at = time.perf_counter()
+        self.warm_up_thread = None
+        self.warm_up_seconds = None
+
+    def register(self, name, module, factory, warm=True):
+        component = LazyComponent(name, module, factory, warm)
+        self.components[name] = component
+        return component
+
+    def record_phase(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    def warm_up(self):
+        if self.warm_up_thread is not None:
+            return
+
+        def run():
+            start = time.perf_counter()
+            for component in self.components.values():
+                if component._warm:
+                    try:
+                        component.get()
+                    except RuntimeError:
+                        pass  # Recorded in the component's status.
+            self.warm_up_seconds = time.perf_counter() - start
+            logger.info("Warm-up finished in %.2fs\n%s", self.warm_up_seconds, self.format_report())
+
+        self.warm_up_thread = threading.Thread(target=run, name="detector-warm-up", daemon=True)
+        self.warm_up_thread.start()
+
+    def health(self):
+        """Readiness: every warm-up component ready -> "ready"; any failed -> "degraded"."""
+        components = {name: component.status() for name, component in self.components.items()}
+        warm_states = [status["state"] for status in components.values() if status["warm_up"]]
+        if "failed" in warm_states:
+            status = "degraded"
+        elif all(state == "ready" for state in warm_states):
+            status = "ready"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "uptime_seconds": round(time.perf_counter() - self.created_at, 3),
+            "components": components,
+            "startup": self.startup_report()
+        }
+
+    def startup_report(self):
+        phases = [{"phase": name, "seconds": round(seconds, 3)} for name, seconds in self.phases]
+        for name, component in self.components.items():
+            status = component.status()
+            if status["import_seconds"] is not None:
+                phases.append({"phase": f"{name} import", "seconds": status["import_seconds"]})
+            if status["init_seconds"] is not None:
+                phases.append({"phase": f"{name} init", "seconds": status["init_seconds"]})
+        return {
+            "phases": phases,
+            "warm_up_seconds": round(self.warm_up_seconds, 3) if self.warm_up_seconds is not None else None
+        }
+
+    def format_report(self):
+        lines = [f"{'phase':<32} {'seconds':>8}"]
+        for phase in self.startup_report()["phases"]:
+            lines.append(f"{phase['phase']:<32} {phase['seconds']:>8.3f}")
+        return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    registry = DetectorRegistry()
+    slow = registry.register("json_codec", "json", lambda module: (time.sleep(0.5), module.JSONEncoder())[1])
+    lazy = registry.register("decimal", "decimal", lambda module: module.Context(), warm=False)
+    slow.when_ready(lambda encoder: print("ready callback got", type(encoder).__name__))
+    registry.warm_up()
+    print(registry.health()["status"])
+    print(slow.encode({"a": 1}))  # Blocks until warm-up has built it.
+    registry.warm_up_thread.join()
+    print(registry.health()["status"], lazy.status()["state"])
+    print(lazy.prec, lazy.status()["state"])
@@ -0,0 +1,177 @@
+import itertools
+import json
+import logging
+import threading
+import time
+
+from frame_pipeline import DropOldestQueue
+
+logger = logging.getLogger("EventBus")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+def _json_default(obj):
+    # numpy scalars (e.g. MTCNN landmark diffs) and anything else json can't encode.
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+class BusSubscription:
+    def __init__(self, bus, topics=None, queue_size=256, session_id=None):
+        self.bus = bus
+        self.topics = set(topics) if topics else None
+        self.session_id = session_id  # None: every session
+        self.queue = DropOldestQueue(queue_size)
+
+    def wants(self, topic, session_id=None):
+        if self.topics is not None and topic not in self.topics:
+            return False
+        # Messages not tied to a session go to everyone.
+        return self.session_id is None or session_id is None or session_id == self.session_id
+
+    def get(self, timeout=None):
+        """Return the next (message_id, topic, payload, session_id), or None on timeout."""
+        return self.queue.get(timeout)
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    In-process publish/subscribe hub. Publishing never blocks: each subscriber has a
+    bounded drop-oldest queue, so a slow client loses old messages rather than
+    stalling the tracker thread that published them. Messages may be tagged with
+    the exam session they belong to, and subscriptions filtered to one session.
+    """
+
+    def __init__(self):
+        self.subscribers = []
+        self.published = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics=None, queue_size=256, session_id=None):
+        subscription = BusSubscription(self, topics, queue_size, session_id)
+        with self._lock:
+            self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def publish(self, topic, payload, session_id=None):
+        with self._lock:
+            message_id = next(self._ids)
+            self.published += 1
+            for subscription in self.subscribers:
+                if subscription.wants(topic, session_id):
+                    subscription.queue.put((message_id, topic, payload, session_id))
+        return message_id
+
+    def sse_stream(self, topics=None, heartbeat=15.0, session_id=None):
+        """
+        Yield Server-Sent Events for the given topics of one session until the client
+        disconnects. With no session every session's events are streamed, each payload
+        wrapped as {"session_id": ..., "data": payload}.
+        """
+        subscription = self.subscribe(topics, session_id=session_id)
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    # Comment line keeps proxies from closing an idle connection.
+                    yield ": keep-alive\n\n"
+                    continue
+                message_id, topic, payload, message_session = message
+                if session_id is None:
+                    payload = {"session_id": message_session, "data": payload}
+                data = json.dumps(payload, default=_json_default)
+                yield f"id: {message_id}\nevent: {topic}\ndata: {data}\n\n"
+        finally:
+            subscription.close()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "published": self.published,
+                "subscribers": len(self.subscribers),
+                "dropped": sum(s.queue.dropped for s in self.subscribers)
+            }
+
+
+class RiskCoalescer:
+    """
+    Publishes a "risk" message for a session whenever any of its events arrives on
+    the bus, but at most `max_rate` times per second and only when that session's
+    snapshot actually changed, so bursts of tracker events collapse into one risk
+    update. `compute_risk(session_id)` builds a snapshot. Every session from
+    `session_ids()` is also rechecked once a second, in case a score changed after
+    its event was published, and whenever events were dropped before being seen.
+    """
+
+    def __init__(self, bus, compute_risk, session_ids, max_rate=2.0, topic="risk", queue_size=4096):
+        self.bus = bus
+        self.compute_risk = compute_risk
+        self.session_ids = session_ids
+        self.min_interval = 1.0 / max_rate
+        self.topic = topic
+        self.queue_size = queue_size
+        self.running = False
+        self.last_snapshots = {}
+        self.thread = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.subscription = self.bus.subscribe(queue_size=self.queue_size)
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.subscription.close()
+
+    def _loop(self):
+        last_recheck = time.monotonic()
+        dropped = 0
+        while self.running:
+            message = self.subscription.get(timeout=1.0)
+            changed = set()
+            while message is not None:
+                if message[1] != self.topic and message[3] is not None:
+                    changed.add(message[3])
+                message = self.subscription.get(timeout=0)
+            now = time.monotonic()
+            if now - last_recheck >= 1.0 or self.subscription.queue.dropped != dropped:
+                dropped = self.subscription.queue.dropped
+                last_recheck = now
+                live = set(self.session_ids())
+                for session_id in set(self.last_snapshots) - live:
+                    del self.last_snapshots[session_id]
+                changed.update(live)
+            for session_id in changed:
+                try:
+                    snapshot = self.compute_risk(session_id)
+                except Exception as e:
+                    logger.error("Error computing risk snapshot for session %s: %s", session_id, e)
+                    continue
+                if snapshot is None:
+                    # The session has ended.
+                    self.last_snapshots.pop(session_id, None)
+                elif snapshot != self.last_snapshots.get(session_id):
+                    self.last_snapshots[session_id] = snapshot
+                    self.bus.publish(self.topic, snapshot, session_id)
+            time.sleep(self.min_interval)
@@ -0,0 +1,151 @@
+import bisect
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger("EventDispatcher")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of latencies in milliseconds."""
+
+    BOUNDS_MS = [0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (None if empty)."""
+        with self._lock:
+            if not self.total:
+                return None
+            target = p / 100.0 * self.total
+            running = 0
+            for bound, count in zip(self.BOUNDS_MS + [self.max_ms], self.counts):
+                running += count
+                if running >= target:
+                    return bound
+            return self.max_ms
+
+    def to_dict(self):
+        p50, p99 = self.percentile(50), self.percentile(99)
+        with self._lock:
+            labels = [f"<={b}ms" for b in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}ms"]
+            return {
+                "count": self.total,
+                "mean_ms": round(self.sum_ms / self.total, 3) if self.total else None,
+                "max_ms": round(self.max_ms, 3),
+                "p50_ms": p50,
+                "p99_ms": p99,
+                "buckets": dict(zip(labels, self.counts))
+            }
+
+
+class EventDispatcher:
+    """
+    Moves event handling off tracker threads. `submit` only enqueues onto a bounded
+    queue and returns immediately, so the pynput hook or polling loop that produced
+    the event is never held up by detection or logging; a pool of worker threads runs
+    `handler(item)`. When the queue is full new items are dropped and counted.
+    """
+
+    def __init__(self, handler, workers=2, queue_size=10000, name="dispatcher"):
+        self.handler = handler
+        self.workers = workers
+        self.name = name
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self.threads = []
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._stats_lock = threading.Lock()
+        self.queue_latency = LatencyHistogram()  # submit -> handler start
+        self.callback_latency = LatencyHistogram()  # handler run time
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            logger.info("%s started with %d workers.", self.name, self.workers)
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        logger.info("%s stopped.", self.name)
+
+    def submit(self, item):
+        """Enqueue an item without blocking. Returns False if it was dropped."""
+        try:
+            self.queue.put_nowait((time.perf_counter(), item))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        depth = self.queue.qsize()
+        with self._stats_lock:
+            self.submitted += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    def _worker(self):
+        while self.running:
+            try:
+                enqueued_at, item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            started = time.perf_counter()
+            self.queue_latency.record(started - enqueued_at)
+            failed = False
+            try:
+                self.handler(item)
+            except Exception as e:
+                failed = True
+                logger.error("%s handler error: %s", self.name, e)
+            self.callback_latency.record(time.perf_counter() - started)
+            with self._stats_lock:
+                self.processed += 1
+                if failed:
+                    self.errors += 1
+
+    def get_stats(self):
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "queue_capacity": self.queue.maxsize,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queue_latency": self.queue_latency.to_dict(),
+            "callback_latency": self.callback_latency.to_dict()
+        }
@@ -0,0 +1,369 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger("EventIndex")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+# Bus topics carrying EventLog events, i.e. everything worth reviewing after the exam.
+EVENT_TOPICS = ("mouse", "window", "copy", "peripheral", "face", "voice", "camera", "suspicious_activity")
+# Events whose log has no event/event_type field are indexed under these types.
+DEFAULT_EVENT_TYPES = {
+    "window": "Window switch",
+    "peripheral": "Peripheral detected",
+    "suspicious_activity": "Suspicious activity"
+}
+MAX_QUERY_PAGE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    tracker TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    event_type TEXT NOT NULL,
+    risk REAL,
+    duration REAL,
+    data TEXT NOT NULL,
+    -- An event read back from its log after the bus delivered it is indexed once.
+    UNIQUE (session_id, tracker, generation, seq)
+);
+CREATE INDEX IF NOT EXISTS events_session_tracker_time ON events (session_id, tracker, timestamp);
+-- Time ranges across all of a session's trackers.
+CREATE INDEX IF NOT EXISTS events_session_time ON events (session_id, timestamp);
+-- Queries are per session, so the type index leads with it too.
+CREATE INDEX IF NOT EXISTS events_session_type_time ON events (session_id, event_type, timestamp);
+"""
+
+
+def _json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+# One encoder for every row; json.dumps with options builds a new one per call.
+_encode_event = json.JSONEncoder(separators=(",", ":"), default=_json_default).encode
+
+
+def _epoch(timestamp):
+    """Unix time of an event's timestamp: a number, or an ISO string (older camera and suspicious-activity logs)."""
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            pass
+    return None
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def index_row(session_id, tracker, generation, event, now=None):
+    """The events-table row for one event of a session's tracker log (EventLog.generation `generation`)."""
+    timestamp = _epoch(event.get("timestamp"))
+    event_type = event.get("event") or event.get("event_type") or DEFAULT_EVENT_TYPES.get(tracker, tracker)
+    risk = event.get("risk", event.get("risk_score"))
+    return (session_id, tracker, generation, int(event.get("seq", 0)),
+            timestamp if timestamp is not None else (now or time.time()),
+            str(event_type), _number(risk), _number(event.get("duration")),
+            _encode_event(event))
+
+
+def parse_cursor(cursor):
+    """(timestamp, id) of a query cursor "<timestamp>:<id>"."""
+    try:
+        timestamp, row_id = cursor.rsplit(":", 1)
+        return float(timestamp), int(row_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+
+
+class _Mark:
+    """How far one (session_id, tracker) log is indexed."""
+
+    __slots__ = ("generation", "seq", "floor")
+
+    def __init__(self, generation, seq):
+        self.generation = generation  # None until the log or the database says
+        self.seq = seq  # Every seq up to this one is indexed (or gone from the log)
+        self.floor = 0  # Bus messages up to this id were published before the log was read back
+
+
+class EventIndex:
+    """
+    Queryable copy of every session's tracker events in an embedded SQLite database
+    (WAL mode, so reviewers' queries never block the writer), for post-exam review:
+    time ranges across trackers, event types, risk and duration filters.
+
+    A background writer takes events off an EventBus subscription and inserts them in
+    batches of up to `batch_size`, one transaction per batch. Per log it keeps the
+    seq up to which every event is indexed, and only inserts bus events that follow
+    on from it. Past a gap (the subscription drops its oldest messages when the
+    writer falls behind), or for events appended while the index wasn't running,
+    it reads the log itself back from there (`sources()` yields (session_id,
+    tracker, EventLog)). Rows are keyed by the log's generation and seq, so a log
+    replaced by `EventLog.fresh` is indexed anew and no event is indexed twice.
+    """
+
+    def __init__(self, path, bus=None, sources=None, batch_size=5000, flush_interval=0.5, queue_size=200000):
+        self.path = path
+        self.bus = bus
+        self.sources = sources
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.running = False
+        self.thread = None
+        self.subscription = None
+        self._local = threading.local()
+        self._marks = {}  # (session_id, tracker) -> _Mark; writer thread only
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self.stats = {
+            "inserted": 0,
+            "batches": 0,
+            "caught_up": 0,
+            "last_batch_ms": None
+        }
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints: a crash may lose the last batches,
+        # which the next start catches up from the logs.
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA cache_size=-65536")
+        return connection
+
+    def _reader(self):
+        # sqlite3 connections are per thread; each request thread keeps its own.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            connection.execute("PRAGMA query_only=ON")
+            self._local.connection = connection
+        return connection
+
+    # Writing
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            if self.bus is not None:
+                self.subscription = self.bus.subscribe(topics=EVENT_TOPICS, queue_size=self.queue_size)
+            self.thread = threading.Thread(target=self._loop, daemon=True, name="EventIndexWriter")
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.subscription is not None:
+            self.subscription.close()
+            self.subscription = None
+
+    def _loop(self):
+        try:
+            self.catch_up()
+        except sqlite3.Error as e:
+            logger.error("Failed to catch up from the logs: %s", e)
+        dropped = 0
+        while self.running:
+            batch = self._next_batch(self.flush_interval)
+            try:
+                self._index_messages(batch)
+                if self.subscription is not None and self.subscription.queue.dropped != dropped:
+                    # A gap shows up at a log's next event; this also covers logs that had none since.
+                    dropped = self.subscription.queue.dropped
+                    logger.warning("Index fell behind the event bus (%d dropped); catching up from the logs", dropped)
+                    self.catch_up()
+            except sqlite3.Error as e:
+                logger.error("Failed to index %d events: %s", len(batch), e)
+        self._index_messages(self._next_batch(0))
+
+    def _next_batch(self, wait):
+        """Up to batch_size (message_id, session_id, tracker, event) from the bus, waiting at most `wait` seconds."""
+        if self.subscription is None:
+            time.sleep(wait)
+            return []
+        batch = []
+        deadline = time.monotonic() + wait
+        while len(batch) < self.batch_size:
+            message = self.subscription.get(timeout=max(deadline - time.monotonic(), 0))
+            if message is None:
+                break
+            message_id, topic, event, session_id = message
+            if session_id is not None:
+                batch.append((message_id, session_id, topic, event))
+        return batch
+
+    def _mark(self, key):
+        mark = self._marks.get(key)
+        if mark is None:
+            # The generation indexed last, as far as the database knows.
+            row = self._writer.execute(
+                "SELECT generation, MAX(seq) FROM events WHERE session_id = ? AND tracker = ? "
+                "GROUP BY generation ORDER BY MAX(id) DESC LIMIT 1", key).fetchone()
+            mark = self._marks[key] = _Mark(*row) if row else _Mark(None, 0)
+        return mark
+
+    def _index_messages(self, messages):
+        """
+        Index (message_id, session_id, tracker, event) bus messages. Those that follow on
+        from their log's mark are inserted as they are; for the rest the log is read back.
+        """
+        rows, behind = [], {}
+        now = time.time()
+        for message_id, session_id, tracker, event in messages:
+            key = (session_id, tracker)
+            mark = self._mark(key)
+            if message_id <= mark.floor:
+                continue  # Read back from the log already
+            seq = event.get("seq", 0)
+            if key not in behind and mark.generation is not None and seq == mark.seq + 1:
+                rows.append(index_row(session_id, tracker, mark.generation, event, now))
+                mark.seq = seq
+            else:
+                # A gap, a new log, or one replaced by EventLog.fresh.
+                behind.setdefault(key, []).append(event)
+        self.insert(rows)
+        if behind:
+            found, _ = self._read_back(behind)
+            unknown = set(behind) - found
+            # No log to read these from: index what the bus had, in order.
+            rows = []
+            for key in unknown:
+                mark = self._mark(key)
+                if mark.generation is None:
+                    mark.generation = 0
+                for event in behind[key]:
+                    if event.get("seq", 0) > mark.seq:
+                        rows.append(index_row(*key, mark.generation, event, now))
+                        mark.seq = event.get("seq", 0)
+            self.insert(rows)
+
+    def insert(self, rows):
+        """Insert index_row rows in one transaction, skipping ones already indexed."""
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        with self._writer:
+            inserted = self._writer.executemany(
+                "INSERT OR IGNORE INTO events (session_id, tracker, generation, seq, timestamp, event_type, risk, "
+                "duration, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows).rowcount
+        self.stats["inserted"] += inserted
+        self.stats["batches"] += 1
+        self.stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return inserted
+
+    def _read_back(self, keys=None):
+        """
+        Index what the logs from `sources()` (those of `keys`, or all) hold past their
+        marks. Returns (keys of the logs found, events indexed).
+        """
+        if self.sources is None:
+            return set(), 0
+        found, caught_up = set(), 0
+        for session_id, tracker, log in self.sources():
+            key = (session_id, tracker)
+            if keys is not None and key not in keys:
+                continue
+            found.add(key)
+            mark = self._mark(key)
+            # Taken before reading (message ids count publishes): the events of messages
+            # published until now were appended before, so the read covers them.
+            floor = self.bus.published if self.bus is not None else 0
+            if mark.generation != log.generation:
+                row = self._writer.execute(
+                    "SELECT MAX(seq) FROM events WHERE session_id = ? AND tracker = ? AND generation = ?",
+                    (*key, log.generation)).fetchone()
+                mark.generation, mark.seq = log.generation, row[0] or 0
+            while mark.seq < log.last_seq:
+                events, cursor, has_more = log.since(mark.seq, self.batch_size)
+                now = time.time()
+                caught_up += self.insert([index_row(session_id, tracker, mark.generation, event, now)
+                                          for event in events])
+                mark.seq = cursor
+                if not has_more:
+                    break
+            mark.floor = floor
+        if caught_up:
+            self.stats["caught_up"] += caught_up
+            logger.info("Caught up %d events from the logs", caught_up)
+        return found, caught_up
+
+    def catch_up(self):
+        """Index whatever the logs from `sources()` hold past what is indexed of them. Returns the count."""
+        return self._read_back()[1]
+
+    # Querying
+
+    def query(self, session_id=None, trackers=None, event_types=None, start=None, end=None, min_risk=None,
+              max_risk=None, min_duration=None, max_duration=None, cursor=None, limit=100):
+        """
+        Events matching every given filter, ordered by timestamp. Returns (events,
+        next_cursor, has_more); pass next_cursor back to get the following page.
+        Each event is the logged dict plus its "session_id" and "tracker". ValueError
+        if the cursor is not one this method returned.
+        """
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        for column, values in (("tracker", trackers), ("event_type", event_types)):
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        for condition, value in (("timestamp >= ?", start), ("timestamp <= ?", end),
+                                 ("risk >= ?", min_risk), ("risk <= ?", max_risk),
+                                 ("duration >= ?", min_duration), ("duration <= ?", max_duration)):
+            if value is not None:
+                clauses.append(condition)
+                params.append(value)
+        if cursor is not None:
+            # Keyset pagination: resume after the last (timestamp, id) returned. The
+            # first term gives SQLite an index range to seek into.
+            after_timestamp, after_id = parse_cursor(cursor)
+            clauses.append("timestamp >= ? AND (timestamp > ? OR id > ?)")
+            params.extend([after_timestamp, after_timestamp, after_id])
+        limit = max(1, min(limit, MAX_QUERY_PAGE))
+        sql = ("SELECT id, session_id, tracker, timestamp, data FROM events"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + " ORDER BY timestamp, id LIMIT ?")
+        rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        events = [{**json.loads(data), "session_id": session, "tracker": tracker}
+                  for _, session, tracker, _, data in rows]
+        next_cursor = f"{rows[-1][3]!r}:{rows[-1][0]}" if rows else cursor
+        return events, next_cursor, has_more
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "path": self.path,
+            "queued": len(self.subscription.queue) if self.subscription is not None else 0,
+            "dropped": self.subscription.queue.dropped if self.subscription is not None else 0,
+            "size_bytes": sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal")
+                              if os.path.exists(self.path + suffix))
+        }
+
+    def close(self):
+        self.stop()
+        self._writer.close()
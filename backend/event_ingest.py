@@ -0,0 +1,236 @@
+import json
+import logging
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # Only msgpack batches need it.
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # Only zstd-compressed batches need it.
+    zstandard = None
+
+logger = logging.getLogger("EventIngest")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+# A small compressed upload must not expand without bound.
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+# Records a session buffers past a missing sequence number; later ones are left for the agent to resend.
+MAX_PENDING = 10000
+# Seconds an upload waits for the journal to have its cursor on disk before the agent is told to resend.
+DURABLE_TIMEOUT = 10.0
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+_NUMBER = (int, float)
+# Record kind -> required fields and their types, besides seq, kind and t. The raw
+# observations use TraceRecorder's names and run through the session's trackers;
+# voice and face are detections made on the candidate machine, logged as they are.
+RECORD_FIELDS = {
+    "move": {"x": _NUMBER, "y": _NUMBER},
+    "click": {"x": _NUMBER, "y": _NUMBER, "button": str, "pressed": bool},
+    "scroll": {"x": _NUMBER, "y": _NUMBER, "dx": _NUMBER, "dy": _NUMBER},
+    "window": {"value": str},
+    "clipboard": {"value": str},
+    "device": {"value": str},
+    "monitors": {"value": int},
+    "voice": {},
+    "face": {},
+}
+# Fields a record may leave out, but must type correctly when present: detections are
+# logged and scored as sent (FaceSession.record_event adds up "risk").
+OPTIONAL_FIELDS = {
+    "voice": {"event": str, "duration": _NUMBER, "start_time": _NUMBER, "energy_level": _NUMBER,
+              "energy_db": _NUMBER, "confidence": _NUMBER, "risk": _NUMBER},
+    "face": {"event": str, "risk": _NUMBER, "duration": _NUMBER, "intervals": int},
+}
+_ENVELOPE = ("seq", "kind", "t")
+
+
+class UnsupportedBatch(ValueError):
+    """The batch's content type or content encoding is not one /api/ingest accepts."""
+
+
+class NotDurable(Exception):
+    """The journal did not get the session's ingest cursor on disk; the agent must resend."""
+
+
+def decompress(body, encoding=None, limit=MAX_BATCH_BYTES):
+    """Undo the request's Content-Encoding (identity, gzip or zstd), refusing more than `limit` bytes."""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        data = body
+    elif encoding == "gzip":
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt gzip body: {e}")
+        if len(data) <= limit and not decompressor.eof:
+            raise ValueError("Truncated gzip body")
+    elif encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd batches require zstandard (pip install zstandard)")
+        chunks, size = [], 0
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                while size <= limit:
+                    chunk = reader.read(min(1 << 20, limit + 1 - size))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Corrupt zstd body: {e}")
+        data = b"".join(chunks)
+    else:
+        raise UnsupportedBatch(f"Unsupported Content-Encoding {encoding!r}, expected identity, gzip or zstd")
+    if len(data) > limit:
+        raise ValueError(f"Batch exceeds {limit} bytes decompressed")
+    return data
+
+
+def parse_records(data, content_type):
+    """Records of an NDJSON (one object per line) or msgpack (a stream or array of maps) batch."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        records = [json.loads(line) for line in data.splitlines() if line.strip()]
+    elif media_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise RuntimeError("msgpack batches require msgpack (pip install msgpack)")
+        unpacker = msgpack.Unpacker(raw=False, max_buffer_size=len(data) + 1)
+        unpacker.feed(data)
+        try:
+            records = list(unpacker)
+        except (msgpack.UnpackException, ValueError) as e:
+            raise ValueError(f"Corrupt msgpack body: {e}")
+        if unpacker.tell() != len(data):
+            raise ValueError("Truncated msgpack body")
+        if len(records) == 1 and isinstance(records[0], list):
+            records = records[0]
+    else:
+        raise UnsupportedBatch(f"Unsupported Content-Type {media_type!r}, expected NDJSON or msgpack")
+    for record in records:
+        validate_record(record)
+    return records
+
+
+def validate_record(record):
+    if not isinstance(record, dict):
+        raise ValueError("Batch records must be objects")
+    seq, kind, t = record.get("seq"), record.get("kind"), record.get("t")
+    if type(seq) is not int or seq < 1:
+        raise ValueError(f"Record needs a positive integer seq: {str(record)[:100]}")
+    fields = RECORD_FIELDS.get(kind)
+    if fields is None:
+        raise ValueError(f"Record {seq}: unknown kind {kind!r}")
+    if not isinstance(t, _NUMBER) or isinstance(t, bool):
+        raise ValueError(f"Record {seq}: t must be a Unix timestamp")
+    for name, types in fields.items():
+        if not _is_a(record.get(name), types):
+            raise ValueError(f"Record {seq}: {kind} needs field {name!r}")
+    for name, types in OPTIONAL_FIELDS.get(kind, {}).items():
+        if name in record and not _is_a(record[name], types):
+            raise ValueError(f"Record {seq}: {kind} field {name!r} has the wrong type")
+
+
+def _is_a(value, types):
+    # bool is an int subclass; only fields declared bool may hold one.
+    return isinstance(value, types) and (types is bool or not isinstance(value, bool))
+
+
+def decode_batch(body, content_type, content_encoding=None):
+    """Decompress, parse and validate one upload."""
+    return parse_records(decompress(body, content_encoding), content_type)
+
+
+def apply_record(session, record):
+    """Feed one record to the session's trackers, or log it if it is a detection. Caller holds session.lock."""
+    kind, t = record["kind"], float(record["t"])
+    if kind == "move":
+        session.mouse_tracker.on_move(int(record["x"]), int(record["y"]), timestamp=t)
+    elif kind == "click":
+        session.mouse_tracker.on_click(int(record["x"]), int(record["y"]), record["button"], record["pressed"],
+                                       timestamp=t)
+    elif kind == "scroll":
+        session.mouse_tracker.on_scroll(int(record["x"]), int(record["y"]), record["dx"], record["dy"],
+                                        timestamp=t)
+    elif kind == "window":
+        session.window_tracker.observe(record["value"], t)
+    elif kind == "clipboard":
+        session.copy_tracker.observe(record["value"], t)
+    elif kind == "device":
+        session.peripheral_detector.observe_device(record["value"], t)
+    elif kind == "monitors":
+        session.peripheral_detector.observe_monitors(record["value"], t)
+    else:
+        event = {key: value for key, value in record.items() if key not in _ENVELOPE}
+        event["timestamp"] = t
+        if kind == "voice":
+            session.record_voice_event(event)
+        else:
+            session.face.record_event(event)
+
+
+def ingest_batch(session, records, max_pending=MAX_PENDING, durable_timeout=DURABLE_TIMEOUT):
+    """
+    Apply a decoded batch to a session in sequence order. Every record carries the
+    agent's per-session sequence number: numbers at or below the session's cursor
+    were applied already (a retried upload) and are skipped, and records past a gap
+    are held until the missing ones arrive, at most `max_pending` of them. Batches
+    for one session are serialized on its lock; other sessions ingest in parallel.
+    Returns the new cursor as "ack" plus counts; the agent resends from ack + 1.
+    For a journaled session the ack is only returned once the journal has it on disk
+    (a retried batch waits for the cursor an earlier one journaled, too); NotDurable
+    if that takes longer than `durable_timeout` or the journal has stopped.
+    """
+    applied = duplicates = deferred = 0
+    with session.lock:
+        cursor = session.ingest_cursor
+        pending = session.ingest_pending
+        try:
+            # Agents send records in order, so this sort is a linear pass.
+            for record in sorted(records, key=lambda r: r["seq"]):
+                seq = record["seq"]
+                if seq <= cursor or seq in pending:
+                    duplicates += 1
+                elif seq == cursor + 1:
+                    apply_record(session, record)
+                    cursor, applied = seq, applied + 1
+                    while cursor + 1 in pending:
+                        apply_record(session, pending[cursor + 1])
+                        del pending[cursor + 1]
+                        cursor += 1
+                        applied += 1
+                elif len(pending) >= max_pending:
+                    deferred += 1
+                else:
+                    pending[seq] = record
+        finally:
+            # Even if a record failed to apply, those before it were: retries must skip them.
+            if cursor != session.ingest_cursor and session.journal is not None:
+                session.ingest_cursor_lsn = session.journal.record_ingest_cursor(session.session_id, cursor)
+            session.ingest_cursor = cursor
+        waiting = len(pending)
+        journal, journaled = session.journal, session.ingest_cursor_lsn
+    if deferred:
+        logger.warning("[%s] %d records past a gap at seq %d were not buffered", session.session_id, deferred,
+                       cursor + 1)
+    # Concurrent uploads share the fsync (group commit).
+    if journaled and journal is not None and not journal.wait(journaled, durable_timeout):
+        raise NotDurable(f"Records up to seq {cursor} are not on disk yet; resend them")
+    return {
+        "ack": cursor,
+        "applied": applied,
+        "duplicates": duplicates,
+        "deferred": deferred,
+        "pending": waiting
+    }
@@ -0,0 +1,571 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger("EventJournal")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+# Each record is framed as (lsn, payload length, CRC-32 of payload) + JSON payload, so
+# recovery can tell a torn write at the tail from a complete record.
+FRAME_HEADER = struct.Struct("<QII")
+SEGMENT_PATTERN = re.compile(r"^journal-(\d{12})\.log$")
+SNAPSHOT_PATTERN = re.compile(r"^snapshot-(\d{12})\.npz$")
+
+
+def _json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def _numbered_files(directory, pattern):
+    """(number, path) of the files in `directory` matching `pattern`, in order."""
+    files = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            files.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(files)
+
+
+def _empty_state(generation=None):
+    """Recovered state of a log with nothing journaled yet."""
+    return {"rows": None, "strings": [], "events": [], "generation": generation}
+
+
+def _fsync_directory(directory):
+    # Makes renames and new files durable; directories can't be opened on Windows.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class EventJournal:
+    """
+    Write-ahead, append-only journal of exam session state, so an exam survives a
+    crash or a restart of the server. Event logs registered with `register` write
+    every appended event through it, and sessions record their pause state and
+    ingest cursor; on `open`, the latest snapshot plus the journal after it are
+    replayed and handed back to each log and session as it registers again.
+
+    Records go to numbered segment files (a new one every `segment_bytes`). Appends
+    only buffer the record; a writer thread commits whatever has accumulated every
+    `commit_interval` seconds, or sooner past `commit_records` or once someone
+    waits, with one write and one fsync for the whole group. Callers that must not
+    acknowledge something before it is on disk wait for its LSN with `wait`. A group
+    whose write or fsync fails is not durable: it is written again, every
+    `retry_interval` seconds, to a new segment starting at its first LSN, so the torn
+    tail it left only ends the old segment. Every `snapshot_interval` seconds,
+    or after `snapshot_bytes` of records, the state of every registered log is
+    written to a snapshot and the segments it covers are deleted, which bounds both
+    disk use and recovery time.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, commit_interval=0.02,
+                 commit_records=4096, snapshot_interval=300.0, snapshot_bytes=256 * 1024 * 1024,
+                 fsync=True, retry_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.commit_records = commit_records
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_bytes = snapshot_bytes
+        self.fsync = fsync
+        self.retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)  # Signals the writer thread
+        self._committed = threading.Condition(self._lock)  # Signals callers in wait()
+        self._buffer = []  # (lsn, record) appended but not yet written
+        self._flush_requested = False
+        self._next_lsn = 1
+        self._durable_lsn = 0
+        self._logs = {}  # (session_id, name) -> registered EventLog
+        self._sessions = {}  # session_id -> {"status": ..., "ingest_cursor": ...}
+        self._recovered_logs = {}  # (session_id, name) -> recovered state not yet registered
+        self._segments = []  # [first_lsn, path], oldest first
+        self._file = None
+        self._file_bytes = 0
+        self._bytes_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+        self._snapshot_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.snapshot_thread = None
+        self.stats = {
+            "appended": 0,
+            "commits": 0,
+            "bytes_written": 0,
+            "snapshots": 0,
+            "write_errors": 0,
+            "recovery": None
+        }
+
+    # Recovery
+
+    def open(self):
+        """Recover the journal's state from disk, then start accepting appends."""
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.perf_counter()
+        snapshot_lsn, snapshot_records = self._load_snapshot()
+        replayed, last_lsn = self._replay_segments(snapshot_lsn)
+        with self._lock:
+            self._next_lsn = max(last_lsn + 1, snapshot_lsn)
+            self._durable_lsn = self._next_lsn - 1
+        self._open_segment()
+        self.stats["recovery"] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "snapshot_lsn": snapshot_lsn,
+            "snapshot_logs": snapshot_records,
+            "replayed_records": replayed,
+            "sessions": len(self._sessions)
+        }
+        if snapshot_lsn or replayed:
+            logger.info("Recovered %d sessions from %s (snapshot at LSN %d, %d records replayed) in %.2fs",
+                        len(self._sessions), self.directory, snapshot_lsn, replayed,
+                        self.stats["recovery"]["seconds"])
+        self.running = True
+        self.thread = threading.Thread(target=self._commit_loop, daemon=True, name="JournalWriter")
+        self.thread.start()
+        if self.snapshot_interval or self.snapshot_bytes:
+            self.snapshot_thread = threading.Thread(target=self._snapshot_loop, daemon=True, name="JournalSnapshots")
+            self.snapshot_thread.start()
+        return self
+
+    def _load_snapshot(self):
+        """Load the newest readable snapshot. Returns (its LSN, number of logs), or (0, 0)."""
+        for lsn, path in reversed(_numbered_files(self.directory, SNAPSHOT_PATTERN)):
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    meta = json.loads(bytes(data["meta"]).decode())
+                    for entry in meta["logs"]:
+                        rows = data[entry["array"]] if entry["array"] else None
+                        self._recovered_logs[(entry["session_id"], entry["name"])] = {
+                            "rows": rows,
+                            "strings": entry["strings"],
+                            "events": entry["events"],
+                            "generation": entry.get("generation")
+                        }
+                self._sessions = meta["sessions"]
+                return lsn, len(meta["logs"])
+            except (OSError, KeyError, ValueError) as e:
+                logger.error("Unreadable snapshot %s, trying an older one: %s", path, e)
+                self._recovered_logs.clear()
+        return 0, 0
+
+    def _replay_segments(self, from_lsn):
+        """Apply every journaled record from `from_lsn` on. Returns (records applied, last LSN seen)."""
+        segments = _numbered_files(self.directory, SEGMENT_PATTERN)
+        self._segments = [[first_lsn, path] for first_lsn, path in segments]
+        replayed = last_lsn = 0
+        for i, (first_lsn, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= from_lsn:
+                continue  # Entirely covered by the snapshot
+            for lsn, record in self._read_segment(path):
+                if lsn <= last_lsn:
+                    continue  # Written again in the next segment after a failed write
+                last_lsn = lsn
+                if lsn >= from_lsn:
+                    self._apply(record)
+                    replayed += 1
+        return replayed, last_lsn
+
+    def _read_segment(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        position = 0
+        while position + FRAME_HEADER.size <= len(data):
+            lsn, length, crc = FRAME_HEADER.unpack_from(data, position)
+            payload = data[position + FRAME_HEADER.size:position + FRAME_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            yield lsn, json.loads(payload)
+            position += FRAME_HEADER.size + length
+        if position < len(data):
+            # A write cut short by the crash; everything before it is intact.
+            logger.warning("Ignoring %d bytes of incomplete records at the end of %s", len(data) - position, path)
+
+    def _apply(self, record):
+        """Replay one record into the recovered state."""
+        op, session_id = record[0], record[1]
+        if op == "event":
+            if session_id not in self._sessions:
+                return  # Appended while the session was closing
+            state = self._recovered_logs.setdefault((session_id, record[2]), _empty_state())
+            state["events"].append(record[3])
+        elif op == "log":
+            if session_id in self._sessions:
+                self._recovered_logs.setdefault((session_id, record[2]), _empty_state())["generation"] = record[3]
+        elif op == "reset":
+            self._recovered_logs[(session_id, record[2])] = _empty_state(record[3] if len(record) > 3 else None)
+        elif op == "open":
+            self._sessions.setdefault(session_id, {"status": None, "ingest_cursor": 0})
+        elif op == "close":
+            self._sessions.pop(session_id, None)
+            for key in [key for key in self._recovered_logs if key[0] == session_id]:
+                del self._recovered_logs[key]
+        elif op == "status":
+            self._sessions.setdefault(session_id, {"status": None, "ingest_cursor": 0})["status"] = record[2]
+        elif op == "ingest":
+            self._sessions.setdefault(session_id, {"status": None, "ingest_cursor": 0})["ingest_cursor"] = record[2]
+
+    def recovered_sessions(self):
+        """IDs of the sessions that were open when the journal was last written."""
+        with self._lock:
+            return list(self._sessions)
+
+    def recovered_logs(self, session_id):
+        """Names of the session's logs with recovered events that no log has been registered for yet."""
+        with self._lock:
+            return [name for (sid, name), state in self._recovered_logs.items()
+                    if sid == session_id and (state["rows"] is not None or state["events"])]
+
+    def session_state(self, session_id):
+        """The journaled {"status", "ingest_cursor"} of a session, or None if it has none."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return dict(state) if state is not None else None
+
+    # Registration
+
+    def register(self, log, session_id, name, reset=False):
+        """
+        Journal every event appended to `log` as log `name` of `session_id`. Recovered
+        events for that log are loaded into it first, so this is how a log gets its
+        contents back after a restart. `reset=True` records that the log replaced an
+        earlier one under the same name and starts it empty. The log's generation is
+        journaled with it, and a recovered log takes its generation back.
+        """
+        key = (session_id, name)
+        with self._lock:
+            recovered = None if reset else self._recovered_logs.get(key)
+        if recovered is not None and recovered["generation"] is not None:
+            log.generation = recovered["generation"]
+        if recovered is not None:
+            self._restore_log(log, key, recovered)
+        with self._lock:
+            if reset:
+                self._append(("reset", session_id, name, log.generation))
+            elif recovered is None or recovered["generation"] is None:
+                self._append(("log", session_id, name, log.generation))
+            self._recovered_logs.pop(key, None)
+            self._logs[key] = log
+        log.attach_journal(self, session_id, name)
+
+    def _restore_log(self, log, key, recovered):
+        if recovered["rows"] is not None and len(recovered["rows"]):
+            try:
+                log.load_rows(recovered["rows"], recovered["strings"])
+            except ValueError as e:
+                logger.error("Could not restore the snapshot of log %s/%s: %s", key[0], key[1], e)
+        mismatched = 0
+        for event in recovered["events"]:
+            seq = event.get("seq")
+            if seq is not None and seq <= log.last_seq:
+                continue  # Already in the snapshot
+            if log.append(dict(event)) != seq:
+                mismatched += 1
+        if mismatched:
+            logger.warning("Log %s/%s: %d recovered events were renumbered", key[0], key[1], mismatched)
+
+    def open_session(self, session_id):
+        """Record that a session exists, so recovery recreates it even before it has events."""
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = {"status": None, "ingest_cursor": 0}
+                self._append(("open", session_id))
+
+    def close_session(self, session_id):
+        """Record that a session ended; its logs stop being journaled and are not recovered."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            for key in [key for key in self._logs if key[0] == session_id]:
+                self._logs.pop(key).attach_journal(None)
+            for key in [key for key in self._recovered_logs if key[0] == session_id]:
+                del self._recovered_logs[key]
+            return self._append(("close", session_id))
+
+    # Appending
+
+    def _append(self, record):
+        # Caller holds self._lock.
+        lsn = self._next_lsn
+        self._next_lsn += 1
+        self._buffer.append((lsn, record))
+        self.stats["appended"] += 1
+        if len(self._buffer) == 1 or len(self._buffer) >= self.commit_records:
+            self._pending.notify()
+        return lsn
+
+    def append_event(self, session_id, name, event):
+        """Journal one event of a registered log. Returns its LSN."""
+        with self._lock:
+            if session_id not in self._sessions:
+                return 0  # The session was closed under the appending thread
+            return self._append(("event", session_id, name, event))
+
+    def record_status(self, session_id, status):
+        with self._lock:
+            self._sessions.setdefault(session_id, {"status": None, "ingest_cursor": 0})["status"] = status
+            return self._append(("status", session_id, status))
+
+    def record_ingest_cursor(self, session_id, cursor):
+        with self._lock:
+            self._sessions.setdefault(session_id, {"status": None, "ingest_cursor": 0})["ingest_cursor"] = cursor
+            return self._append(("ingest", session_id, cursor))
+
+    def wait(self, lsn, timeout=None):
+        """Block until the record with this LSN is on disk. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._durable_lsn < lsn:
+                if not self.running:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Someone is waiting: commit now rather than at the end of the interval.
+                self._flush_requested = True
+                self._pending.notify()
+                self._committed.wait(remaining)
+            return True
+
+    def sync(self, timeout=None):
+        """Wait until everything appended so far is on disk."""
+        with self._lock:
+            lsn = self._next_lsn - 1
+        return self.wait(lsn, timeout)
+
+    # Writing
+
+    def _segment_path(self, first_lsn):
+        return os.path.join(self.directory, f"journal-{first_lsn:012d}.log")
+
+    def _open_segment(self):
+        # Always a new segment, so a torn tail left by a crash is never appended to.
+        if self._file is not None:
+            self._file.close()
+        first_lsn = self._next_lsn
+        path = self._segment_path(first_lsn)
+        if self._segments and self._segments[-1][0] == first_lsn:
+            # The previous run wrote nothing past its last good record.
+            os.remove(self._segments.pop()[1])
+        self._file = open(path, "ab")
+        self._file_bytes = 0
+        self._segments.append([first_lsn, path])
+        _fsync_directory(self.directory)
+
+    def _encode(self, batch):
+        frames = []
+        for lsn, record in batch:
+            payload = json.dumps(record, separators=(",", ":"), default=_json_default).encode()
+            frames.append(FRAME_HEADER.pack(lsn, len(payload), zlib.crc32(payload)))
+            frames.append(payload)
+        return b"".join(frames)
+
+    def _commit_loop(self):
+        while True:
+            with self._lock:
+                while self.running and not self._buffer:
+                    self._pending.wait()
+                if self.running and not self._flush_requested and len(self._buffer) < self.commit_records:
+                    # Let a group form: everything appended within the interval shares one fsync.
+                    self._pending.wait(self.commit_interval)
+                self._flush_requested = False
+                batch, self._buffer = self._buffer, []
+                running = self.running
+            if batch and not self._commit(batch):
+                if not running:
+                    logger.error("Journal closed with %d records not written", len(batch))
+                    return
+                with self._lock:
+                    # Ahead of anything appended since, so LSNs stay in order on disk.
+                    self._buffer[:0] = batch
+                time.sleep(self.retry_interval)
+            elif not batch and not running:
+                return
+
+    def _commit(self, batch):
+        """Write and fsync one group. Returns False if that failed; the group is then not durable."""
+        data = self._encode(batch)
+        try:
+            if self._file is None:
+                self._restart_segment(batch[0][0])
+            elif self._file_bytes and self._file_bytes + len(data) > self.segment_bytes:
+                self._roll_segment(batch[0][0])
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError as e:
+            # Keep running: the exam goes on and the group is retried, but nobody waiting on it is released.
+            logger.error("Journal write of LSNs %d-%d failed: %s", batch[0][0], batch[-1][0], e)
+            with self._lock:
+                self.stats["write_errors"] += 1
+            try:
+                self._restart_segment(batch[0][0])
+            except OSError as e:
+                logger.error("Could not start a new journal segment: %s", e)
+                self._file = None  # Tried again with the retry
+            return False
+        self._file_bytes += len(data)
+        with self._lock:
+            self._durable_lsn = batch[-1][0]
+            self._bytes_since_snapshot += len(data)
+            self.stats["commits"] += 1
+            self.stats["bytes_written"] += len(data)
+            self._committed.notify_all()
+        return True
+
+    def _restart_segment(self, first_lsn):
+        """After a failed write, continue in a new segment starting at `first_lsn`, the failed group's first."""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        if self._segments and self._segments[-1][0] == first_lsn:
+            # The segment holds nothing but what the failed write left; start it over.
+            self._file = open(self._segments[-1][1], "wb")
+            self._file_bytes = 0
+        else:
+            self._roll_segment(first_lsn)
+
+    def _roll_segment(self, first_lsn):
+        if self._file is not None:
+            self._file.close()
+        path = self._segment_path(first_lsn)
+        self._file = open(path, "ab")
+        self._file_bytes = 0
+        with self._lock:
+            self._segments.append([first_lsn, path])
+        _fsync_directory(self.directory)
+
+    # Snapshots
+
+    def _snapshot_loop(self):
+        while self.running:
+            time.sleep(min(1.0, self.snapshot_interval or 1.0))
+            with self._lock:
+                due = self._bytes_since_snapshot and (
+                    (self.snapshot_bytes and self._bytes_since_snapshot >= self.snapshot_bytes) or
+                    (self.snapshot_interval and time.monotonic() - self._last_snapshot >= self.snapshot_interval))
+            if due and self.running:
+                try:
+                    self.snapshot()
+                except OSError as e:
+                    logger.error("Journal snapshot failed: %s", e)
+
+    def snapshot(self):
+        """
+        Write the state of every registered log and session, then delete the segments
+        and older snapshots it makes redundant. Logs keep taking appends meanwhile:
+        the snapshot covers at least everything journaled before it started, and
+        recovery skips replayed events the snapshot already holds.
+        """
+        with self._snapshot_lock:
+            started = time.perf_counter()
+            with self._lock:
+                lsn = self._next_lsn
+                sessions = {session_id: dict(state) for session_id, state in self._sessions.items()}
+                logs = list(self._logs.items())
+                recovered = list(self._recovered_logs.items())
+                self._bytes_since_snapshot = 0
+                self._last_snapshot = time.monotonic()
+            arrays, entries = {}, []
+            for (session_id, name), log in logs:
+                rows, strings = log.export_rows()
+                array = f"log{len(entries)}"
+                arrays[array] = rows
+                entries.append({"session_id": session_id, "name": name, "array": array,
+                                "strings": strings, "events": [], "generation": log.generation})
+            for (session_id, name), state in recovered:
+                # Recovered for a log that hasn't registered again yet, e.g. a detector not loaded yet.
+                array = None
+                if state["rows"] is not None:
+                    array = f"log{len(entries)}"
+                    arrays[array] = state["rows"]
+                entries.append({"session_id": session_id, "name": name, "array": array,
+                                "strings": state["strings"], "events": state["events"],
+                                "generation": state["generation"]})
+            meta = json.dumps({"lsn": lsn, "sessions": sessions, "logs": entries}, default=_json_default)
+            arrays["meta"] = np.frombuffer(meta.encode(), dtype=np.uint8)
+
+            path = os.path.join(self.directory, f"snapshot-{lsn:012d}.npz")
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+            _fsync_directory(self.directory)
+            self._truncate(lsn)
+            self.stats["snapshots"] += 1
+            logger.info("Snapshot at LSN %d: %d logs, %d bytes, %.2fs", lsn, len(entries),
+                        os.path.getsize(path), time.perf_counter() - started)
+            return path
+
+    def _truncate(self, lsn):
+        """Delete segments holding only records before `lsn`, and snapshots older than it."""
+        with self._lock:
+            obsolete = []
+            while len(self._segments) > 1 and self._segments[1][0] <= lsn:
+                obsolete.append(self._segments.pop(0)[1])
+        for name in os.listdir(self.directory):
+            match = SNAPSHOT_PATTERN.match(name)
+            if match and int(match.group(1)) < lsn:
+                obsolete.append(os.path.join(self.directory, name))
+        for path in obsolete:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("Could not delete %s: %s", path, e)
+
+    # Lifecycle
+
+    def close(self):
+        """Commit everything appended so far and stop."""
+        if not self.running:
+            return
+        with self._lock:
+            self.running = False
+            self._pending.notify()
+        self.thread.join()
+        with self._lock:
+            self._committed.notify_all()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "next_lsn": self._next_lsn,
+                "durable_lsn": self._durable_lsn,
+                "buffered": len(self._buffer),
+                "segments": len(self._segments),
+                "bytes_since_snapshot": self._bytes_since_snapshot,
+                "logs": len(self._logs),
+                "sessions": len(self._sessions)
+            }
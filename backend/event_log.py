@@ -0,0 +1,444 @@
+import json
+import logging
+import numbers
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+
+import numpy as np
+
+logger = logging.getLogger("EventLog")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+# Schema kinds and the column dtype each one is stored as. "str" columns hold a code
+# into the segment's interned string table; "xy" holds an integer (x, y) pair.
+FIELD_DTYPES = {
+    "float": "f8",
+    "int": "i8",
+    "str": "i4",
+    "xy": ("i8", (2,)),
+}
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+_generation_lock = threading.Lock()
+_last_generation = 0
+
+
+def _new_generation():
+    """Nanosecond clock reading, bumped so no two logs in this process share one."""
+    global _last_generation
+    with _generation_lock:
+        _last_generation = max(time.time_ns(), _last_generation + 1)
+        return _last_generation
+
+
+def lookup_strings(codes, strings):
+    """Strings of a segment's table `strings` for interned `codes`, with None for -1 (absent)."""
+    return [strings[code] if code >= 0 else None for code in codes.tolist()]
+
+
+def _strings_path(segment_path):
+    return segment_path[:-len(".npy")] + ".strings.json"
+
+
+def _json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+class EventLog:
+    """
+    Thread-safe, append-only event log. Every appended event is stamped with a
+    monotonically increasing "seq" so pollers can ask only for what they have not
+    seen yet. Iteration, len() and indexing yield event dicts like the plain lists
+    it replaces. Once attached to an EventBus, every appended event is also
+    published there.
+
+    Storage is columnar: each log has its own NumPy structured dtype built from
+    `schema` (field name -> "float" | "int" | "str" | "xy"), plus a presence bitmask
+    so records round-trip with exactly the keys they were appended with. Fields not
+    in the schema, or values that don't fit their declared kind, are kept as one
+    interned JSON string per event. Rows live in fixed-size segments, each with its
+    own string table; at most `capacity` rows stay in memory and older segments
+    spill, table and all, to files under `spill_dir` (a temporary directory by
+    default). With `spill=False` they are dropped instead.
+
+    Registered with an EventJournal, the log also writes every event through to the
+    journal, and can be rebuilt from its snapshots (`export_rows` / `load_rows`).
+    Attached to a RiskLedger, it posts the risk of every event to the ledger.
+
+    `generation` tells this log's seqs apart from those of a log it replaced
+    (`fresh`) or of an earlier run under the same name; the journal keeps it
+    across restarts.
+    """
+
+    def __init__(self, schema=None, capacity=100000, segment_size=10000, spill=True, spill_dir=None):
+        self.schema = dict(schema or {})
+        if len(self.schema) > 32:
+            raise ValueError("EventLog schemas support at most 32 fields")
+        for name, kind in self.schema.items():
+            if kind not in FIELD_DTYPES:
+                raise ValueError(f"Unknown kind {kind!r} for field {name!r}")
+        self.fields = list(self.schema)
+        self._bits = {name: 1 << bit for bit, name in enumerate(self.fields)}
+        self.dtype = np.dtype([("seq", "i8"), ("mask", "u4"), ("extra", "i4")] +
+                              [(name, FIELD_DTYPES[kind]) for name, kind in self.schema.items()])
+        self._positions = {name: position + 3 for position, name in enumerate(self.fields)}
+        self._empty_row = (0, 0, -1) + tuple((0, 0) if kind == "xy" else 0 for kind in self.schema.values())
+        self.segment_size = segment_size
+        self.max_memory_segments = max(1, capacity // segment_size)
+        self.spill = spill
+        self.spill_dir = spill_dir
+
+        self._memory_segments = []  # [segment_index, array, strings, string codes], oldest first
+        self._spilled = {}  # segment_index -> .npy path; its strings are next to it
+        self._free_arrays = []
+        self._count = 0  # events ever appended; the newest seq
+        self.generation = _new_generation()
+        self._first_seq = 1  # oldest seq still readable from memory or disk
+        self._cached_segment = (None, None, None)
+        self._lock = threading.Lock()
+        self.bus = None
+        self.topic = None
+        self.session_id = None
+        self.journal = None
+        self.journal_key = None
+        self.ledger = None
+        self.ledger_key = None
+
+    def attach(self, bus, topic, session_id=None):
+        """Publish appended events to `bus` under `topic`, tagged with the exam session if given."""
+        self.bus = bus
+        self.topic = topic
+        self.session_id = session_id
+
+    def attach_journal(self, journal, session_id=None, name=None):
+        """Write appended events through to `journal` (see EventJournal.register); None detaches."""
+        self.journal = journal
+        self.journal_key = (session_id, name) if journal is not None else None
+
+    def attach_ledger(self, ledger, tracker=None):
+        """
+        Post the risk of every event, those already logged first, to `ledger` (a
+        RiskLedger) as `tracker`'s; None detaches.
+        """
+        with self._lock:
+            self.ledger = ledger
+            self.ledger_key = tracker if ledger is not None else None
+            logged = self._count
+        # Appends from here on post themselves; only events up to `logged` are replayed.
+        seq = 0
+        while ledger is not None and seq < logged:
+            with self._lock:
+                first = max(seq + 1, self._first_seq)
+                seq = min(logged, first + self.segment_size - 1)
+                events = self._read(first, seq) if first <= seq else []
+            ledger.post_events(tracker, events)
+
+    def fresh(self):
+        """New, empty log with the same schema and storage settings, bus attachment, journal and ledger."""
+        log = EventLog(self.schema, capacity=self.max_memory_segments * self.segment_size,
+                       segment_size=self.segment_size, spill=self.spill)
+        log.generation = max(log.generation, self.generation + 1)
+        log.attach(self.bus, self.topic, self.session_id)
+        log.attach_ledger(self.ledger, self.ledger_key)
+        if self.journal is not None:
+            self.journal.register(log, *self.journal_key, reset=True)
+        return log
+
+    # Encoding
+
+    @staticmethod
+    def _intern(value, strings, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(strings)
+            strings.append(value)
+        return code
+
+    def _encode(self, event, seq, strings, codes):
+        """Row tuple for `event` in dtype field order, interning its strings into `strings`."""
+        values = list(self._empty_row)
+        mask = 0
+        extra = {}
+        for key, value in event.items():
+            if key == "seq":
+                continue
+            kind = self.schema.get(key)
+            if kind == "float" and isinstance(value, numbers.Real) and not isinstance(value, bool):
+                pass
+            elif (kind == "int" and isinstance(value, numbers.Integral) and not isinstance(value, bool)
+                  and INT64_MIN <= value <= INT64_MAX):
+                pass
+            elif kind == "str" and isinstance(value, str):
+                value = self._intern(value, strings, codes)
+            elif (kind == "xy" and isinstance(value, (tuple, list)) and len(value) == 2
+                  and all(isinstance(v, numbers.Integral) and not isinstance(v, bool) for v in value)):
+                pass
+            else:
+                extra[key] = value
+                continue
+            values[self._positions[key]] = value
+            mask |= self._bits[key]
+        values[0] = seq
+        values[1] = mask
+        values[2] = self._intern(json.dumps(extra, default=_json_default), strings, codes) if extra else -1
+        return tuple(values)
+
+    def _decode(self, row, strings):
+        event = {}
+        mask = int(row["mask"])
+        for bit, name in enumerate(self.fields):
+            if mask & (1 << bit):
+                kind = self.schema[name]
+                value = row[name]
+                if kind == "float":
+                    event[name] = float(value)
+                elif kind == "int":
+                    event[name] = int(value)
+                elif kind == "str":
+                    event[name] = strings[int(value)]
+                else:
+                    event[name] = (int(value[0]), int(value[1]))
+        extra = int(row["extra"])
+        if extra >= 0:
+            event.update(json.loads(strings[extra]))
+        event["seq"] = int(row["seq"])
+        return event
+
+    # Segments
+
+    def _new_segment_array(self):
+        if self._free_arrays:
+            return self._free_arrays.pop()
+        return np.zeros(self.segment_size, dtype=self.dtype)
+
+    def _add_segment(self, index):
+        """Start segment `index` in memory, evicting the oldest one if memory is full."""
+        if len(self._memory_segments) >= self.max_memory_segments:
+            self._evict_oldest_segment()
+        segment = [index, self._new_segment_array(), [], {}]
+        self._memory_segments.append(segment)
+        return segment
+
+    def _evict_oldest_segment(self):
+        index, array, strings, _ = self._memory_segments.pop(0)
+        if self.spill:
+            try:
+                if self.spill_dir is None:
+                    self.spill_dir = tempfile.mkdtemp(prefix="eventlog-")
+                    weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+                path = os.path.join(self.spill_dir, f"segment-{index:08d}.npy")
+                np.save(path, array)
+                with open(_strings_path(path), "w", encoding="utf-8") as f:
+                    json.dump(strings, f)
+                self._spilled[index] = path
+            except OSError as e:
+                logger.error("Failed to spill event segment %d: %s", index, e)
+        if index not in self._spilled:
+            self._first_seq = (index + 1) * self.segment_size + 1
+        self._free_arrays.append(array)
+
+    def _segment(self, index):
+        """(array, string table) of segment `index`, loading spilled segments from disk on demand."""
+        for segment_index, array, strings, _ in self._memory_segments:
+            if segment_index == index:
+                return array, strings
+        cached_index, cached_array, cached_strings = self._cached_segment
+        if cached_index == index:
+            return cached_array, cached_strings
+        path = self._spilled[index]
+        array = np.load(path, mmap_mode="r")
+        with open(_strings_path(path), encoding="utf-8") as f:
+            strings = json.load(f)
+        self._cached_segment = (index, array, strings)
+        return array, strings
+
+    def append(self, event):
+        with self._lock:
+            seq = self._count + 1
+            index, offset = divmod(seq - 1, self.segment_size)
+            segment = self._add_segment(index) if offset == 0 else self._memory_segments[-1]
+            segment[1][offset] = self._encode(event, seq, segment[2], segment[3])
+            self._count = seq
+            event["seq"] = seq
+            if self.journal is not None:
+                # Under the lock, so the journal sees each log's events in seq order.
+                self.journal.append_event(*self.journal_key, dict(event))
+            # Read with the seq, so attach_ledger replays this event or we post it, never both.
+            ledger, tracker = self.ledger, self.ledger_key
+        if ledger is not None:
+            ledger.post_events(tracker, (event,))
+        if self.bus is not None:
+            self.bus.publish(self.topic, event, self.session_id)
+        return seq
+
+    # Reading
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest event, or 0 if the log is empty."""
+        with self._lock:
+            return self._count
+
+    def _read(self, first_seq, last_seq):
+        """Decode events with first_seq <= seq <= last_seq. Caller holds the lock."""
+        events = []
+        seq = first_seq
+        while seq <= last_seq:
+            index, offset = divmod(seq - 1, self.segment_size)
+            end = min(self.segment_size, offset + last_seq - seq + 1)
+            array, strings = self._segment(index)
+            events.extend(self._decode(row, strings) for row in array[offset:end])
+            seq += end - offset
+        return events
+
+    def since(self, cursor=0, limit=None):
+        """
+        Return (events, next_cursor, has_more) for events with seq > cursor, oldest first.
+        A cursor beyond the newest event means the log was recreated, so the caller
+        starts over from the beginning. Events that were dropped are skipped.
+        """
+        with self._lock:
+            if cursor is None or cursor < 0 or cursor > self._count:
+                cursor = 0
+            first = max(cursor + 1, self._first_seq)
+            last = self._count if limit is None else min(self._count, first + limit - 1)
+            events = self._read(first, last)
+            has_more = last < self._count
+        next_cursor = events[-1]["seq"] if events else cursor
+        return events, next_cursor, has_more
+
+    def segments(self, start_seq=1, stop_seq=None):
+        """
+        Yield (rows, strings) for the raw rows with start_seq <= seq <= stop_seq (the
+        newest event at call time by default), one segment at a time, for columnar
+        consumers: rows is a copy of the structured array, and its "str" and "extra"
+        columns hold codes into the segment's string table `strings` (see
+        `lookup_strings`).
+        """
+        with self._lock:
+            stop_seq = self._count if stop_seq is None else min(stop_seq, self._count)
+            seq = max(start_seq, self._first_seq)
+        while seq <= stop_seq:
+            with self._lock:
+                seq = max(seq, self._first_seq)
+                if seq > stop_seq:
+                    return
+                index, offset = divmod(seq - 1, self.segment_size)
+                end = min(self.segment_size, offset + stop_seq - seq + 1)
+                array, strings = self._segment(index)
+                rows = np.array(array[offset:end])
+            # The table only grows, so it covers every code in the copied rows.
+            yield rows, strings
+            seq += end - offset
+
+    def _code_columns(self, rows):
+        """(name, codes) of the "extra" and every "str" column of `rows`, with -1 for absent fields."""
+        columns = [("extra", rows["extra"])]
+        for name, kind in self.schema.items():
+            if kind == "str":
+                present = (rows["mask"] & np.uint32(self._bits[name])) != 0
+                columns.append((name, np.where(present, rows[name], -1)))
+        return columns
+
+    def export_rows(self):
+        """(rows, strings): every readable row as one structured array, and one string table its codes index."""
+        chunks, strings = [], []
+        for rows, segment_strings in self.segments():
+            # Codes move up past the tables of the segments before this one.
+            for name, codes in self._code_columns(rows):
+                rows[name] = np.where(codes >= 0, codes + len(strings), rows[name])
+            chunks.append(rows)
+            strings.extend(segment_strings)
+        rows = np.concatenate(chunks) if chunks else np.zeros(0, dtype=self.dtype)
+        return rows, strings
+
+    def load_rows(self, rows, strings):
+        """Fill an empty log with rows and strings from export_rows, keeping their seq numbers."""
+        if rows.dtype != self.dtype:
+            raise ValueError("Rows were exported from a log with a different schema")
+        with self._lock:
+            if self._count:
+                raise ValueError("load_rows needs an empty log")
+            if not len(rows):
+                return
+            seq = int(rows["seq"][0])
+            self._first_seq = seq
+            position = 0
+            while position < len(rows):
+                index, offset = divmod(seq - 1, self.segment_size)
+                count = min(self.segment_size - offset, len(rows) - position)
+                chunk = np.array(rows[position:position + count])
+                # Each chunk starts a segment (the log is empty), whose table holds just the strings its rows use.
+                segment = self._add_segment(index)
+                columns = self._code_columns(chunk)
+                used = np.unique(np.concatenate([codes for _, codes in columns]))
+                used = used[used >= 0]
+                segment[2].extend(strings[code] for code in used.tolist())
+                segment[3].update((string, code) for code, string in enumerate(segment[2]))
+                for name, codes in columns:
+                    chunk[name] = np.where(codes >= 0, np.searchsorted(used, codes), chunk[name])
+                segment[1][offset:offset + count] = chunk
+                position += count
+                seq += count
+            self._count = seq - 1
+
+    def snapshot(self):
+        return list(self)
+
+    def __len__(self):
+        with self._lock:
+            return self._count - self._first_seq + 1
+
+    def __iter__(self):
+        # One segment at a time, so iterating a long log never decodes it all at once.
+        seq = self._first_seq
+        while True:
+            with self._lock:
+                seq = max(seq, self._first_seq)
+                if seq > self._count:
+                    return
+                last = min(self._count, ((seq - 1) // self.segment_size + 1) * self.segment_size)
+                events = self._read(seq, last)
+            yield from events
+            seq = last + 1
+
+    def __getitem__(self, index):
+        with self._lock:
+            length = self._count - self._first_seq + 1
+            if isinstance(index, slice):
+                start, stop, step = index.indices(length)
+                if step != 1:
+                    raise ValueError("EventLog slices do not support a step")
+                if stop <= start:
+                    return []
+                return self._read(self._first_seq + start, self._first_seq + stop - 1)
+            if index < 0:
+                index += length
+            if not 0 <= index < length:
+                raise IndexError("EventLog index out of range")
+            return self._read(self._first_seq + index, self._first_seq + index)[0]
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "events": self._count,
+                "first_seq": self._first_seq,
+                "memory_segments": len(self._memory_segments),
+                "spilled_segments": len(self._spilled),
+                "memory_bytes": (len(self._memory_segments) + len(self._free_arrays)) * self.segment_size * self.dtype.itemsize,
+                "interned_strings": sum(len(strings) for _, _, strings, _ in self._memory_segments)
+            }
@@ -0,0 +1,126 @@
+import collections
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import cv2
+
+logger = logging.getLogger("EvidenceStore")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+EVIDENCE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MIMETYPES = {".jpg": "image/jpeg", ".png": "image/png"}
+
+
+class EvidenceStore:
+    """
+    Bounded on-disk store of compressed evidence thumbnails, addressed by the SHA-256
+    of the encoded image. Identical frames are stored once; when the store exceeds
+    `max_bytes` or `max_items`, the oldest entries are evicted first.
+    """
+
+    def __init__(self, root, max_bytes=200 * 1024 * 1024, max_items=5000,
+                 thumbnail_width=320, image_format=".jpg", jpeg_quality=70):
+        if image_format not in MIMETYPES:
+            raise ValueError(f"Unsupported evidence image format: {image_format}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.thumbnail_width = thumbnail_width
+        self.image_format = image_format
+        self.mimetype = MIMETYPES[image_format]
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality] if image_format == ".jpg" else []
+        self.index = collections.OrderedDict()  # evidence_id -> size in bytes, oldest first
+        self.total_bytes = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the eviction order from files left by a previous run."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                evidence_id, ext = os.path.splitext(filename)
+                if ext == self.image_format and EVIDENCE_ID_PATTERN.match(evidence_id):
+                    stat = os.stat(os.path.join(dirpath, filename))
+                    entries.append((stat.st_mtime, evidence_id, stat.st_size))
+        for _, evidence_id, size in sorted(entries):
+            self.index[evidence_id] = size
+            self.total_bytes += size
+        if entries:
+            logger.info("Loaded %d evidence images (%d bytes) from %s", len(entries), self.total_bytes, self.root)
+
+    def _path(self, evidence_id):
+        return os.path.join(self.root, evidence_id[:2], evidence_id + self.image_format)
+
+    def put(self, frame):
+        """Store a BGR frame as a thumbnail and return its evidence ID, or None on failure."""
+        if frame is None:
+            return None
+        height, width = frame.shape[:2]
+        if width > self.thumbnail_width:
+            scale = self.thumbnail_width / width
+            frame = cv2.resize(frame, (self.thumbnail_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode(self.image_format, frame, self.encode_params)
+        if not ret:
+            logger.error("Failed to encode evidence frame.")
+            return None
+        data = buffer.tobytes()
+        evidence_id = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            if evidence_id in self.index:
+                self.index.move_to_end(evidence_id)
+                return evidence_id
+            path = self._path(evidence_id)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error("Failed to write evidence %s: %s", evidence_id, e)
+                return None
+            self.index[evidence_id] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+        return evidence_id
+
+    def _evict(self):
+        while self.index and (self.total_bytes > self.max_bytes or len(self.index) > self.max_items):
+            evidence_id, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(self._path(evidence_id))
+            except OSError as e:
+                logger.warning("Failed to remove evicted evidence %s: %s", evidence_id, e)
+
+    def get_path(self, evidence_id):
+        """Path of a stored evidence image, or None if the ID is unknown or was evicted."""
+        if not EVIDENCE_ID_PATTERN.match(evidence_id or ""):
+            return None
+        with self._lock:
+            if evidence_id not in self.index:
+                return None
+        return self._path(evidence_id)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "items": len(self.index),
+                "bytes": self.total_bytes,
+                "evicted": self.evicted,
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes
+            }
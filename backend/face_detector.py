@@ -1,8 +1,10 @@
 import cv2
-import torch
-from facenet_pytorch import MTCNN
 import time
 import logging
+import threading
+from frame_pipeline import FramePipeline
+from camera_broker import get_broker
+from event_log import EventLog
 
 # Setup logging.
 logger = logging.getLogger("FaceDetector")
@@ -13,24 +15,23 @@ if not logger.handlers:
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
-# Use GPU if available.
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-mtcnn = MTCNN(keep_all=True, device=device)
+# MTCNN (and torch) load on first use rather than at import.
+_mtcnn = None
+_mtcnn_lock = threading.Lock()
 
-# Global risk score and event log.
-eye_risk_score = 0  # Cumulative risk score.
-eye_risk_events = []  # Log of risk events.
 
-# Tracking variables for extra faces.
-prev_extra_faces = 0  # Previous extra face count.
-extra_face_start_time = None  # Timestamp when extra face count became stable.
+def get_mtcnn():
+    global _mtcnn
+    with _mtcnn_lock:
+        if _mtcnn is None:
+            import torch
+            from facenet_pytorch import MTCNN
+            # Use GPU if available.
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            _mtcnn = MTCNN(keep_all=True, device=device)
+            logger.info("MTCNN loaded on %s.", device)
+    return _mtcnn
 
-# Tracking variable for looking-away risk.
-no_face_start_time = None  # Timestamp when no face was first detected.
-
-# Flag to start scoring only after a person is detected and a wait period passes.
-scoring_started = False
-detection_start_time = None
 WAIT_TIME = 5  # Wait 5 seconds after a face is first detected before starting risk scoring
 
 # Risk parameters.
@@ -40,154 +41,240 @@ LOOKING_AWAY_TIME_RISK_PER_10SEC = 10  # Risk for no face detected every 10 seco
 EYE_ALIGNMENT_THRESHOLD = 10  # Vertical pixel difference threshold.
 EYE_ALIGNMENT_RISK = 5  # Risk for abnormal eye alignment.
 
+# Columns of the per-session risk event log.
+FACE_EVENT_SCHEMA = {
+    "timestamp": "float", "event": "str", "risk": "int", "duration": "float",
+    "intervals": "int", "faces_detected": "int", "vertical_diff": "float"
+}
 
-def process_frame(frame):
-    global eye_risk_score, eye_risk_events, prev_extra_faces, extra_face_start_time
-    global no_face_start_time, scoring_started, detection_start_time
-    current_time = time.time()
 
-    # Convert frame from BGR to RGB.
-    img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    boxes, probs, landmarks = mtcnn.detect(img_rgb, landmarks=True)
-
-    # CASE 1: No face detected.
-    if boxes is None or len(boxes) == 0:
-        # If scoring hasn't started (i.e. person never detected), do nothing.
-        if not scoring_started:
-            return frame
-        # If a face was detected earlier and now missing, accumulate looking-away risk.
-        if no_face_start_time is None:
-            no_face_start_time = current_time
-        else:
-            duration = current_time - no_face_start_time
-            if duration >= 10:
-                intervals = int(duration // 10)
-                looking_away_risk = intervals * LOOKING_AWAY_TIME_RISK_PER_10SEC
-                eye_risk_score += looking_away_risk
-                eye_risk_events.append({
-                    "timestamp": current_time,
-                    "event": "Looking Away",
-                    "risk": looking_away_risk,
-                    "duration": duration,
-                    "intervals": intervals
-                })
-                logger.info("No face detected for %.2f sec (%d intervals); looking away risk +%d",
-                            duration, intervals, looking_away_risk)
-                no_face_start_time += 10 * intervals
-        # Reset extra face tracking when no face is visible.
-        prev_extra_faces = 0
-        extra_face_start_time = None
-        return frame
-
-    # CASE 2: Face detected.
-    # If this is the first detection, initialize scoring and wait before starting risk scoring.
-    if not scoring_started:
-        scoring_started = True
-        detection_start_time = current_time
-        # Do not accumulate any risk on the first detected frame.
-        logger.info("Face detected. Waiting %d seconds to start risk scoring.", WAIT_TIME)
-        return frame
-
-    # If waiting period hasn't elapsed, skip risk calculation.
-    if current_time - detection_start_time < WAIT_TIME:
-        return frame
-
-    # Reset no-face timer if face is detected.
-    no_face_start_time = None
-    current_delta = 0  # Risk increment for the current frame.
-
-    # Calculate extra face count (faces beyond the first one).
-    current_extra_faces = max(len(boxes) - 1, 0)
-
-    if current_extra_faces > 0:
-        if current_extra_faces != prev_extra_faces:
-            extra_face_start_time = current_time
-            immediate_risk = current_extra_faces * EXTRA_FACE_IMMEDIATE_RISK
-            current_delta += immediate_risk
-            eye_risk_events.append({
-                "timestamp": current_time,
-                "event": "Multiple Faces Detected",
-                "risk": immediate_risk,
-                "faces_detected": len(boxes)
-            })
-            logger.info("Detected %d faces (%d extra); immediate risk +%d",
-                        len(boxes), current_extra_faces, immediate_risk)
-        else:
-            if extra_face_start_time is not None:
-                duration = current_time - extra_face_start_time
+class FaceSession:
+    """Face risk scoring state for one candidate."""
+
+    def __init__(self, session_id="default", callback=None):
+        self.session_id = session_id
+        self.callback = callback
+        # Cumulative risk score and event log.
+        self.risk_score = 0
+        self.risk_events = EventLog(schema=FACE_EVENT_SCHEMA)
+
+        # Tracking variables for extra faces.
+        self.prev_extra_faces = 0  # Previous extra face count.
+        self.extra_face_start_time = None  # Timestamp when extra face count became stable.
+
+        # Tracking variable for looking-away risk.
+        self.no_face_start_time = None  # Timestamp when no face was first detected.
+
+        # Flag to start scoring only after a person is detected and a wait period passes.
+        self.scoring_started = False
+        self.detection_start_time = None
+
+    def _log_event(self, event):
+        self.risk_events.append(event)
+        if self.callback:
+            self.callback(event)
+
+    def record_event(self, event):
+        """Add a risk event detected elsewhere, e.g. by the candidate machine's agent."""
+        self.risk_score += event.get("risk", 0)
+        self._log_event(event)
+
+    def update(self, boxes, landmarks, current_time):
+        """
+        Update the risk score from one frame's MTCNN output. Returns an overlay dict with
+        the face boxes and eye points to draw, or None when nothing should be drawn.
+        """
+        # CASE 1: No face detected.
+        if boxes is None or len(boxes) == 0:
+            # If scoring hasn't started (i.e. person never detected), do nothing.
+            if not self.scoring_started:
+                return None
+            # If a face was detected earlier and now missing, accumulate looking-away risk.
+            if self.no_face_start_time is None:
+                self.no_face_start_time = current_time
+            else:
+                duration = current_time - self.no_face_start_time
                 if duration >= 10:
                     intervals = int(duration // 10)
-                    extra_time_risk = current_extra_faces * EXTRA_FACE_TIME_RISK_PER_10SEC * intervals
-                    current_delta += extra_time_risk
-                    eye_risk_events.append({
+                    looking_away_risk = intervals * LOOKING_AWAY_TIME_RISK_PER_10SEC
+                    self.risk_score += looking_away_risk
+                    self._log_event({
                         "timestamp": current_time,
-                        "event": "Extra Face Duration",
-                        "risk": extra_time_risk,
+                        "event": "Looking Away",
+                        "risk": looking_away_risk,
                         "duration": duration,
                         "intervals": intervals
                     })
-                    logger.info("Extra faces stable for %.2f sec (%d intervals); additional risk +%d",
-                                duration, intervals, extra_time_risk)
-                    extra_face_start_time += 10 * intervals
-        prev_extra_faces = current_extra_faces
-    else:
-        # Only one face present; reset extra face tracking.
-        prev_extra_faces = 0
-        extra_face_start_time = None
-
-    # Check eye alignment for each detected face.
-    if landmarks is not None:
-        for face_landmarks in landmarks:
-            if face_landmarks is not None and len(face_landmarks) >= 2:
-                left_eye, right_eye = face_landmarks[0], face_landmarks[1]
-                cv2.circle(frame, (int(left_eye[0]), int(left_eye[1])), 3, (255, 0, 0), -1)
-                cv2.circle(frame, (int(right_eye[0]), int(right_eye[1])), 3, (255, 0, 0), -1)
-                vertical_diff = abs(left_eye[1] - right_eye[1])
-                if vertical_diff > EYE_ALIGNMENT_THRESHOLD:
-                    current_delta += EYE_ALIGNMENT_RISK
-                    eye_risk_events.append({
-                        "timestamp": current_time,
-                        "event": "Abnormal Eye Alignment",
-                        "risk": EYE_ALIGNMENT_RISK,
-                        "vertical_diff": vertical_diff
-                    })
-                    logger.info("Abnormal eye alignment (diff=%.2f px); risk +%d",
-                                vertical_diff, EYE_ALIGNMENT_RISK)
+                    logger.info("[%s] No face detected for %.2f sec (%d intervals); looking away risk +%d",
+                                self.session_id, duration, intervals, looking_away_risk)
+                    self.no_face_start_time += 10 * intervals
+            # Reset extra face tracking when no face is visible.
+            self.prev_extra_faces = 0
+            self.extra_face_start_time = None
+            return None
+
+        # CASE 2: Face detected.
+        # If this is the first detection, initialize scoring and wait before starting risk scoring.
+        if not self.scoring_started:
+            self.scoring_started = True
+            self.detection_start_time = current_time
+            # Do not accumulate any risk on the first detected frame.
+            logger.info("[%s] Face detected. Waiting %d seconds to start risk scoring.",
+                        self.session_id, WAIT_TIME)
+            return None
+
+        # If waiting period hasn't elapsed, skip risk calculation.
+        if current_time - self.detection_start_time < WAIT_TIME:
+            return None
+
+        # Reset no-face timer if face is detected.
+        self.no_face_start_time = None
+        current_delta = 0  # Risk increment for the current frame.
+
+        # Calculate extra face count (faces beyond the first one).
+        current_extra_faces = max(len(boxes) - 1, 0)
+
+        if current_extra_faces > 0:
+            if current_extra_faces != self.prev_extra_faces:
+                self.extra_face_start_time = current_time
+                immediate_risk = current_extra_faces * EXTRA_FACE_IMMEDIATE_RISK
+                current_delta += immediate_risk
+                self._log_event({
+                    "timestamp": current_time,
+                    "event": "Multiple Faces Detected",
+                    "risk": immediate_risk,
+                    "faces_detected": len(boxes)
+                })
+                logger.info("[%s] Detected %d faces (%d extra); immediate risk +%d",
+                            self.session_id, len(boxes), current_extra_faces, immediate_risk)
+            else:
+                if self.extra_face_start_time is not None:
+                    duration = current_time - self.extra_face_start_time
+                    if duration >= 10:
+                        intervals = int(duration // 10)
+                        extra_time_risk = current_extra_faces * EXTRA_FACE_TIME_RISK_PER_10SEC * intervals
+                        current_delta += extra_time_risk
+                        self._log_event({
+                            "timestamp": current_time,
+                            "event": "Extra Face Duration",
+                            "risk": extra_time_risk,
+                            "duration": duration,
+                            "intervals": intervals
+                        })
+                        logger.info("[%s] Extra faces stable for %.2f sec (%d intervals); additional risk +%d",
+                                    self.session_id, duration, intervals, extra_time_risk)
+                        self.extra_face_start_time += 10 * intervals
+            self.prev_extra_faces = current_extra_faces
+        else:
+            # Only one face present; reset extra face tracking.
+            self.prev_extra_faces = 0
+            self.extra_face_start_time = None
+
+        # Check eye alignment for each detected face.
+        eye_points = []
+        if landmarks is not None:
+            for face_landmarks in landmarks:
+                if face_landmarks is not None and len(face_landmarks) >= 2:
+                    left_eye, right_eye = face_landmarks[0], face_landmarks[1]
+                    eye_points.append((int(left_eye[0]), int(left_eye[1])))
+                    eye_points.append((int(right_eye[0]), int(right_eye[1])))
+                    vertical_diff = abs(left_eye[1] - right_eye[1])
+                    if vertical_diff > EYE_ALIGNMENT_THRESHOLD:
+                        current_delta += EYE_ALIGNMENT_RISK
+                        self._log_event({
+                            "timestamp": current_time,
+                            "event": "Abnormal Eye Alignment",
+                            "risk": EYE_ALIGNMENT_RISK,
+                            "vertical_diff": vertical_diff
+                        })
+                        logger.info("[%s] Abnormal eye alignment (diff=%.2f px); risk +%d",
+                                    self.session_id, vertical_diff, EYE_ALIGNMENT_RISK)
+
+        self.risk_score += current_delta
+        logger.debug("[%s] Frame processed: risk increment = %d, total risk = %d",
+                     self.session_id, current_delta, self.risk_score)
+        return {
+            "boxes": [[int(b) for b in box] for box in boxes],
+            "eye_points": eye_points
+        }
+
+
+# State for the candidate proctored by this process (the /video_feed stream).
+default_session = FaceSession()
+
+
+def __getattr__(name):
+    # Module-level names from before FaceSession existed, kept for existing callers.
+    if name == "eye_risk_score":
+        return default_session.risk_score
+    if name == "eye_risk_events":
+        return default_session.risk_events
+    if name == "scoring_started":
+        return default_session.scoring_started
+    if name == "mtcnn":
+        return get_mtcnn()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def analyze_frame(frame, session=None):
+    """
+    Run MTCNN on a frame and update the session's risk score (the default session if
+    none is given). Returns the overlay from FaceSession.update; the frame itself is
+    not modified.
+    """
+    session = session if session is not None else default_session
+    current_time = time.time()
+
+    # Convert frame from BGR to RGB.
+    img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    boxes, probs, landmarks = get_mtcnn().detect(img_rgb, landmarks=True)
+    return session.update(boxes, landmarks, current_time)
+
 
-    # Draw bounding boxes around detected faces.
-    for box in boxes:
-        box = [int(b) for b in box]
+def draw_overlay(frame, overlay):
+    """Draw face boxes and eye points from analyze_frame onto the frame in place."""
+    for x, y in overlay["eye_points"]:
+        cv2.circle(frame, (x, y), 3, (255, 0, 0), -1)
+    for box in overlay["boxes"]:
         cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (0, 255, 0), 2)
+    return frame
+
 
-    eye_risk_score += current_delta
-    logger.debug("Frame processed: risk increment = %d, total risk = %d", current_delta, eye_risk_score)
+def process_frame(frame):
+    overlay = analyze_frame(frame)
+    if overlay is not None:
+        draw_overlay(frame, overlay)
     return frame
 
 
+# Capture/inference/encode pipeline backing the MJPEG stream.
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = FramePipeline(analyze_frame, draw_overlay, get_broker())
+        return _pipeline
+
+
 def gen_frames():
-    global cap
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        logger.error("Cannot open webcam.")
+    pipeline = get_pipeline()
+    if not pipeline.start():
         return
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            logger.error("Failed to capture frame.")
-            break
-        frame = process_frame(frame)
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    yield from pipeline.mjpeg_frames()
+
+
+def get_pipeline_stats():
+    return get_pipeline().get_stats()
 
 
 def stop_video():
-    global cap
-    if cap is not None:
-        cap.release()
-        cap = None
-        logger.info("Camera has been released.")
+    if _pipeline is not None:
+        _pipeline.stop()
+        logger.info("Video stream released its camera subscription.")
 
 
 if __name__ == '__main__':
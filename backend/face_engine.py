@@ -0,0 +1,195 @@
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+import face_detector
+from face_detector import FaceSession
+
+logger = logging.getLogger("FaceScoringEngine")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+def decode_frame(data):
+    """BGR frame of an encoded image (JPEG, PNG, ...). ValueError if it can't be decoded."""
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    if frame is None:
+        raise ValueError("Frame is not a decodable image")
+    return frame
+
+
+class FaceScoringEngine:
+    """
+    Scores frames from many exam sessions with shared MTCNN micro-batches.
+
+    Callers submit (session_id, frame) pairs; a worker thread collects pending frames
+    until `max_batch_size` is reached or `max_wait` seconds have passed since the
+    first one arrived, runs a single `mtcnn.detect` per frame size, and feeds each
+    result into that session's FaceSession. Only the newest pending frame per session
+    is kept: a frame superseded before it was batched resolves to None.
+
+    With `sessions` (a SessionRegistry), frames score into each ExamSession's `face`,
+    under the session's lock; a session that is gone by then resolves to None.
+    Without it the engine keeps FaceSessions of its own.
+    """
+
+    def __init__(self, detector=None, sessions=None, max_batch_size=8, max_wait=0.02):
+        self.detector = detector
+        self.sessions = sessions
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._face_sessions = {}
+        self.pending = collections.OrderedDict()
+        self.running = False
+        self.thread = None
+        self.frames_processed = 0
+        self.frames_superseded = 0
+        self.batches_processed = 0
+        self.inference_time = 0.0
+        self._sessions_lock = threading.Lock()
+        self._cond = threading.Condition()
+
+    def get_session(self, session_id):
+        """The FaceSession frames of `session_id` score into, or None if the registry has no such session."""
+        if self.sessions is not None:
+            session = self.sessions.get(session_id)
+            return session.face if session is not None else None
+        with self._sessions_lock:
+            session = self._face_sessions.get(session_id)
+            if session is None:
+                session = FaceSession(session_id)
+                self._face_sessions[session_id] = session
+            return session
+
+    def remove_session(self, session_id):
+        """Forget one of the engine's own FaceSessions; registry sessions end with the registry's."""
+        with self._sessions_lock:
+            return self._face_sessions.pop(session_id, None)
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._batch_loop, daemon=True)
+        self.thread.start()
+        logger.info("Face scoring engine started (max batch %d, max wait %.3fs).",
+                    self.max_batch_size, self.max_wait)
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logger.info("Face scoring engine stopped.")
+
+    def submit(self, session_id, frame, timestamp=None):
+        """Queue a BGR frame for scoring. Returns a Future resolving to the frame's overlay."""
+        future = Future()
+        item = (session_id, frame, timestamp if timestamp is not None else time.time(), future)
+        with self._cond:
+            superseded = self.pending.pop(session_id, None)
+            self.pending[session_id] = item
+            self._cond.notify()
+        if superseded is not None:
+            self.frames_superseded += 1
+            superseded[3].set_result(None)
+        return future
+
+    def _next_batch(self):
+        with self._cond:
+            while self.running and not self.pending:
+                self._cond.wait(0.5)
+            if not self.pending:
+                return []
+            deadline = time.time() + self.max_wait
+            while self.running and len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self.pending and len(batch) < self.max_batch_size:
+                batch.append(self.pending.popitem(last=False)[1])
+            return batch
+
+    def _batch_loop(self):
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                overlays = self.process_batch([(session_id, frame, timestamp)
+                                               for session_id, frame, timestamp, _ in batch])
+            except Exception as e:
+                logger.error("Error scoring batch of %d frames: %s", len(batch), e)
+                for *_, future in batch:
+                    future.set_exception(e)
+                continue
+            for (*_, future), overlay in zip(batch, overlays):
+                future.set_result(overlay)
+
+    def process_batch(self, items):
+        """
+        Score a list of (session_id, bgr_frame, timestamp) synchronously and return the
+        overlays in the same order. Frames are grouped by shape because MTCNN can only
+        stack equally sized images into one batch.
+        """
+        detector = self.detector if self.detector is not None else face_detector.mtcnn
+        groups = collections.defaultdict(list)
+        for index, (_, frame, _) in enumerate(items):
+            groups[frame.shape].append(index)
+
+        results = [None] * len(items)
+        start = time.perf_counter()
+        for indices in groups.values():
+            images = [cv2.cvtColor(items[i][1], cv2.COLOR_BGR2RGB) for i in indices]
+            boxes, _, landmarks = detector.detect(images, landmarks=True)
+            for position, i in enumerate(indices):
+                results[i] = (boxes[position], landmarks[position])
+        self.inference_time += time.perf_counter() - start
+
+        overlays = []
+        for (session_id, _, timestamp), (boxes, landmarks) in zip(items, results):
+            overlays.append(self._update(session_id, boxes, landmarks, timestamp))
+        self.frames_processed += len(items)
+        self.batches_processed += 1
+        return overlays
+
+    def _update(self, session_id, boxes, landmarks, timestamp):
+        if self.sessions is None:
+            return self.get_session(session_id).update(boxes, landmarks, timestamp)
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        # Ingested face records update the same FaceSession under this lock.
+        with session.lock:
+            return session.face.update(boxes, landmarks, timestamp)
+
+    def get_stats(self):
+        with self._cond:
+            pending = len(self.pending)
+        with self._sessions_lock:
+            sessions = len(self.sessions) if self.sessions is not None else len(self._face_sessions)
+        batches = self.batches_processed
+        return {
+            "running": self.running,
+            "sessions": sessions,
+            "pending_frames": pending,
+            "frames_processed": self.frames_processed,
+            "frames_superseded": self.frames_superseded,
+            "batches_processed": batches,
+            "avg_batch_size": round(self.frames_processed / batches, 2) if batches else 0,
+            "inference_fps": round(self.frames_processed / self.inference_time, 2) if self.inference_time else 0
+        }
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+EYE_REGION = 0.6  # eyes sit in the upper part of a frontal face box
+
+
+class HaarFaceTracker:
+    """
+    Haar face detection that does not scan every frame. A full detectMultiScale
+    runs on a `detection_scale` downscaled copy of the frame every `detect_every`
+    frames; in between, each face found by the last detection is followed by
+    normalized template matching in a small window around its previous position.
+    If any face's match score drops below `min_match` the tracker is considered
+    lost and a full detection runs on that same frame.
+
+    Faces that appear between detections are picked up by the next scheduled
+    detection, at most `detect_every - 1` frames late; while no face is known the
+    tracker keeps reporting none until then.
+    """
+
+    def __init__(self, face_cascade, detect_every=5, detection_scale=0.6, search_margin=0.5,
+                 min_match=0.6, scale_factor=1.3, min_neighbors=5):
+        self.face_cascade = face_cascade
+        self.detect_every = max(1, detect_every)
+        self.detection_scale = detection_scale
+        self.search_margin = search_margin
+        self.min_match = min_match
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.tracks = []  # [(box in downscaled coords, template)]
+        self.frames_since_detection = None
+        self.frames = 0
+        self.detections = 0
+        self.losses = 0
+
+    def reset(self):
+        self.tracks = []
+        self.frames_since_detection = None
+
+    def update(self, gray):
+        """Face boxes (x, y, w, h) in full-resolution `gray` coordinates for this frame."""
+        self.frames += 1
+        small = self._downscale(gray)
+        due = self.frames_since_detection is None or self.frames_since_detection + 1 >= self.detect_every
+        if not due:
+            tracked = self._track(small)
+            if tracked is None:
+                self.losses += 1
+                due = True
+            else:
+                self.frames_since_detection += 1
+                return self._to_full(tracked)
+        return self._to_full(self._detect(small))
+
+    def _downscale(self, gray):
+        if self.detection_scale == 1:
+            return gray
+        return cv2.resize(gray, None, fx=self.detection_scale, fy=self.detection_scale,
+                          interpolation=cv2.INTER_AREA)
+
+    def _detect(self, small):
+        self.detections += 1
+        self.frames_since_detection = 0
+        faces = self.face_cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors)
+        boxes = [tuple(int(v) for v in face) for face in faces]
+        self.tracks = [((x, y, w, h), small[y:y + h, x:x + w].copy()) for x, y, w, h in boxes]
+        return boxes
+
+    def _track(self, small):
+        """New positions of every tracked face, or None if any of them was lost."""
+        boxes = []
+        tracks = []
+        height, width = small.shape[:2]
+        for (x, y, w, h), template in self.tracks:
+            dx, dy = int(w * self.search_margin), int(h * self.search_margin)
+            x1, y1 = max(0, x - dx), max(0, y - dy)
+            x2, y2 = min(width, x + w + dx), min(height, y + h + dy)
+            if x2 - x1 < w or y2 - y1 < h:
+                return None
+            scores = cv2.matchTemplate(small[y1:y2, x1:x2], template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+            if score < self.min_match:
+                return None
+            box = (x1 + mx, y1 + my, w, h)
+            boxes.append(box)
+            # Keep the detection's template: re-cutting it every frame lets it drift off the face.
+            tracks.append((box, template))
+        self.tracks = tracks
+        return boxes
+
+    def _to_full(self, boxes):
+        if not boxes:
+            return np.empty((0, 4), dtype=np.int32)
+        scale = 1.0 / self.detection_scale
+        return np.array([[round(v * scale) for v in box] for box in boxes], dtype=np.int32)
+
+    def get_stats(self):
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "tracked_frames": self.frames - self.detections,
+            "losses": self.losses,
+            "detect_every": self.detect_every,
+            "detection_scale": self.detection_scale
+        }
+
+
+def detect_eyes(eye_cascade, gray, face):
+    """
+    Eyes within the upper EYE_REGION of `face`, ignoring candidates too small to be
+    an eye at this face size. Boxes are relative to the face's top-left corner,
+    like running the cascade on the whole face ROI.
+    """
+    x, y, w, h = face
+    roi = gray[y:y + int(h * EYE_REGION), x:x + w]
+    min_size = max(1, w // 8)
+    return eye_cascade.detectMultiScale(roi, minSize=(min_size, min_size))
@@ -0,0 +1,202 @@
+import collections
+import logging
+import threading
+import time
+
+import cv2
+
+logger = logging.getLogger("FramePipeline")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class DropOldestQueue:
+    """Bounded queue that discards its oldest item instead of blocking the producer."""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None if nothing arrived within `timeout`."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class RateMeter:
+    """Counts ticks over a sliding window and reports the rate per second."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.total = 0
+        self._ticks = collections.deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.time()
+        with self._lock:
+            self.total += 1
+            self._ticks.append(now)
+            self._trim(now)
+
+    def rate(self):
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            return len(self._ticks) / self.window
+
+    def _trim(self, now):
+        while self._ticks and now - self._ticks[0] > self.window:
+            self._ticks.popleft()
+
+
+class FramePipeline:
+    """
+    Three-stage video pipeline: the camera broker's capture thread reads frames at
+    camera rate, an inference worker analyzes the newest available frame, and each
+    stream consumer encodes frames with the latest analysis overlay drawn on top.
+
+    Stages are connected by DropOldestQueue instances so a slow stage never stalls
+    the one before it; it simply sees fewer, fresher frames. `start` and `stop` may
+    be called from any thread; at most one inference worker and camera subscription
+    exist at a time, and the worker gives the subscription back when capture stops.
+    """
+
+    def __init__(self, analyze, draw_overlay, broker, inference_fps=None,
+                 stream_fps=None, stream_queue_size=2, jpeg_quality=80):
+        self.analyze = analyze
+        self.draw_overlay = draw_overlay
+        self.broker = broker
+        self.inference_fps = inference_fps
+        self.stream_fps = stream_fps
+        self.stream_queue_size = stream_queue_size
+        self.jpeg_quality = jpeg_quality
+        self.inference_subscription = None
+        self.stream_subscriptions = []
+        self.latest_overlay = None
+        self.inference_meter = RateMeter()
+        self.encode_meter = RateMeter()
+        self.running = False
+        self.inference_thread = None
+        self._lock = threading.Lock()
+        self._lifecycle_lock = threading.Lock()  # Serializes start/stop and the worker's exit
+        self._dropped_closed_streams = 0
+
+    def start(self):
+        with self._lifecycle_lock:
+            if self.running:
+                return True
+            subscription = self.broker.subscribe("mtcnn", max_fps=self.inference_fps)
+            if not self.broker.running:
+                subscription.close()
+                return False
+            self.inference_subscription = subscription
+            self.running = True
+            self.inference_thread = threading.Thread(target=self._inference_loop, args=(subscription,),
+                                                     daemon=True)
+            self.inference_thread.start()
+        logger.info("Frame pipeline started.")
+        return True
+
+    def stop(self):
+        with self._lifecycle_lock:
+            self.running = False
+            thread, self.inference_thread = self.inference_thread, None
+            subscription, self.inference_subscription = self.inference_subscription, None
+        # Joined outside the lock, which the worker takes on its way out.
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        if subscription is not None:
+            subscription.close()
+        logger.info("Frame pipeline stopped.")
+
+    def _inference_loop(self, subscription):
+        while self.running and subscription.active:
+            item = subscription.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, _ = item
+            try:
+                self.latest_overlay = self.analyze(frame)
+            except Exception as e:
+                logger.error("Error analyzing frame: %s", e)
+            self.inference_meter.tick()
+        with self._lifecycle_lock:
+            # Unless stop() or a later start() took over already.
+            if self.inference_subscription is subscription:
+                self.inference_subscription = None
+                self.inference_thread = None
+                self.running = False
+        # Capture may have stopped on a read failure; the broker only releases the camera once unused.
+        subscription.close()
+
+    def mjpeg_frames(self):
+        """Encoder stage: yields multipart JPEG chunks for one stream consumer."""
+        subscription = self.broker.subscribe("mjpeg", max_fps=self.stream_fps,
+                                             queue_size=self.stream_queue_size)
+        with self._lock:
+            self.stream_subscriptions.append(subscription)
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        try:
+            while self.running and subscription.active:
+                item = subscription.get(timeout=0.5)
+                if item is None:
+                    continue
+                frame, _ = item
+                overlay = self.latest_overlay
+                if overlay is not None:
+                    frame = frame.copy()
+                    self.draw_overlay(frame, overlay)
+                ret, buffer = cv2.imencode('.jpg', frame, params)
+                if not ret:
+                    continue
+                self.encode_meter.tick()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        finally:
+            with self._lock:
+                self.stream_subscriptions.remove(subscription)
+                self._dropped_closed_streams += subscription.queue.dropped
+            subscription.close()
+
+    def get_stats(self):
+        broker_stats = self.broker.get_stats()
+        with self._lock:
+            stream_dropped = self._dropped_closed_streams + sum(s.queue.dropped for s in self.stream_subscriptions)
+            streams = len(self.stream_subscriptions)
+        inference_subscription = self.inference_subscription
+        return {
+            "running": self.running,
+            "capture_fps": broker_stats["capture_fps"],
+            "inference_fps": round(self.inference_meter.rate(), 2),
+            "encode_fps": round(self.encode_meter.rate(), 2),
+            "frames_captured": broker_stats["frames_captured"],
+            "frames_inferred": self.inference_meter.total,
+            "frames_encoded": self.encode_meter.total,
+            "inference_dropped": inference_subscription.queue.dropped if inference_subscription else 0,
+            "stream_dropped": stream_dropped,
+            "active_streams": streams,
+            "broker": broker_stats
+        }
@@ -0,0 +1,242 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")  # Render off-screen; never start a GUI event loop in the server.
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+
+logger = logging.getLogger("GraphRenderer")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of `threshold`
+    points (first and last always kept) that preserve the visual shape of the series.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+        else:
+            next_lo, next_hi = n - 1, n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+class _Series:
+    """
+    Timestamps and values read so far from one log, extended as the log grows. Past
+    the renderer's `max_series_points`, older points are folded into an LTTB-downsampled
+    prefix so a long exam costs a bounded amount of memory per log.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self.last_seq = 0
+        self.times = np.empty(0)
+        self.values = np.empty(0)
+        self.total_points = 0  # Timestamped events read, including those compacted away
+        self.has_values = False
+
+
+class GraphRenderer:
+    """
+    Serves /graph/<event_type> PNGs and their JSON series from memory. Each log keeps
+    the (timestamp, value) arrays already read from it and only reads events appended
+    since, for the `max_series` most recently graphed logs; each keeps its newest
+    `max_series_points` points exactly and at most as many downsampled ones before
+    them. PNGs are cached by (event_type, log generation, last seq) so repeated requests
+    for an unchanged log never touch matplotlib. Series longer than `max_points` are
+    downsampled with LTTB before plotting.
+    """
+
+    def __init__(self, max_points=2000, max_entries=32, value_field="risk", default_value=1, max_series=256,
+                 max_series_points=20000):
+        self.max_points = max_points
+        self.max_entries = max_entries
+        self.max_series = max_series
+        self.max_series_points = max_series_points
+        self.value_field = value_field
+        self.default_value = default_value
+        self._series = OrderedDict()
+        self._png_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, event_type, log):
+        # A reset replaces the log and restarts seq at 1, under a new generation.
+        return event_type, log.generation, log.last_seq
+
+    def _read_new(self, series):
+        """Append timestamps/values of events newer than series.last_seq."""
+        log = series.log
+        stop = log.last_seq
+        if stop <= series.last_seq:
+            return
+        times, values = [], []
+        value_in_schema = self.value_field in log.schema
+        time_bit = 1 << log.fields.index("timestamp")
+        value_bit = 1 << log.fields.index(self.value_field) if value_in_schema else 0
+        for rows, strings in log.segments(series.last_seq + 1, stop):
+            mask = rows["mask"]
+            if value_in_schema:
+                present = (mask & value_bit) != 0
+                value = np.where(present, rows[self.value_field], self.default_value).astype(float)
+                series.has_values |= bool(present.any())
+            else:
+                # Values outside the schema live in the per-event JSON.
+                value = np.full(len(rows), float(self.default_value))
+                for i in np.flatnonzero(rows["extra"] >= 0):
+                    extra = json.loads(strings[rows["extra"][i]])
+                    if self.value_field in extra:
+                        value[i] = extra[self.value_field]
+                        series.has_values = True
+            timed = (mask & time_bit) != 0
+            times.append(rows["timestamp"][timed])
+            values.append(value[timed])
+        series.times = np.concatenate([series.times] + times)
+        series.values = np.concatenate([series.values] + values)
+        series.last_seq = stop
+        series.total_points += sum(map(len, times))
+        if len(series.times) > 2 * self.max_series_points:
+            self._compact(series)
+
+    def _compact(self, series):
+        """Downsample all but the newest max_series_points points to max_series_points."""
+        split = len(series.times) - self.max_series_points
+        # LTTB keeps both ends, so the prefix still joins up with the exact tail.
+        keep = lttb(series.times[:split + 1], series.values[:split + 1], self.max_series_points)
+        series.times = np.concatenate([series.times[keep[:-1]], series.times[split:]])
+        series.values = np.concatenate([series.values[keep[:-1]], series.values[split:]])
+
+    def _current_series(self, event_type, log):
+        # Exam sessions each have their own log per event type.
+        key = (event_type, log.generation)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or series.log is not log:
+                series = _Series(log)
+                self._series[key] = series
+                while len(self._series) > self.max_series:
+                    self._series.popitem(last=False)
+            else:
+                self._series.move_to_end(key)
+        with self._render_lock:
+            self._read_new(series)
+        return series
+
+    def series(self, event_type, log, max_points=None):
+        """JSON-ready series for client-side charts, downsampled to at most max_points."""
+        series = self._current_series(event_type, log)
+        times, values = series.times, series.values
+        limit = max_points or self.max_points
+        if len(times) > limit:
+            keep = lttb(times, values, limit)
+            times, values = times[keep], values[keep]
+        return {
+            "event_type": event_type,
+            "last_seq": series.last_seq,
+            "total_points": series.total_points,
+            "points": len(times),
+            "downsampled": len(times) < series.total_points,
+            "y_label": 'Risk Value' if series.has_values else 'Event Count',
+            "timestamps": times.tolist(),
+            "values": values.tolist()
+        }
+
+    def render_png(self, event_type, log):
+        """PNG bytes for the event type's graph, or None if it has no timestamped events."""
+        key = self.cache_key(event_type, log)
+        with self._lock:
+            png = self._png_cache.get(key)
+            if png is not None:
+                self._png_cache.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+        series = self._current_series(event_type, log)
+        if not len(series.times):
+            return None
+        with self._render_lock:
+            # Another request may have rendered this key while we waited.
+            with self._lock:
+                if key in self._png_cache:
+                    return self._png_cache[key]
+            png = self._render(event_type, series)
+        with self._lock:
+            self._png_cache[key] = png
+            while len(self._png_cache) > self.max_entries:
+                self._png_cache.popitem(last=False)
+        return png
+
+    def _render(self, event_type, series):
+        times, values = series.times, series.values
+        if len(times) > self.max_points:
+            keep = lttb(times, values, self.max_points)
+            times, values = times[keep], values[keep]
+        # A bare Figure keeps no pyplot global state, so nothing has to be closed.
+        fig = Figure(figsize=(8, 4))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.plot(times, values, marker='o', linestyle='-', color='cyan')
+        ax.set_xlabel('Timestamp')
+        ax.set_ylabel('Risk Value' if series.has_values else 'Event Count')
+        ax.set_title(f'{event_type.capitalize()} Events Graph')
+        ax.grid(True)
+        fig.tight_layout()
+        buf = BytesIO()
+        fig.savefig(buf, format='png')
+        return buf.getvalue()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "cached_pngs": len(self._png_cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "series": len(self._series),
+                "series_points": sum(len(s.times) for s in self._series.values())
+            }
+
+
+if __name__ == '__main__':
+    import time
+    from event_log import EventLog
+
+    log = EventLog({"timestamp": "float", "risk": "int"})
+    for i in range(200000):
+        log.append({"timestamp": 1700000000 + i * 0.01, "risk": (i // 1000) % 7})
+    renderer = GraphRenderer()
+    for attempt in ("cold", "cached"):
+        start = time.perf_counter()
+        png = renderer.render_png("demo", log)
+        print(f"{attempt}: {len(png)} bytes in {time.perf_counter() - start:.3f}s")
+    log.append({"timestamp": 1700002000.0, "risk": 50})
+    start = time.perf_counter()
+    renderer.render_png("demo", log)
+    print(f"after one new event: {time.perf_counter() - start:.3f}s")
+    print(renderer.get_stats())
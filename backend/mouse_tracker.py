@@ -1,17 +1,72 @@
 import time
 import math
 import logging
-from pynput import mouse
+import threading
+import numpy as np
+from event_log import EventLog
+
+class PynputMouseSource:
+    """Global mouse hook via pynput (the default MouseBehaviorTracker source)."""
+
+    def __init__(self):
+        self.listener = None
+
+    def start(self, on_move, on_click, on_scroll):
+        # Imported here so batch processing and replay can run headless without an input backend.
+        from pynput import mouse
+        # Newer pynput versions pass an extra `injected` flag; the tracker doesn't use it.
+        self.listener = mouse.Listener(
+            on_move=lambda x, y, *_: on_move(x, y),
+            on_click=lambda x, y, button, pressed, *_: on_click(x, y, button, pressed),
+            on_scroll=lambda x, y, dx, dy, *_: on_scroll(x, y, dx, dy)
+        )
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
 
 class MouseBehaviorTracker:
-    def __init__(self, speed_threshold=1500, angle_threshold=90, callback=None):
+    """
+    Flags high-speed movement and abrupt direction changes from mouse samples.
+
+    By default every move sample is checked as it arrives and each detection is its
+    own event. With `batch_interval_ms` set, on_move only stores (t, x, y) into a
+    preallocated buffer; a flush thread computes speed, acceleration, jerk and angular
+    change for the whole batch with NumPy every `batch_interval_ms` and emits at most
+    one "High speed burst" and one "Abrupt direction change burst" event per batch.
+    Both modes flag exactly the same samples.
+
+    Samples come from `source` (pynput by default), or are pushed by calling on_move,
+    on_click and on_scroll directly with an explicit `timestamp`, as trace replay does.
+    """
+
+    def __init__(self, speed_threshold=1500, angle_threshold=90, callback=None,
+                 batch_interval_ms=None, buffer_size=4096, source=None):
         self.speed_threshold = speed_threshold
         self.angle_threshold = angle_threshold
         self.callback = callback
-        self.event_log = []
+        self.source = source if source is not None else PynputMouseSource()
+        self.event_log = EventLog(schema={
+            "timestamp": "float", "event": "str", "speed": "float", "angle_diff": "float",
+            "dx": "int", "dy": "int", "position": "xy", "samples": "int", "duration": "float",
+            "mean_speed": "float", "max_acceleration": "float", "max_jerk": "float"
+        })
         self.prev_time = None
         self.prev_pos = None
         self.prev_direction = None
+
+        # Batch mode: on_move fills one buffer while the flush thread drains the other.
+        self.batch_interval_ms = batch_interval_ms
+        self.buffer_size = buffer_size
+        self._buffers = [np.empty((buffer_size, 3)), np.empty((buffer_size, 3))]
+        self._active = 0
+        self._count = 0
+        self.samples_dropped = 0
+        self._buffer_cond = threading.Condition()
+        self.flushing = False
+        self.flush_thread = None
         self.logger = logging.getLogger("MouseBehaviorTracker")
         self.logger.setLevel(logging.DEBUG)
         if not self.logger.handlers:
@@ -20,8 +75,16 @@ class MouseBehaviorTracker:
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
 
-    def on_move(self, x, y):
-        current_time = time.time()
+    def on_move(self, x, y, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        if self.batch_interval_ms is not None:
+            self._buffer_sample(timestamp, x, y)
+        else:
+            self._handle_move(timestamp, x, y)
+
+    def _handle_move(self, current_time, x, y):
+        """Per-sample detection (the default mode)."""
         if self.prev_pos is not None:
             dt = current_time - self.prev_time
             dx = x - self.prev_pos[0]
@@ -61,9 +124,147 @@ class MouseBehaviorTracker:
         self.prev_time = current_time
         self.prev_pos = (x, y)
 
-    def on_click(self, x, y, button, pressed):
+    def _buffer_sample(self, t, x, y):
+        with self._buffer_cond:
+            if self._count == self.buffer_size:
+                # Flush thread is behind; wake it and drop this sample.
+                self.samples_dropped += 1
+                self._buffer_cond.notify()
+                return
+            self._buffers[self._active][self._count] = (t, x, y)
+            self._count += 1
+            if self._count == self.buffer_size:
+                self._buffer_cond.notify()
+
+    def _swap_buffers(self):
+        with self._buffer_cond:
+            samples = self._buffers[self._active][:self._count]
+            self._active ^= 1
+            self._count = 0
+        return samples
+
+    def _flush_loop(self):
+        interval = self.batch_interval_ms / 1000.0
+        while self.flushing:
+            with self._buffer_cond:
+                if self._count < self.buffer_size:
+                    self._buffer_cond.wait(interval)
+            self.flush()
+
+    def flush(self):
+        """Process all buffered samples now."""
+        samples = self._swap_buffers()
+        if len(samples):
+            self.process_batch(samples)
+
+    def compute_kinematics(self, samples):
+        """
+        Vectorized equivalent of _handle_move over an (n, 3) array of (t, x, y) rows,
+        continuing from (and then updating) the tracker's previous sample and direction.
+        Returns per-sample arrays for the samples that had a predecessor.
+        """
+        if self.prev_pos is None:
+            self.prev_time = float(samples[0, 0])
+            self.prev_pos = (samples[0, 1], samples[0, 2])
+            samples = samples[1:]
+        t, x, y = samples[:, 0], samples[:, 1], samples[:, 2]
+        # Steps from each sample's predecessor, the first one being the carried sample.
+        steps = np.empty_like(samples)
+        steps[:1] = samples[:1] - (self.prev_time, self.prev_pos[0], self.prev_pos[1])
+        np.subtract(samples[1:], samples[:-1], out=steps[1:])
+        dt, dx, dy = steps[:, 0], steps[:, 1], steps[:, 2]
+        distance = np.sqrt(dx * dx + dy * dy)
+
+        moving = dt > 0
+        speed = np.zeros_like(distance)
+        np.divide(distance, dt, out=speed, where=moving)
+        high_speed = moving & (speed > self.speed_threshold)
+
+        # Acceleration and jerk between consecutive samples of this batch.
+        acceleration = np.zeros_like(speed)
+        np.divide(speed[1:] - speed[:-1], dt[1:], out=acceleration[1:], where=moving[1:])
+        jerk = np.zeros_like(speed)
+        np.divide(acceleration[1:] - acceleration[:-1], dt[1:], out=jerk[1:], where=moving[1:])
+
+        # Direction of each step; zero-length steps have none and keep the last one.
+        has_direction = distance > 0
+        direction = np.full_like(distance, np.nan)
+        direction[has_direction] = np.degrees(np.arctan2(dy[has_direction], dx[has_direction]))
+        directions = np.concatenate(([np.nan if self.prev_direction is None else self.prev_direction], direction))
+        valid = np.concatenate(([self.prev_direction is not None], has_direction))
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), -1))
+        previous = last_valid[:-1]
+        previous_direction = np.where(previous >= 0, directions[np.maximum(previous, 0)], np.nan)
+        angle_diff = np.abs(direction - previous_direction)
+        angle_diff = np.where(angle_diff > 180, 360 - angle_diff, angle_diff)
+        comparable = has_direction & ~np.isnan(previous_direction)
+        abrupt = comparable.copy()
+        abrupt[comparable] = angle_diff[comparable] > self.angle_threshold
+
+        # NumPy's vectorized arctan2 can differ from math.atan2 in the last bit, which
+        # only matters for angles sitting on the threshold (e.g. exactly perpendicular
+        # steps). Redo those few with the same scalar math as _handle_move.
+        for i in np.flatnonzero(comparable & (np.abs(angle_diff - self.angle_threshold) < 1e-9)):
+            j = previous[i]
+            prev_angle = (self.prev_direction if j == 0
+                          else math.degrees(math.atan2(dy[j - 1], dx[j - 1])))
+            diff = abs(math.degrees(math.atan2(dy[i], dx[i])) - prev_angle)
+            if diff > 180:
+                diff = 360 - diff
+            angle_diff[i] = diff
+            abrupt[i] = diff > self.angle_threshold
+
+        if len(t):
+            self.prev_time = float(t[-1])
+            self.prev_pos = (x[-1], y[-1])
+            if last_valid[-1] > 0:
+                j = last_valid[-1] - 1
+                self.prev_direction = math.degrees(math.atan2(dy[j], dx[j]))
+        return {
+            "t": t, "x": x, "y": y, "speed": speed, "acceleration": acceleration, "jerk": jerk,
+            "angle_diff": angle_diff, "high_speed": high_speed, "abrupt": abrupt
+        }
+
+    def process_batch(self, samples):
+        """Run kinematics over a batch and emit one burst event per detection type."""
+        k = self.compute_kinematics(samples)
+        events = []
+        if k["high_speed"].any():
+            idx = np.flatnonzero(k["high_speed"])
+            peak = idx[np.argmax(k["speed"][idx])]
+            events.append({
+                "timestamp": float(k["t"][idx[0]]),
+                "event": "High speed burst",
+                "samples": int(len(idx)),
+                "duration": float(k["t"][idx[-1]] - k["t"][idx[0]]),
+                "speed": float(k["speed"][peak]),
+                "mean_speed": float(k["speed"][idx].mean()),
+                "max_acceleration": float(np.abs(k["acceleration"][idx]).max()),
+                "max_jerk": float(np.abs(k["jerk"][idx]).max()),
+                "position": (int(k["x"][peak]), int(k["y"][peak]))
+            })
+        if k["abrupt"].any():
+            idx = np.flatnonzero(k["abrupt"])
+            peak = idx[np.argmax(k["angle_diff"][idx])]
+            events.append({
+                "timestamp": float(k["t"][idx[0]]),
+                "event": "Abrupt direction change burst",
+                "samples": int(len(idx)),
+                "duration": float(k["t"][idx[-1]] - k["t"][idx[0]]),
+                "angle_diff": float(k["angle_diff"][peak]),
+                "position": (int(k["x"][peak]), int(k["y"][peak]))
+            })
+        for event in events:
+            self.event_log.append(event)
+            self.logger.warning("%s: %d samples, peak %.2f", event["event"], event["samples"],
+                                event.get("speed", event.get("angle_diff")))
+            if self.callback:
+                self.callback(event)
+        return k
+
+    def on_click(self, x, y, button, pressed, timestamp=None):
         if pressed:
-            current_time = time.time()
+            current_time = timestamp if timestamp is not None else time.time()
             event = {
                 "timestamp": current_time,
                 "event": f"Mouse click {button}",
@@ -74,8 +275,8 @@ class MouseBehaviorTracker:
             if self.callback:
                 self.callback(event)
 
-    def on_scroll(self, x, y, dx, dy):
-        current_time = time.time()
+    def on_scroll(self, x, y, dx, dy, timestamp=None):
+        current_time = timestamp if timestamp is not None else time.time()
         event = {
             "timestamp": current_time,
             "event": "Mouse scroll",
@@ -88,17 +289,27 @@ class MouseBehaviorTracker:
         if self.callback:
             self.callback(event)
 
+    def start_flushing(self):
+        """Start the batch flush thread (batch mode only); start() does this before the source."""
+        if self.batch_interval_ms is not None and self.flush_thread is None:
+            self.flushing = True
+            self.flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flush_thread.start()
+
     def start(self):
-        self.listener = mouse.Listener(
-            on_move=self.on_move,
-            on_click=self.on_click,
-            on_scroll=self.on_scroll
-        )
-        self.listener.start()
+        self.start_flushing()
+        self.source.start(self.on_move, self.on_click, self.on_scroll)
         self.logger.info("MouseBehaviorTracker started.")
 
     def stop(self):
-        self.listener.stop()
+        self.source.stop()
+        if self.flush_thread is not None:
+            self.flushing = False
+            with self._buffer_cond:
+                self._buffer_cond.notify()
+            self.flush_thread.join()
+            self.flush_thread = None
+            self.flush()
         self.logger.info("MouseBehaviorTracker stopped.")
 
 if __name__ == '__main__':
@@ -1,14 +1,51 @@
 import time
 import threading
 import logging
-import wmi
-import win32api
-import pythoncom
+from event_log import EventLog
+
+class WmiPeripheralSource:
+    """
+    Plug-and-play arrivals from WMI and the monitor count from the Win32 API (the
+    default PeripheralDetector source). open/next_device/close run on the PnP thread,
+    which owns the COM apartment.
+    """
+
+    def __init__(self):
+        self.watcher = None
+
+    def open(self):
+        import pythoncom
+        import wmi
+        # Initialize COM for this thread.
+        pythoncom.CoInitialize()
+        self.watcher = wmi.WMI().watch_for(notification_type="Creation", wmi_class="Win32_PnPEntity")
+
+    def next_device(self, timeout_ms=5000):
+        """Caption of the next newly connected device, or None if none arrived in time."""
+        import wmi
+        try:
+            event = self.watcher(timeout_ms=timeout_ms)
+        except wmi.x_wmi_timed_out:
+            return None
+        return event.Caption if event else None
+
+    def close(self):
+        import pythoncom
+        self.watcher = None
+        pythoncom.CoUninitialize()
+
+    def monitor_count(self):
+        import win32api
+        return len(win32api.EnumDisplayMonitors())
 
 class PeripheralDetector:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, source=None):
         self.callback = callback  # Callback function when an event is detected
-        self.event_log = []       # List to store peripheral events
+        # Anything with open/next_device/close/monitor_count; see trace_replay for recorded sessions.
+        self.source = source if source is not None else WmiPeripheralSource()
+        self.event_log = EventLog(schema={  # Sequence-numbered peripheral events
+            "timestamp": "float", "device": "str", "risk": "int"
+        })
         self.running = False
         self.risk_score = 0       # Cumulative risk score for peripheral detection
         self.last_monitor_count = 0  # Track previous monitor count
@@ -20,52 +57,53 @@ class PeripheralDetector:
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
 
+    def observe_device(self, caption, timestamp):
+        """Record a newly connected device seen at `timestamp`."""
+        risk_inc = 35
+        self.risk_score += risk_inc
+        log_entry = {
+            "timestamp": timestamp,
+            "device": caption,
+            "risk": risk_inc
+        }
+        self.event_log.append(log_entry)
+        self.logger.info("New peripheral detected: %s; risk increased by %d", caption, risk_inc)
+        if self.callback:
+            self.callback(log_entry)
+
+    def observe_monitors(self, count, timestamp):
+        """Process the number of connected monitors as counted at `timestamp`."""
+        if count != self.last_monitor_count:
+            if count > 1:
+                risk_inc = 35
+                self.risk_score += risk_inc
+                log_entry = {
+                    "timestamp": timestamp,
+                    "device": f"Multiple monitors detected: {count}",
+                    "risk": risk_inc
+                }
+                self.event_log.append(log_entry)
+                self.logger.info("Multiple monitors detected (%d monitors); risk increased by %d", count, risk_inc)
+                if self.callback:
+                    self.callback(log_entry)
+            self.last_monitor_count = count
+
     def monitor_pnp(self):
-        # Initialize COM for this thread.
-        pythoncom.CoInitialize()
-        c = wmi.WMI()
-        watcher = c.watch_for(notification_type="Creation", wmi_class="Win32_PnPEntity")
+        self.source.open()
         while self.running:
             try:
-                event = watcher(timeout_ms=5000)
-                if event:
-                    risk_inc = 35
-                    self.risk_score += risk_inc
-                    log_entry = {
-                        "timestamp": time.time(),
-                        "device": event.Caption,
-                        "risk": risk_inc
-                    }
-                    self.event_log.append(log_entry)
-                    self.logger.info("New peripheral detected: %s; risk increased by %d", event.Caption, risk_inc)
-                    if self.callback:
-                        self.callback(log_entry)
-            except wmi.x_wmi_timed_out:
-                continue
+                caption = self.source.next_device(timeout_ms=5000)
+                if caption is not None:
+                    self.observe_device(caption, time.time())
             except Exception as e:
                 self.logger.error("Error in monitor_pnp: %s", e)
                 time.sleep(1)
-        pythoncom.CoUninitialize()
+        self.source.close()
 
     def monitor_monitors(self):
         while self.running:
             try:
-                monitors = win32api.EnumDisplayMonitors()
-                count = len(monitors)
-                if count != self.last_monitor_count:
-                    if count > 1:
-                        risk_inc = 35
-                        self.risk_score += risk_inc
-                        log_entry = {
-                            "timestamp": time.time(),
-                            "device": f"Multiple monitors detected: {count}",
-                            "risk": risk_inc
-                        }
-                        self.event_log.append(log_entry)
-                        self.logger.info("Multiple monitors detected (%d monitors); risk increased by %d", count, risk_inc)
-                        if self.callback:
-                            self.callback(log_entry)
-                    self.last_monitor_count = count
+                self.observe_monitors(self.source.monitor_count(), time.time())
             except Exception as e:
                 self.logger.error("Error checking monitors: %s", e)
             time.sleep(5)
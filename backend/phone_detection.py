@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+
+EDGE_DENSITY_THRESHOLD = 0.1
+AREA_RATIO_THRESHOLD = 0.15
+
+
+def phone_regions(face, frame_shape, grid=None):
+    """
+    Candidate phone regions around `face` as an (N, 4) array of (y1, y2, x1, x2),
+    clipped to the frame, empty regions dropped. The first four are the fixed
+    regions (around, below, left of and right of the face); `grid=(cols, rows)`
+    adds a sliding grid of half-overlapping windows over the whole search area
+    they span.
+    """
+    x, y, w, h = (int(v) for v in face)
+    height, width = frame_shape[:2]
+    regions = [
+        # 1. Near the face (holding phone to ear)
+        (y - 100, y + h + 100, x - 100, x + w + 100),
+        # 2. Below the face (looking down at phone)
+        (y + h, y + h + 200, x - 150, x + w + 150),
+        # 3. Left side of face (phone in left hand)
+        (y - 100, y + h + 100, x - 200, x - 50),
+        # 4. Right side of face (phone in right hand)
+        (y - 100, y + h + 100, x + w + 50, x + w + 200)
+    ]
+    if grid is not None:
+        cols, rows = grid
+        top, bottom, left, right = y - 100, y + h + 200, x - 200, x + w + 200
+        # cols windows at half-window stride cover the span exactly: span = (cols + 1) * win / 2
+        win_w = 2 * (right - left) // (cols + 1)
+        win_h = 2 * (bottom - top) // (rows + 1)
+        for row in range(rows):
+            for col in range(cols):
+                y1 = top + row * win_h // 2
+                x1 = left + col * win_w // 2
+                regions.append((y1, y1 + win_h, x1, x1 + win_w))
+    regions = np.array(regions, dtype=np.int64)
+    regions[:, 0:2] = np.clip(regions[:, 0:2], 0, height)
+    regions[:, 2:4] = np.clip(regions[:, 2:4], 0, width)
+    keep = (regions[:, 1] > regions[:, 0]) & (regions[:, 3] > regions[:, 2])
+    return regions[keep]
+
+
+def score_regions(gray, regions):
+    """
+    Edge density and largest-contour area ratio for every region in one pass.
+
+    The adaptive threshold and Canny edges are computed once over the bounding box
+    of all regions instead of once per region. Edge density comes from a
+    summed-area table of the edge map, so each region costs four lookups however
+    many regions overlap. A region's area ratio is the largest external
+    contourArea in the threshold map clipped to that region, as when each region
+    was thresholded on its own: the contours there are those of each threshold
+    blob's mask clipped to the region. Only blobs whose bounding box, clipped to
+    the region, could reach AREA_RATIO_THRESHOLD are traced, so ratios below the
+    threshold may read as 0. Returns (edge_density, area_ratio) arrays aligned
+    with `regions`.
+    """
+    if len(regions) == 0:
+        return np.empty(0), np.empty(0)
+    top, bottom = regions[:, 0].min(), regions[:, 1].max()
+    left, right = regions[:, 2].min(), regions[:, 3].max()
+    area = gray[top:bottom, left:right]
+    local = regions - np.array([top, top, left, left])
+    y1, y2, x1, x2 = local.T
+    sizes = (y2 - y1) * (x2 - x1)
+
+    edges = cv2.Canny(area, 30, 100)
+    table = cv2.integral((edges > 0).view(np.uint8))
+    edge_counts = table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+    edge_density = edge_counts / (sizes + 1e-6)
+
+    thresh = cv2.adaptiveThreshold(area, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY_INV, 7, 2)
+    # Bounding boxes of every 8-connected blob come out of one C call. A blob clipped to
+    # a region may split into pieces, but none has a contour bigger than the blob's box
+    # clipped to the region, so only blobs overlapping a region enough are traced there.
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    bx, by = stats[1:, cv2.CC_STAT_LEFT], stats[1:, cv2.CC_STAT_TOP]
+    bw, bh = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    big = np.flatnonzero(bw * bh > AREA_RATIO_THRESHOLD * sizes.min())
+    area_ratio = np.zeros(len(regions))
+    if len(big):
+        cx1, cy1 = bx[big], by[big]
+        cx2, cy2 = cx1 + bw[big], cy1 + bh[big]
+        overlap_w = np.minimum(cx2[None, :], x2[:, None]) - np.maximum(cx1[None, :], x1[:, None])
+        overlap_h = np.minimum(cy2[None, :], y2[:, None]) - np.maximum(cy1[None, :], y1[:, None])
+        overlap = np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)
+        for r, j in zip(*np.nonzero(overlap > AREA_RATIO_THRESHOLD * sizes[:, None])):
+            top_, bottom_ = max(y1[r], cy1[j]), min(y2[r], cy2[j])
+            left_, right_ = max(x1[r], cx1[j]), min(x2[r], cx2[j])
+            blob = labels[top_:bottom_, left_:right_] == big[j] + 1
+            contours, _ = cv2.findContours(blob.view(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if contours:
+                area_ratio[r] = max(area_ratio[r], max(cv2.contourArea(c) for c in contours) / sizes[r])
+    return edge_density, area_ratio
@@ -0,0 +1,190 @@
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Every tracker whose events count toward a session's risk, in /api/risk order.
+RISK_TRACKERS = ("mouse", "window", "copy", "peripheral", "face", "voice", "camera", "suspicious_activity")
+
+# Risk of events whose tracker doesn't score them (no "risk" field).
+VOICE_RISK_PER_10SEC = 5  # Per 10 seconds of speech, at least once per segment
+CAMERA_EVENT_RISK = 25  # Times the detection's confidence
+SUSPICIOUS_ACTIVITY_RISK = 5  # Per scoring pass the cheating model flags
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _score(value):
+    """Whole scores as ints, like the trackers' own, others to 0.1."""
+    value = round(value, 1)
+    return int(value) if value.is_integer() else value
+
+
+def _event_time(timestamp):
+    """Unix time of an event's timestamp: a number, or an ISO string (older camera and suspicious-activity logs)."""
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            return None
+    return _number(timestamp)
+
+
+def event_risk(tracker, event):
+    """Unweighted risk of one logged event of `tracker`."""
+    risk = _number(event.get("risk"))
+    if risk is not None:
+        return risk
+    if tracker == "voice":
+        duration = _number(event.get("duration"))  # Only on "Voice segment ended"
+        return VOICE_RISK_PER_10SEC * max(1, int(duration // 10)) if duration is not None else 0.0
+    if tracker == "camera":
+        confidence = _number(event.get("confidence"))
+        return CAMERA_EVENT_RISK * (confidence if confidence is not None else 1.0)
+    if tracker == "suspicious_activity":
+        return float(SUSPICIOUS_ACTIVITY_RISK)
+    return 0.0
+
+
+class _TrackerRisk:
+    """One tracker's (or the aggregate's) running total, decayed score and rolling-window sum."""
+
+    __slots__ = ("total", "decayed", "decayed_at", "recent", "window", "status")
+
+    def __init__(self):
+        self.total = 0.0
+        self.decayed = 0.0  # As of decayed_at
+        self.decayed_at = None
+        self.recent = 0.0  # Sum of `window`
+        self.window = deque()  # (timestamp, weighted risk) in the rolling window
+        self.status = None
+
+    def add(self, risk, timestamp, decay_rate):
+        self.total += risk
+        if self.decayed_at is None or timestamp >= self.decayed_at:
+            elapsed = timestamp - self.decayed_at if self.decayed_at is not None else 0.0
+            self.decayed = self.decayed * math.exp(-decay_rate * elapsed) + risk
+            self.decayed_at = timestamp
+        else:
+            # An event older than the last one: decay it to decayed_at instead.
+            self.decayed += risk * math.exp(-decay_rate * (self.decayed_at - timestamp))
+
+    def add_recent(self, risk, timestamp):
+        self.window.append((timestamp, risk))
+        self.recent += risk
+
+    def evict(self, cutoff):
+        window = self.window
+        while window and window[0][0] < cutoff:
+            self.recent -= window.popleft()[1]
+        if not window:
+            self.recent = 0.0  # No float residue once the window is empty
+
+    def decayed_to(self, now, decay_rate):
+        if self.decayed_at is None:
+            return 0.0
+        return self.decayed * math.exp(-decay_rate * max(now - self.decayed_at, 0.0))
+
+
+class RiskLedger:
+    """
+    One session's risk, kept up to date incrementally as trackers post risk deltas:
+    per tracker and in aggregate, the running total, a score decaying exponentially
+    with `half_life` seconds, and the sum over the last `window_seconds`. Each delta
+    is multiplied by its tracker's weight (1 unless given in `weights`). Posting is
+    O(1) amortized (every delta enters and leaves the rolling window once), and
+    `snapshot` reads every tracker and the aggregate under the same lock as posts,
+    so a snapshot never mixes scores from before and after a concurrent post.
+
+    `classify(score)`, if given, labels each tracker's and the aggregate total,
+    e.g. "Safe" / "Warning-1"; labels are updated on post, not on every read.
+    Trackers post through their EventLogs (EventLog.attach_ledger), with the risk
+    of each event from `event_risk`.
+    """
+
+    def __init__(self, trackers=RISK_TRACKERS, weights=None, half_life=300.0, window_seconds=60.0,
+                 classify=None, clock=time.time):
+        self.weights = {tracker: 1.0 for tracker in trackers}
+        self.weights.update(weights or {})
+        self.half_life = half_life
+        self.decay_rate = math.log(2) / half_life if half_life else 0.0
+        self.window_seconds = window_seconds
+        self.classify = classify
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every posted delta, e.g. before rebuilding the ledger from recovered logs."""
+        with self._lock:
+            self._trackers = {tracker: _TrackerRisk() for tracker in self.weights}
+            self._aggregate = _TrackerRisk()
+            self._window_end = None  # Newest timestamp in the rolling windows
+            self.posted = 0
+            if self.classify is not None:
+                for risk in (*self._trackers.values(), self._aggregate):
+                    risk.status = self.classify(0)
+
+    def post(self, tracker, risk, timestamp=None):
+        """Add `risk` (before weighting) for `tracker` at `timestamp` (Unix time, default now)."""
+        self.post_many(tracker, [(risk, timestamp)])
+
+    def post_events(self, tracker, events):
+        """Post the risk of each of `tracker`'s logged events, at the event's timestamp."""
+        self.post_many(tracker, [(event_risk(tracker, event), _event_time(event.get("timestamp")))
+                                 for event in events])
+
+    def post_many(self, tracker, deltas):
+        """Post (risk, timestamp) pairs for `tracker` in one go; timestamps may be None for now."""
+        weight = self.weights.get(tracker)
+        if weight is None:
+            raise KeyError(f"Unknown tracker {tracker!r}")
+        now = self.clock()
+        cutoff = now - self.window_seconds
+        with self._lock:
+            risk_of = self._trackers[tracker]
+            for risk, timestamp in deltas:
+                risk *= weight
+                if not risk:
+                    continue
+                timestamp = now if timestamp is None else min(timestamp, now)  # e.g. a fast agent clock
+                risk_of.add(risk, timestamp, self.decay_rate)
+                self._aggregate.add(risk, timestamp, self.decay_rate)
+                self.posted += 1
+                if timestamp >= cutoff:
+                    # Windows stay in time order for eviction: a late delta counts as of the newest one.
+                    if self._window_end is None or timestamp > self._window_end:
+                        self._window_end = timestamp
+                    risk_of.add_recent(risk, self._window_end)
+                    self._aggregate.add_recent(risk, self._window_end)
+            risk_of.evict(cutoff)
+            self._aggregate.evict(cutoff)
+            if self.classify is not None:
+                risk_of.status = self.classify(risk_of.total)
+                self._aggregate.status = self.classify(self._aggregate.total)
+
+    def snapshot(self, now=None):
+        """
+        Every tracker's and the aggregate's risk at `now` (default the clock's time):
+        {"totals": {tracker: total, ..., "aggregate": total}, "decayed": {...},
+        "recent": {...}, "status": {...} (with classify), "posted": deltas posted}.
+        Scores are rounded to 0.1.
+        """
+        now = self.clock() if now is None else now
+        cutoff = now - self.window_seconds
+        with self._lock:
+            scores = {**self._trackers, "aggregate": self._aggregate}
+            for risk in scores.values():
+                risk.evict(cutoff)
+            snapshot = {
+                "totals": {name: _score(risk.total) for name, risk in scores.items()},
+                "decayed": {name: _score(risk.decayed_to(now, self.decay_rate)) for name, risk in scores.items()},
+                "recent": {name: _score(risk.recent) for name, risk in scores.items()},
+                "posted": self.posted
+            }
+            if self.classify is not None:
+                snapshot["status"] = {name: risk.status for name, risk in scores.items()}
+        return snapshot
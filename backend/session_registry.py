@@ -0,0 +1,337 @@
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+
+from copy_tracker import CopyTracker
+from event_log import EventLog
+from face_detector import FaceSession
+from mouse_tracker import MouseBehaviorTracker
+from peripheral_detector import PeripheralDetector
+from risk_ledger import RiskLedger
+from window_tracker import WindowTracker
+
+logger = logging.getLogger("SessionRegistry")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+# The candidate at this machine, whose inputs, camera and microphone the process watches.
+DEFAULT_SESSION = "default"
+# Session IDs appear in URLs and export file names.
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+LOG_NAMES = ("mouse", "window", "copy", "peripheral", "face", "voice", "camera")
+
+
+def validate_session_id(session_id):
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"Invalid session ID {session_id!r}: use 1-64 letters, digits, '.', '_' or '-'")
+    return session_id
+
+
+class ExamSession:
+    """
+    Everything tracked for one candidate: the mouse, window, clipboard and peripheral
+    trackers, face risk scoring, voice/camera event logs and the pause state. Every
+    tracker event is passed to `callback(session_id, source, event)`.
+
+    `sources` maps "mouse" / "window" / "copy" / "peripheral" to the input source that
+    tracker reads when started; sessions fed from elsewhere never start them and push
+    observations into the trackers under `lock` instead (see event_ingest, which
+    tracks the agent's sequence numbers in `ingest_cursor` / `ingest_pending`).
+    `voice_log` and `camera_log` may be zero-argument callables, for logs owned by
+    lazily loaded detectors; otherwise the session creates its own on first use.
+    With `attach_journal` the session's logs, pause state and ingest cursor are
+    journaled, and whatever the journal recovered for the session is restored.
+    Every log the session creates posts its events' risk to `risk` (a RiskLedger,
+    `risk_ledger` if given); lazily loaded detectors' logs are attached by their owner.
+    """
+
+    def __init__(self, session_id, callback=None, sources=None, face_session=None,
+                 voice_log=None, camera_log=None, risk_ledger=None):
+        sources = sources or {}
+        self.session_id = validate_session_id(session_id)
+        self.callback = callback
+        self.created_at = time.time()
+        # Serializes observations pushed into the trackers and guards the pause state.
+        self.lock = threading.RLock()
+        self.bus = None
+        self.journal = None
+        self.started = False
+        self.mouse_tracker = MouseBehaviorTracker(speed_threshold=1500, angle_threshold=90,
+                                                  callback=self._forward("mouse"), source=sources.get("mouse"))
+        self.window_tracker = WindowTracker(poll_interval=0.5, callback=self._forward("window"),
+                                            source=sources.get("window"))
+        self.copy_tracker = CopyTracker(poll_interval=1.0, callback=self._forward("copy"), source=sources.get("copy"))
+        self.peripheral_detector = PeripheralDetector(callback=self._forward("peripheral"),
+                                                      source=sources.get("peripheral"))
+        self.face = face_session if face_session is not None else FaceSession(session_id)
+        self.face.callback = self._forward("face")
+        self._voice_log = voice_log
+        self._camera_log = camera_log
+        self.risk = risk_ledger if risk_ledger is not None else RiskLedger()
+        for name, log in self.loaded_logs().items():
+            log.attach_ledger(self.risk, name)
+        self.status = {
+            "is_paused": False,
+            "pause_reason": None,
+            "last_activity": None
+        }
+        self.ingest_cursor = 0  # Highest agent sequence number applied
+        self.ingest_cursor_lsn = 0  # Journal LSN of the latest ingest_cursor record
+        self.ingest_pending = {}  # seq -> record received ahead of a gap
+
+    def _forward(self, source):
+        if self.callback is None:
+            return None
+        return lambda event: self.callback(self.session_id, source, event)
+
+    def attach(self, bus):
+        """Publish the session's logs to `bus`, tagged with the session ID."""
+        with self.lock:
+            self.bus = bus
+            for name, log in self.loaded_logs().items():
+                log.attach(bus, name, self.session_id)
+
+    def attach_journal(self, journal):
+        """
+        Journal the session's logs, pause state and ingest cursor to `journal` (an
+        EventJournal), first restoring what it recovered for this session: the logs'
+        events, the pause state, the ingest cursor and the risk scores summed from
+        the restored events. Attach before `attach`, so restored events aren't
+        published again.
+        """
+        with self.lock:
+            self.journal = journal
+            journal.open_session(self.session_id)
+            for name, log in self.loaded_logs().items():
+                journal.register(log, self.session_id, name)
+            for name in journal.recovered_logs(self.session_id):
+                if name == "voice" and self._voice_log is None or name == "camera" and self._camera_log is None:
+                    self.log(name)  # Created now, so its events count toward the restored risk
+            state = journal.session_state(self.session_id)
+            if state["status"] is not None:
+                self.status = dict(state["status"])
+            self.ingest_cursor = state["ingest_cursor"]
+            self.restore_risk_scores()
+
+    def restore_risk_scores(self):
+        """
+        Recompute the cumulative risk scores and the risk ledger from the logged events,
+        e.g. after recovery. Lazily loaded detectors' logs are reposted by their owner.
+        """
+        with self.lock:
+            for tracker in (self.window_tracker, self.copy_tracker, self.peripheral_detector):
+                tracker.risk_score = sum(event.get("risk", 0) for event in tracker.event_log)
+            self.face.risk_score = sum(event.get("risk", 0) for event in self.face.risk_events)
+            self.risk.reset()
+            for name, log in self.loaded_logs().items():
+                log.attach_ledger(self.risk, name)
+
+    def _new_log(self, topic, schema):
+        log = EventLog(schema=schema)
+        if self.journal is not None:
+            self.journal.register(log, self.session_id, topic)
+        log.attach_ledger(self.risk, topic)  # Counting what the journal restored
+        if self.bus is not None:
+            log.attach(self.bus, topic, self.session_id)
+        return log
+
+    @property
+    def voice_events(self):
+        with self.lock:
+            if self._voice_log is None:
+                # Imported on first use: voice_detector configures file logging on import.
+                from voice_detector import VOICE_EVENT_SCHEMA
+                self._voice_log = self._new_log("voice", VOICE_EVENT_SCHEMA)
+            log = self._voice_log
+        return log() if callable(log) else log
+
+    @property
+    def camera_events(self):
+        with self.lock:
+            if self._camera_log is None:
+                from camera_detector import CAMERA_EVENT_SCHEMA
+                self._camera_log = self._new_log("camera", CAMERA_EVENT_SCHEMA)
+            log = self._camera_log
+        return log() if callable(log) else log
+
+    def log(self, name):
+        """The session's EventLog for one of LOG_NAMES."""
+        if name == "mouse":
+            return self.mouse_tracker.event_log
+        if name == "window":
+            return self.window_tracker.event_log
+        if name == "copy":
+            return self.copy_tracker.event_log
+        if name == "peripheral":
+            return self.peripheral_detector.event_log
+        if name == "face":
+            return self.face.risk_events
+        if name == "voice":
+            return self.voice_events
+        if name == "camera":
+            return self.camera_events
+        raise KeyError(name)
+
+    def logs(self):
+        """Every log of the session keyed by export name."""
+        return {name: self.log(name) for name in LOG_NAMES}
+
+    def loaded_logs(self):
+        """
+        The logs that exist without loading anything: not the voice/camera logs of
+        lazily loaded detectors, nor ones the session has yet to create.
+        """
+        logs = {name: self.log(name) for name in ("mouse", "window", "copy", "peripheral", "face")}
+        for name, log in (("voice", self._voice_log), ("camera", self._camera_log)):
+            if isinstance(log, EventLog):
+                logs[name] = log
+        return logs
+
+    def record_voice_event(self, event):
+        """Log a voice detection made elsewhere, e.g. by the candidate machine's agent."""
+        self.voice_events.append(event)
+        if self.callback:
+            self.callback(self.session_id, "voice", event)
+
+    def trackers(self):
+        """The input trackers by keyword, as TraceReplayer.run takes them."""
+        return {
+            "mouse_tracker": self.mouse_tracker,
+            "window_tracker": self.window_tracker,
+            "copy_tracker": self.copy_tracker,
+            "peripheral_detector": self.peripheral_detector
+        }
+
+    def start(self):
+        """Start polling/listening on every tracker's live source."""
+        self.started = True
+        for tracker in self.trackers().values():
+            threading.Thread(target=tracker.start, daemon=True).start()
+
+    def stop(self):
+        if self.started:
+            self.started = False
+            for tracker in self.trackers().values():
+                tracker.stop()
+
+    def close(self):
+        """Stop the session for good; a journaled session is not recovered after this."""
+        self.stop()
+        if self.journal is not None:
+            self.journal.close_session(self.session_id)
+
+    def risk_scores(self):
+        """Every tracker's running risk total, from one consistent ledger snapshot."""
+        totals = self.risk.snapshot()["totals"]
+        return {f"{name}_risk": total for name, total in totals.items() if name != "aggregate"}
+
+    def pause(self, reasons):
+        """Pause the exam and return a copy of the new status."""
+        with self.lock:
+            self.status["is_paused"] = True
+            self.status["pause_reason"] = reasons
+            self.status["last_activity"] = datetime.now().isoformat()
+            self._journal_status()
+            return dict(self.status)
+
+    def resume(self):
+        """Resume a paused exam. Returns the new status, or None if it was not paused."""
+        with self.lock:
+            if not self.status["is_paused"]:
+                return None
+            self.status["is_paused"] = False
+            self.status["pause_reason"] = None
+            self._journal_status()
+            return dict(self.status)
+
+    def _journal_status(self):
+        # Caller holds self.lock.
+        if self.journal is not None:
+            self.journal.record_status(self.session_id, dict(self.status))
+
+    def get_status(self):
+        with self.lock:
+            return dict(self.status)
+
+
+class SessionRegistry:
+    """
+    Exam sessions keyed by session ID. Sessions are spread over `shards` dicts, each
+    with its own lock, so creating or removing a session only ever waits on sessions
+    in the same shard, and lookups take no lock at all. Per-session state is guarded
+    by each session's own lock. `factory(session_id, **kwargs)` builds new sessions.
+    """
+
+    def __init__(self, factory=ExamSession, shards=16):
+        self.factory = factory
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, session_id):
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def get(self, session_id):
+        """The session with this ID, or None."""
+        # A single dict lookup is atomic; writers still serialize on the shard lock.
+        return self._shard(session_id)[0].get(session_id)
+
+    def create(self, session_id, **kwargs):
+        """Create and register a session. ValueError if the ID is invalid or in use."""
+        validate_session_id(session_id)
+        sessions, lock = self._shard(session_id)
+        with lock:
+            if session_id in sessions:
+                raise ValueError(f"Session {session_id!r} already exists")
+            session = self.factory(session_id, **kwargs)
+            sessions[session_id] = session
+        logger.info("Created exam session %s", session_id)
+        return session
+
+    def get_or_create(self, session_id, **kwargs):
+        session = self.get(session_id)
+        if session is not None:
+            return session
+        validate_session_id(session_id)
+        sessions, lock = self._shard(session_id)
+        with lock:
+            session = sessions.get(session_id)
+            if session is None:
+                session = self.factory(session_id, **kwargs)
+                sessions[session_id] = session
+                logger.info("Created exam session %s", session_id)
+        return session
+
+    def remove(self, session_id):
+        """Unregister and close a session. Returns it, or None if there was none."""
+        sessions, lock = self._shard(session_id)
+        with lock:
+            session = sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+            logger.info("Removed exam session %s", session_id)
+        return session
+
+    def ids(self):
+        ids = []
+        for sessions, lock in self._shards:
+            with lock:
+                ids.extend(sessions)
+        return ids
+
+    def __iter__(self):
+        sessions = []
+        for shard, lock in self._shards:
+            with lock:
+                sessions.extend(shard.values())
+        return iter(sessions)
+
+    def __len__(self):
+        return sum(len(sessions) for sessions, _ in self._shards)
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
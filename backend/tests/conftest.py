@@ -0,0 +1,10 @@
+"""
+The backend modules import each other as top-level modules, so put backend/ on the
+path; the tests then run from backend/ or the repository root alike.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
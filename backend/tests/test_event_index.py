@@ -0,0 +1,66 @@
+"""
+EventIndex catching up from the logs. Run from backend/:
+    python -m pytest tests
+"""
+import time
+
+from event_bus import EventBus
+from event_index import EventIndex
+from event_log import EventLog
+
+
+def indexed_seqs(index, session_id, tracker):
+    return index._writer.execute("SELECT generation, seq FROM events WHERE session_id = ? AND tracker = ? "
+                                 "ORDER BY generation, seq", (session_id, tracker)).fetchall()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def make_index(tmp_path, logs, queue_size):
+    bus = EventBus()
+    for (session_id, tracker), log in logs.items():
+        log.attach(bus, tracker, session_id)
+    index = EventIndex(str(tmp_path / "events.sqlite3"), bus=bus, queue_size=queue_size, flush_interval=0.05,
+                       sources=lambda: [(session_id, tracker, log) for (session_id, tracker), log in logs.items()])
+    return bus, index
+
+
+def test_dropped_events_are_caught_up_from_the_log(tmp_path):
+    log = EventLog(schema={"timestamp": "float", "risk": "int"})
+    logs = {("seat-1", "window"): log}
+    bus, index = make_index(tmp_path, logs, queue_size=10)
+    # Subscribed but not writing yet, so the bus drops all but the newest 10.
+    index.subscription = bus.subscribe(queue_size=10)
+    for i in range(100):
+        log.append({"timestamp": 1000.0 + i, "risk": 1})
+    assert index.subscription.queue.dropped == 90
+
+    index._index_messages(index._next_batch(0))
+    index.catch_up()
+
+    assert [seq for _, seq in indexed_seqs(index, "seat-1", "window")] == list(range(1, 101))
+    index.close()
+
+
+def test_writer_indexes_each_event_once_across_a_fresh_log(tmp_path):
+    logs = {("seat-1", "copy"): EventLog(schema={"timestamp": "float", "risk": "int"})}
+    bus, index = make_index(tmp_path, logs, queue_size=10)
+    index.start()
+    for i in range(50):
+        logs[("seat-1", "copy")].append({"timestamp": 1000.0 + i, "risk": 1})
+    first = logs[("seat-1", "copy")]
+    logs[("seat-1", "copy")] = first.fresh()
+    for i in range(30):
+        logs[("seat-1", "copy")].append({"timestamp": 2000.0 + i, "risk": 2})
+
+    expected = [(first.generation, seq) for seq in range(1, 51)]
+    expected += [(logs[("seat-1", "copy")].generation, seq) for seq in range(1, 31)]
+    assert wait_for(lambda: index.stats["inserted"] >= len(expected))
+    index.stop()
+    assert indexed_seqs(index, "seat-1", "copy") == expected
+    index.close()
@@ -0,0 +1,91 @@
+"""
+Sequenced ingest of agent batches (event_ingest.ingest_batch). Run from backend/:
+    python -m pytest tests
+"""
+import pytest
+
+from event_ingest import NotDurable, ingest_batch
+from session_registry import ExamSession
+
+
+def clipboard(seq):
+    return {"seq": seq, "kind": "clipboard", "t": 1000.0 + seq, "value": f"copied text {seq}"}
+
+
+def copied(session):
+    """Seqs of the clipboard records the session's copy tracker has logged, in order."""
+    return [int(event["content_preview"].rsplit(" ", 1)[1]) for event in session.log("copy")]
+
+
+class StoppedJournal:
+    """Takes cursor records but never gets them on disk."""
+
+    def __init__(self):
+        self.lsn = 0
+
+    def record_ingest_cursor(self, session_id, cursor):
+        self.lsn += 1
+        return self.lsn
+
+    def wait(self, lsn, timeout=None):
+        return False
+
+
+def test_retried_batch_is_skipped():
+    session = ExamSession("seat-1")
+    batch = [clipboard(seq) for seq in (1, 2, 3)]
+    assert ingest_batch(session, batch) == {"ack": 3, "applied": 3, "duplicates": 0, "deferred": 0, "pending": 0}
+    assert ingest_batch(session, batch + [clipboard(4)])["duplicates"] == 3
+    assert copied(session) == [1, 2, 3, 4]
+
+
+def test_records_past_a_gap_wait_for_it():
+    session = ExamSession("seat-1")
+    result = ingest_batch(session, [clipboard(4), clipboard(3), clipboard(6)])
+    assert result == {"ack": 0, "applied": 0, "duplicates": 0, "deferred": 0, "pending": 3}
+    assert copied(session) == []
+
+    result = ingest_batch(session, [clipboard(2), clipboard(1), clipboard(3)])
+    assert result == {"ack": 4, "applied": 4, "duplicates": 1, "deferred": 0, "pending": 1}
+    assert copied(session) == [1, 2, 3, 4]
+    assert session.ingest_pending.keys() == {6}
+
+
+def test_pending_overflow_is_deferred_for_resending():
+    session = ExamSession("seat-1")
+    result = ingest_batch(session, [clipboard(seq) for seq in (2, 3, 4, 5)], max_pending=2)
+    assert result == {"ack": 0, "applied": 0, "duplicates": 0, "deferred": 2, "pending": 2}
+
+    result = ingest_batch(session, [clipboard(seq) for seq in (1, 4, 5)], max_pending=2)
+    assert result["ack"] == 5
+    assert copied(session) == [1, 2, 3, 4, 5]
+
+
+def test_tracker_failure_keeps_the_cursor_of_applied_records(monkeypatch):
+    session = ExamSession("seat-1")
+    observe = session.copy_tracker.observe
+
+    def failing_observe(text, now):
+        if text.endswith(" 3"):
+            raise RuntimeError("tracker failed")
+        observe(text, now)
+
+    monkeypatch.setattr(session.copy_tracker, "observe", failing_observe)
+    with pytest.raises(RuntimeError):
+        ingest_batch(session, [clipboard(seq) for seq in (1, 2, 3, 4)])
+    assert session.ingest_cursor == 2
+
+    monkeypatch.setattr(session.copy_tracker, "observe", observe)
+    result = ingest_batch(session, [clipboard(seq) for seq in (1, 2, 3, 4)])
+    assert result["ack"] == 4 and result["duplicates"] == 2
+    assert copied(session) == [1, 2, 3, 4]
+
+
+def test_no_ack_until_the_cursor_is_durable():
+    session = ExamSession("seat-1")
+    session.journal = StoppedJournal()
+    with pytest.raises(NotDurable):
+        ingest_batch(session, [clipboard(1), clipboard(2)], durable_timeout=0.01)
+    # The retry applies nothing new but must not ack what is still not on disk.
+    with pytest.raises(NotDurable):
+        ingest_batch(session, [clipboard(1), clipboard(2)], durable_timeout=0.01)
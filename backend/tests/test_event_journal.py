@@ -0,0 +1,113 @@
+"""
+EventJournal recovery. Run from backend/:
+    python -m pytest tests
+"""
+import glob
+import os
+
+from event_journal import EventJournal
+from event_log import EventLog
+
+SCHEMA = {"timestamp": "float", "event": "str"}
+
+
+def open_journal(directory, **kwargs):
+    journal = EventJournal(str(directory), snapshot_interval=0, snapshot_bytes=0, retry_interval=0.01,
+                           **kwargs).open()
+    journal.open_session("seat-1")
+    log = EventLog(schema=SCHEMA)
+    journal.register(log, "seat-1", "copy")
+    return journal, log
+
+
+def recovered_seqs(directory):
+    journal, log = open_journal(directory)
+    seqs = [event["seq"] for event in log]
+    journal.close()
+    return seqs
+
+
+class FailingFile:
+    """A segment file whose next write gets `written` bytes to disk and then fails."""
+
+    def __init__(self, file, written=7, failures=1):
+        self.file = file
+        self.written = written
+        self.failures = failures
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            self.file.write(data[:self.written])
+            self.file.flush()
+            raise OSError("No space left on device")
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_failed_write_is_retried_and_recovered(tmp_path):
+    journal, log = open_journal(tmp_path)
+    log.append({"timestamp": 1.0, "event": "copy"})
+    assert journal.sync(timeout=5)
+    journal._file = FailingFile(journal._file)
+    for i in range(2, 6):
+        log.append({"timestamp": float(i), "event": "copy"})
+    assert journal.sync(timeout=5)
+    assert journal.get_stats()["write_errors"] == 1
+    journal.close()
+
+    assert recovered_seqs(tmp_path) == [1, 2, 3, 4, 5]
+
+
+def test_wait_is_false_while_writes_fail(tmp_path, monkeypatch):
+    journal, log = open_journal(tmp_path)
+    restart_segment = journal._restart_segment
+
+    def failing_restart(first_lsn):
+        # Every new segment fails too, like a full disk.
+        restart_segment(first_lsn)
+        journal._file = FailingFile(journal._file, failures=10 ** 6)
+
+    monkeypatch.setattr(journal, "_restart_segment", failing_restart)
+    journal._file = FailingFile(journal._file, failures=10 ** 6)
+    log.append({"timestamp": 1.0, "event": "copy"})
+    assert not journal.sync(timeout=0.2)
+    assert journal.get_stats()["durable_lsn"] < journal.get_stats()["next_lsn"] - 1
+    journal.close()
+    assert not journal.sync(timeout=0.2)
+
+
+def test_torn_tail_is_ignored_and_later_records_recovered(tmp_path):
+    journal, log = open_journal(tmp_path)
+    for i in range(3):
+        log.append({"timestamp": float(i), "event": "copy"})
+    journal.close()
+    # A crash in the middle of a write.
+    segment = sorted(glob.glob(os.path.join(str(tmp_path), "journal-*.log")))[-1]
+    with open(segment, "ab") as f:
+        f.write(b"\x09\x00\x00\x00torn")
+
+    journal, log = open_journal(tmp_path)
+    assert [event["seq"] for event in log] == [1, 2, 3]
+    log.append({"timestamp": 4.0, "event": "copy"})
+    journal.close()
+
+    assert recovered_seqs(tmp_path) == [1, 2, 3, 4]
+
+
+def test_snapshot_then_replay(tmp_path):
+    journal, log = open_journal(tmp_path, segment_bytes=256)
+    for i in range(20):
+        log.append({"timestamp": float(i), "event": f"copy {i}"})
+    journal.sync()
+    journal.snapshot()
+    for i in range(20, 30):
+        log.append({"timestamp": float(i), "event": f"copy {i}"})
+    journal.close()
+
+    journal, log = open_journal(tmp_path)
+    assert journal.get_stats()["recovery"]["snapshot_logs"] == 1
+    assert [(event["seq"], event["event"]) for event in log] == [(i + 1, f"copy {i}") for i in range(30)]
+    journal.close()
@@ -0,0 +1,424 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+import zipfile
+from array import array
+
+import numpy as np
+
+logger = logging.getLogger("TraceReplay")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+TRACE_VERSION = 1
+
+# Observation kinds whose sources are polled; recorded only when the value changes.
+POLLED_KINDS = ("window", "clipboard", "monitors")
+
+
+class TraceRecorder:
+    """
+    Captures what the trackers' sources observe during a live session so it can be
+    replayed headless. Wrap each source before handing it to its tracker:
+
+        recorder = TraceRecorder()
+        window_tracker = WindowTracker(source=recorder.wrap(Win32WindowSource()))
+        ...
+        recorder.save("session.trace")
+
+    Polled values (window title, clipboard, monitor count) are stored only when they
+    change, which is all the trackers react to; mouse moves go into a packed float
+    array. Optionally the shared microphone and camera streams are recorded too. The
+    trace is one zip: manifest.json, events.jsonl, mouse.npy and any media files.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.events = []  # (offset, kind, payload)
+        self.moves = array("d")  # flattened (offset, x, y)
+        self.media_dir = tempfile.mkdtemp(prefix="trace-media-")
+        self.audio = None  # (path, offset of sample 0, rate)
+        self.video = None  # (path, frame offsets)
+        self.running = True
+        self._last = {}
+        self._threads = []
+        self._lock = threading.Lock()
+
+    # Low-level recording, also used to synthesize traces
+
+    def record(self, kind, timestamp, **payload):
+        with self._lock:
+            if kind in POLLED_KINDS:
+                value = payload["value"]
+                if self._last.get(kind, self) == value:
+                    return
+                self._last[kind] = value
+            self.events.append((timestamp - self.started_at, kind, payload))
+
+    def record_move(self, timestamp, x, y):
+        with self._lock:
+            self.moves.extend((timestamp - self.started_at, x, y))
+
+    # Source wrappers
+
+    def wrap(self, source):
+        """Recording proxy for a WindowTracker, CopyTracker, PeripheralDetector or mouse source."""
+        if hasattr(source, "get_active_window"):
+            return _RecordingWindowSource(self, source)
+        if hasattr(source, "paste"):
+            return _RecordingClipboardSource(self, source)
+        if hasattr(source, "next_device"):
+            return _RecordingPeripheralSource(self, source)
+        if hasattr(source, "start"):
+            return _RecordingMouseSource(self, source)
+        raise TypeError(f"Don't know how to record {type(source).__name__}")
+
+    def record_audio(self, capture, block_seconds=0.5):
+        """Record the shared microphone stream (an AudioCaptureService) to the trace."""
+        subscription = capture.subscribe("trace_recorder")
+        path = os.path.join(self.media_dir, "audio.wav")
+
+        def run():
+            block = int(block_seconds * subscription.rate)
+            with wave.open(path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(subscription.rate)
+                self.audio = (path, capture.sample_time(subscription.cursor) - self.started_at, subscription.rate)
+                while self.running and subscription.active:
+                    samples, _ = subscription.read(block, block, timeout=1.0)
+                    wf.writeframes(samples.tobytes())
+            subscription.close()
+
+        self._start_thread(run, "trace-audio")
+
+    def record_video(self, broker, fps=10):
+        """Record the shared camera stream (a CameraBroker) as MJPG at up to `fps`."""
+        import cv2
+        subscription = broker.subscribe("trace_recorder", max_fps=fps, queue_size=8)
+        path = os.path.join(self.media_dir, "video.avi")
+
+        def run():
+            writer = None
+            offsets = []
+            while self.running:
+                item = subscription.get(timeout=1.0)
+                if item is None:
+                    if not subscription.active:
+                        break
+                    continue
+                frame, timestamp = item
+                if writer is None:
+                    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps,
+                                             (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+                offsets.append(timestamp - self.started_at)
+            if writer is not None:
+                writer.release()
+                self.video = (path, offsets)
+            subscription.close()
+
+        self._start_thread(run, "trace-video")
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def save(self, path):
+        """Stop media recording and write the trace; returns its manifest."""
+        self.running = False
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e[0])
+            moves = np.frombuffer(self.moves, dtype=np.float64).reshape(-1, 3).copy()
+        duration = max([events[-1][0] if events else 0.0, moves[-1, 0] if len(moves) else 0.0])
+        manifest = {
+            "version": TRACE_VERSION,
+            "started_at": self.started_at,
+            "duration": duration,
+            "events": len(events),
+            "mouse_moves": len(moves),
+            "kinds": sorted({kind for _, kind, _ in events})
+        }
+        tmp_path = path + ".tmp"
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+            bundle.writestr("events.jsonl", "".join(
+                json.dumps({"t": round(t, 6), "kind": kind, **payload}) + "\n" for t, kind, payload in events))
+            with bundle.open("mouse.npy", "w") as f:
+                np.save(f, moves)
+            if self.audio is not None:
+                audio_path, offset, rate = self.audio
+                manifest["audio"] = {"offset": offset, "rate": rate}
+                bundle.write(audio_path, "audio.wav")
+            if self.video is not None:
+                video_path, offsets = self.video
+                manifest["video"] = {"frames": len(offsets)}
+                # MJPG frames are already compressed.
+                bundle.write(video_path, "video.avi", compress_type=zipfile.ZIP_STORED)
+                with bundle.open("video_times.npy", "w") as f:
+                    np.save(f, np.array(offsets))
+            bundle.writestr("manifest.json", json.dumps(manifest, indent=2))
+        os.replace(tmp_path, path)
+        shutil.rmtree(self.media_dir, ignore_errors=True)
+        logger.info("Saved trace %s: %d events, %d mouse moves, %.1f s", path,
+                    manifest["events"], manifest["mouse_moves"], duration)
+        return manifest
+
+
+class _RecordingWindowSource:
+    def __init__(self, recorder, source):
+        self.recorder = recorder
+        self.source = source
+
+    def get_active_window(self):
+        title = self.source.get_active_window()
+        self.recorder.record("window", time.time(), value=title)
+        return title
+
+
+class _RecordingClipboardSource:
+    def __init__(self, recorder, source):
+        self.recorder = recorder
+        self.source = source
+
+    def paste(self):
+        text = self.source.paste()
+        self.recorder.record("clipboard", time.time(), value=text)
+        return text
+
+
+class _RecordingPeripheralSource:
+    def __init__(self, recorder, source):
+        self.recorder = recorder
+        self.source = source
+
+    def open(self):
+        self.source.open()
+
+    def close(self):
+        self.source.close()
+
+    def next_device(self, timeout_ms=5000):
+        caption = self.source.next_device(timeout_ms)
+        if caption is not None:
+            self.recorder.record("device", time.time(), value=caption)
+        return caption
+
+    def monitor_count(self):
+        count = self.source.monitor_count()
+        self.recorder.record("monitors", time.time(), value=count)
+        return count
+
+
+class _RecordingMouseSource:
+    def __init__(self, recorder, source):
+        self.recorder = recorder
+        self.source = source
+
+    def start(self, on_move, on_click, on_scroll):
+        recorder = self.recorder
+
+        def move(x, y):
+            now = time.time()
+            recorder.record_move(now, x, y)
+            on_move(x, y, timestamp=now)
+
+        def click(x, y, button, pressed):
+            now = time.time()
+            recorder.record("click", now, x=x, y=y, button=str(button), pressed=pressed)
+            on_click(x, y, button, pressed, timestamp=now)
+
+        def scroll(x, y, dx, dy):
+            now = time.time()
+            recorder.record("scroll", now, x=x, y=y, dx=dx, dy=dy)
+            on_scroll(x, y, dx, dy, timestamp=now)
+
+        self.source.start(move, click, scroll)
+
+    def stop(self):
+        self.source.stop()
+
+
+class TraceReplayer:
+    """
+    Feeds a recorded trace back into trackers through the same methods their live
+    sources drive (observe / on_move / ...), so events flow through the rest of the
+    pipeline (callbacks, dispatcher, event logs, bus) exactly as in a live session.
+    With speed=1.0 observations are delivered at their recorded pace (2.0 is twice as
+    fast); with speed=None they are delivered as fast as the trackers accept them.
+
+    Trackers see "virtual" timestamps that keep the recorded spacing, starting at the
+    moment replay began, so durations, speeds and copy-burst windows behave as they
+    did live at any replay speed. Recorded audio and video are replayed by plugging
+    `audio_source_factory()` into an AudioCaptureService and `video_capture_factory()`
+    into a CameraBroker; those are paced only at speed 1.0.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.path = path
+        self.speed = speed or None
+        self.media_dir = None
+        with zipfile.ZipFile(path) as bundle:
+            self.manifest = json.loads(bundle.read("manifest.json"))
+            if self.manifest.get("version") != TRACE_VERSION:
+                raise ValueError(f"{path}: unsupported trace version {self.manifest.get('version')}")
+            self.events = [json.loads(line) for line in bundle.read("events.jsonl").decode().splitlines()]
+            with bundle.open("mouse.npy") as f:
+                self.moves = np.load(f)
+            media = [name for name in ("audio.wav", "video.avi", "video_times.npy") if name in bundle.namelist()]
+            if media:
+                self.media_dir = tempfile.mkdtemp(prefix="trace-replay-")
+                bundle.extractall(self.media_dir, media)
+        # Merged timeline: indexes below len(events) are events, the rest mouse moves.
+        offsets = np.concatenate([np.array([e["t"] for e in self.events], dtype=np.float64), self.moves[:, 0]])
+        self.order = np.argsort(offsets, kind="stable")
+        self.offsets = offsets[self.order]
+        self.base_time = None
+        self.injected_at = np.full(len(self.order), np.nan)  # perf_counter when each was delivered
+        self.delivered = 0
+        self.running = False
+        self.thread = None
+        self.finished = threading.Event()
+
+    def __len__(self):
+        return len(self.order)
+
+    def run(self, window_tracker=None, copy_tracker=None, peripheral_detector=None, mouse_tracker=None):
+        """Replay the whole trace on this thread; returns the replay stats."""
+        handlers = {
+            "window": window_tracker and (lambda e, t: window_tracker.observe(e["value"], t)),
+            "clipboard": copy_tracker and (lambda e, t: copy_tracker.observe(e["value"], t)),
+            "device": peripheral_detector and (lambda e, t: peripheral_detector.observe_device(e["value"], t)),
+            "monitors": peripheral_detector and (lambda e, t: peripheral_detector.observe_monitors(e["value"], t)),
+            "click": mouse_tracker and (lambda e, t: mouse_tracker.on_click(
+                e["x"], e["y"], e["button"], e["pressed"], timestamp=t)),
+            "scroll": mouse_tracker and (lambda e, t: mouse_tracker.on_scroll(
+                e["x"], e["y"], e["dx"], e["dy"], timestamp=t)),
+        }
+        on_move = mouse_tracker.on_move if mouse_tracker is not None else None
+        if mouse_tracker is not None:
+            mouse_tracker.start_flushing()
+        events, moves, offsets = self.events, self.moves, self.offsets
+        event_count = len(events)
+        self.running = True
+        self.finished.clear()
+        self.base_time = time.time()
+        started = time.perf_counter()
+        logger.info("Replaying %s: %d observations at %s", self.path, len(self.order),
+                    f"{self.speed}x" if self.speed else "full speed")
+        for position, index in enumerate(self.order.tolist()):
+            if not self.running:
+                break
+            offset = offsets[position]
+            if self.speed:
+                delay = started + offset / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            timestamp = self.base_time + offset
+            self.injected_at[position] = time.perf_counter()
+            if index < event_count:
+                event = events[index]
+                handler = handlers.get(event["kind"])
+                if handler:
+                    handler(event, timestamp)
+            elif on_move is not None:
+                _, x, y = moves[index - event_count]
+                on_move(int(x), int(y), timestamp=timestamp)
+            self.delivered = position + 1
+        elapsed = time.perf_counter() - started
+        self.running = False
+        self.finished.set()
+        stats = {
+            "observations": self.delivered,
+            "seconds": round(elapsed, 3),
+            "observations_per_second": round(self.delivered / elapsed, 1) if elapsed > 0 else None,
+            "trace_seconds": self.manifest["duration"]
+        }
+        logger.info("Replay finished: %s", stats)
+        return stats
+
+    def start(self, **trackers):
+        """Replay on a background thread; wait on `finished`."""
+        self.thread = threading.Thread(target=self.run, kwargs=trackers, name="trace-replay", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def injection_time(self, timestamp):
+        """
+        perf_counter at which the observation at virtual `timestamp` was delivered (the first
+        of several at the same instant), else the last one before it.
+        """
+        offset = timestamp - self.base_time
+        # Epoch-sized floats carry ~0.25 us of rounding, so match within a microsecond.
+        position = int(np.searchsorted(self.offsets, offset - 1e-6, side="left"))
+        if position == len(self.offsets) or self.offsets[position] > offset + 1e-6:
+            position -= 1
+        if position < 0:
+            return None
+        value = self.injected_at[position]
+        return None if np.isnan(value) else float(value)
+
+    def audio_source_factory(self, block_size=480):
+        """AudioCaptureService source_factory playing the recorded microphone, or None."""
+        if self.media_dir is None or not os.path.exists(os.path.join(self.media_dir, "audio.wav")):
+            return None
+        from voice_activity import WavFileSource
+        path = os.path.join(self.media_dir, "audio.wav")
+        return lambda: WavFileSource(path, block_size=block_size, realtime=self.speed == 1.0)
+
+    def video_capture_factory(self):
+        """CameraBroker source playing the recorded camera at its recorded frame times, or None."""
+        if self.media_dir is None or not os.path.exists(os.path.join(self.media_dir, "video.avi")):
+            return None
+        path = os.path.join(self.media_dir, "video.avi")
+        frame_offsets = np.load(os.path.join(self.media_dir, "video_times.npy"))
+        return lambda: TraceVideoCapture(path, frame_offsets, realtime=self.speed == 1.0)
+
+    def cleanup(self):
+        if self.media_dir is not None:
+            shutil.rmtree(self.media_dir, ignore_errors=True)
+            self.media_dir = None
+
+
+class TraceVideoCapture:
+    """cv2.VideoCapture look-alike over a recorded video, paced by its recorded frame times."""
+
+    def __init__(self, path, frame_offsets, realtime=True):
+        import cv2
+        self.capture = cv2.VideoCapture(path)
+        self.frame_offsets = frame_offsets
+        self.realtime = realtime
+        self.frames = 0
+        self.started = None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        if self.realtime and self.frames < len(self.frame_offsets):
+            if self.started is None:
+                self.started = time.perf_counter() - self.frame_offsets[0]
+            delay = self.started + self.frame_offsets[self.frames] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.frames += 1
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
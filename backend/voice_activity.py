@@ -0,0 +1,291 @@
+import logging
+import threading
+import time
+import wave
+
+import numpy as np
+
+logger = logging.getLogger("VoiceActivity")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+SPEECH_BAND_HZ = (85, 3400)  # voiced F0 through the telephony band
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size int16 ring of the most recent samples. Writers append blocks from
+    the audio callback; readers address samples by absolute index (samples ever
+    written), so a reader that falls more than `capacity` behind can tell how much
+    it lost and skip ahead.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.written = 0  # absolute index of the next sample
+        self.overruns = 0  # samples overwritten before a reader got to them
+        self.closed = False  # set when the source ends; no more samples will arrive
+        self._cond = threading.Condition()
+
+    def write(self, samples):
+        samples = samples[-self.capacity:]
+        with self._cond:
+            start = self.written % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            self.buffer[:len(samples) - first] = samples[first:]
+            self.written += len(samples)
+            self._cond.notify_all()
+
+    def read(self, start, count):
+        """
+        Copy of samples [start, start + count) that are still in the ring. Returns
+        (samples, actual_start): actual_start is later than `start` if the oldest
+        requested samples were already overwritten.
+        """
+        with self._cond:
+            oldest = max(0, self.written - self.capacity)
+            if start < oldest:
+                self.overruns += oldest - start
+                start = oldest
+            end = min(start + count, self.written)
+            if end <= start:
+                return np.empty(0, dtype=np.int16), start
+            first, last = start % self.capacity, end % self.capacity
+            if first < last:
+                out = self.buffer[first:last].copy()
+            else:
+                out = np.concatenate([self.buffer[first:], self.buffer[:last]])
+            return out, start
+
+    def wait_for(self, index, timeout=None):
+        """Block until sample `index - 1` has been written or the ring is closed. False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.written >= index or self.closed, timeout)
+
+    def close(self):
+        """Mark the stream ended and wake any waiting readers."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class DeviceAudioSource:
+    """Microphone input in PyAudio callback mode: no thread blocks on stream.read."""
+
+    def __init__(self, pa=None, rate=16000, block_size=480, device_index=None):
+        self.pa = pa
+        self.rate = rate
+        self.block_size = block_size
+        self.device_index = device_index
+        self.stream = None
+        self.input_overflows = 0
+
+    def start(self, on_samples, on_end=None):
+        import pyaudio
+        if self.pa is None:
+            self.pa = pyaudio.PyAudio()
+
+        def callback(in_data, frame_count, time_info, status):
+            if status & pyaudio.paInputOverflow:
+                self.input_overflows += 1
+            on_samples(np.frombuffer(in_data, dtype=np.int16))
+            return None, pyaudio.paContinue
+
+        self.stream = self.pa.open(format=pyaudio.paInt16, channels=1, rate=self.rate, input=True,
+                                   frames_per_buffer=self.block_size, input_device_index=self.device_index,
+                                   stream_callback=callback)
+        self.stream.start_stream()
+        logger.info("Audio device stream started at %d Hz.", self.rate)
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+
+class WavFileSource:
+    """
+    Plays a 16-bit WAV file into the same callback a device source uses, so VAD can
+    run headless. Multi-channel files are averaged to mono. With realtime=True blocks
+    are paced at the file's sample rate; otherwise the file is fed as fast as the
+    consumer takes it.
+    """
+
+    def __init__(self, path, block_size=480, realtime=False):
+        self.path = path
+        self.block_size = block_size
+        self.realtime = realtime
+        with wave.open(path, "rb") as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+            self.rate = wf.getframerate()
+            self.channels = wf.getnchannels()
+        self.running = False
+        self.thread = None
+
+    def start(self, on_samples, on_end=None):
+        self.running = True
+
+        def run():
+            started = time.perf_counter()
+            sent = 0
+            with wave.open(self.path, "rb") as wf:
+                while self.running:
+                    data = wf.readframes(self.block_size)
+                    if not data:
+                        break
+                    samples = np.frombuffer(data, dtype=np.int16)
+                    if self.channels > 1:
+                        samples = samples.reshape(-1, self.channels).mean(axis=1).astype(np.int16)
+                    on_samples(samples)
+                    sent += len(samples)
+                    if self.realtime:
+                        delay = started + sent / self.rate - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+            self.running = False
+            if on_end:
+                on_end()
+
+        self.thread = threading.Thread(target=run, name="wav-source", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+def frame_features(samples, rate, frame_length):
+    """
+    Per-frame features for a run of int16 samples, computed for all frames at once
+    (trailing samples that don't fill a frame are ignored):
+
+      energy_db      RMS level in dBFS
+      zcr            zero crossings per sample
+      band_ratio     share of spectral power inside the speech band (85-3400 Hz)
+      flatness       spectral flatness (geometric / arithmetic mean power); ~1 for
+                     noise, low for voiced speech
+    """
+    count = len(samples) // frame_length
+    frames = samples[:count * frame_length].reshape(count, frame_length).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_db = 20 * np.log10(np.maximum(rms, 1e-6))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    spectrum = np.fft.rfft(frames * np.hanning(frame_length).astype(np.float32), axis=1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2 + 1e-12
+    freqs = np.fft.rfftfreq(frame_length, 1.0 / rate)
+    in_band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+    band_ratio = power[:, in_band].sum(axis=1) / power.sum(axis=1)
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return {"energy_db": energy_db, "zcr": zcr, "band_ratio": band_ratio, "flatness": flatness}
+
+
+class VoiceActivityDetector:
+    """
+    Frame-level VAD with hangover smoothing. A frame is speech-like when its energy
+    is `energy_margin_db` above the adaptive noise floor, most of its power is in the
+    speech band, its spectrum is not flat (noise) and its zero-crossing rate is not
+    hiss-like. A segment starts after `min_speech_ms` of consecutive speech-like
+    frames and ends after `hangover_ms` without one, so short pauses between words
+    don't split it. `process` returns the segment start/end transitions it saw.
+    """
+
+    def __init__(self, rate, frame_ms=20, energy_margin_db=12.0, min_energy_db=-55.0,
+                 min_band_ratio=0.6, max_flatness=0.45, max_zcr=0.35,
+                 min_speech_ms=100, hangover_ms=300, noise_adapt=0.05):
+        self.rate = rate
+        self.frame_length = int(rate * frame_ms / 1000)
+        self.frame_seconds = self.frame_length / rate
+        self.energy_margin_db = energy_margin_db
+        self.min_energy_db = min_energy_db
+        self.min_band_ratio = min_band_ratio
+        self.max_flatness = max_flatness
+        self.max_zcr = max_zcr
+        self.min_speech_frames = max(1, round(min_speech_ms / frame_ms))
+        self.hangover_frames = max(1, round(hangover_ms / frame_ms))
+        self.noise_adapt = noise_adapt
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = None
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.segment_start = None
+        self.segment_energy_sum = 0.0
+        self.segment_frames = 0
+        self.frames_seen = 0
+
+    def classify(self, features):
+        """Speech-like flag per frame; updates the noise floor from non-speech frames."""
+        energy_db = features["energy_db"]
+        if self.noise_floor_db is None:
+            # Seed the floor from the quietest frames of the first batch.
+            self.noise_floor_db = float(np.percentile(energy_db, 10)) if len(energy_db) else -90.0
+        speech = ((energy_db > max(self.noise_floor_db + self.energy_margin_db, self.min_energy_db)) &
+                  (features["band_ratio"] >= self.min_band_ratio) &
+                  (features["flatness"] <= self.max_flatness) &
+                  (features["zcr"] <= self.max_zcr))
+        quiet = energy_db[~speech]
+        if len(quiet):
+            self.noise_floor_db += self.noise_adapt * (float(np.median(quiet)) - self.noise_floor_db)
+        return speech
+
+    def process(self, samples, start_index):
+        """
+        Run VAD over whole frames of `samples`, whose first sample has absolute index
+        `start_index`. Returns ([(kind, sample_index, info)], samples_consumed) with
+        kind "start" or "end"; info carries the segment's mean level and duration.
+        """
+        features = frame_features(samples, self.rate, self.frame_length)
+        speech = self.classify(features)
+        transitions = []
+        for i, is_speech in enumerate(speech.tolist()):
+            frame_index = start_index + i * self.frame_length
+            if is_speech:
+                self.speech_run += 1
+                self.silence_run = 0
+                if not self.in_speech and self.speech_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    self.segment_start = frame_index - (self.speech_run - 1) * self.frame_length
+                    self.segment_energy_sum = 0.0
+                    self.segment_frames = 0
+                    transitions.append(("start", self.segment_start, {}))
+            else:
+                self.speech_run = 0
+                if self.in_speech:
+                    self.silence_run += 1
+                    if self.silence_run >= self.hangover_frames:
+                        self.in_speech = False
+                        end = frame_index - (self.silence_run - 1) * self.frame_length
+                        transitions.append(("end", end, {
+                            "start_index": self.segment_start,
+                            "duration": (end - self.segment_start) / self.rate,
+                            "energy_db": self.segment_energy_sum / self.segment_frames if self.segment_frames else None
+                        }))
+            if self.in_speech:
+                self.segment_energy_sum += float(features["energy_db"][i])
+                self.segment_frames += 1
+        self.frames_seen += len(speech)
+        return transitions, len(speech) * self.frame_length
+
+    def finish(self, end_index):
+        """Close a segment still open when the stream ends; returns its "end" transition or None."""
+        if not self.in_speech:
+            return None
+        self.in_speech = False
+        self.speech_run = self.silence_run = 0
+        return ("end", end_index, {
+            "start_index": self.segment_start,
+            "duration": (end_index - self.segment_start) / self.rate,
+            "energy_db": self.segment_energy_sum / self.segment_frames if self.segment_frames else None
+        })
@@ -1,4 +1,3 @@
-import pyaudio
 import numpy as np
 import time
 import threading
@@ -6,26 +5,55 @@ import wave
 import os
 from datetime import datetime
 import logging
+from event_log import EventLog
+from voice_activity import VoiceActivityDetector, WavFileSource
+from audio_capture import AudioCaptureService, get_audio_capture
+from clip_writer import ClipWriter
 
 # Set up logging
 logging.basicConfig(filename='voice_detector.log', level=logging.DEBUG,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+VOICE_EVENT_SCHEMA = {
+    "timestamp": "float", "event": "str", "energy_level": "float", "recording_file": "str",
+    "start_time": "float", "duration": "float", "energy_db": "float"
+}
+
 class VoiceDetector:
-    def __init__(self, callback=None, threshold=0.0002, record_seconds=10):
+    """
+    Voice detection for the exam session. Audio comes from the shared
+    AudioCaptureService, which owns the microphone; this detector never opens the
+    device itself. `start` runs continuous voice activity detection: a VAD thread
+    reads the capture stream, classifies 20 ms frames and logs an event when each
+    speech segment starts and ends. Only speech is persisted: each segment, plus
+    `pre_roll` / `post_roll` seconds around it, is cut from the capture ring and
+    handed to a background ClipWriter. `detect_voice` is the older one-shot check.
+    """
+
+    def __init__(self, callback=None, threshold=0.0002, record_seconds=10, vad_options=None,
+                 pre_roll=1.0, post_roll=1.0, clip_format=None, capture=None):
         self.callback = callback
         self.threshold = threshold
         self.record_seconds = record_seconds
-        self.event_log = []
+        self.event_log = EventLog(schema=VOICE_EVENT_SCHEMA)
         self.is_running = False
-        
-        try:
-            self.p = pyaudio.PyAudio()
-            logging.info("PyAudio initialized successfully")
-        except Exception as e:
-            logging.error(f"Error initializing PyAudio: {str(e)}")
-            self.p = None
-            
+        self.capture = capture  # AudioCaptureService; the process-wide one if None
+
+        # Streaming VAD state
+        self.vad_options = dict(vad_options or {})
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.pending_clips = []  # (first_sample, last_sample, name) awaiting post-roll audio
+        self.audio = None  # capture service the running VAD reads from
+        self.subscription = None
+        self.vad = None
+        self.ring = None
+        self.vad_thread = None
+        self.read_index = 0
+        self.stream_started_at = None
+        self.speaking = False
+        self.segments_detected = 0
+
         self.recordings_dir = os.path.join("static", "recordings")
         
         try:
@@ -35,102 +63,74 @@ class VoiceDetector:
         except Exception as e:
             logging.error(f"Error creating recordings directory: {str(e)}")
 
+        self.clip_writer = ClipWriter(self.recordings_dir, clip_format)
+
+    def _get_capture(self):
+        return self.capture if self.capture is not None else get_audio_capture()
+
+    def _record(self, name, seconds, stop_on_silence=False):
+        """Read `seconds` of audio from the capture service; returns (int16 samples, rate)"""
+        subscription = self._get_capture().subscribe(name)
+        try:
+            rate = subscription.rate
+            chunk = 1024
+            silent_chunks = 0
+            max_silent_chunks = int(rate / chunk * 2)  # 2 seconds of allowed silence
+            blocks = []
+            for _ in range(0, int(rate / chunk * seconds)):
+                samples, _ = subscription.read(chunk, chunk, timeout=1.0)
+                if not len(samples):
+                    if not subscription.active:
+                        break
+                    continue
+                blocks.append(samples)
+                if stop_on_silence:
+                    # Real-time energy analysis
+                    if np.abs(samples).mean() < self.threshold * 32767:
+                        silent_chunks += 1
+                        if silent_chunks > max_silent_chunks:
+                            logging.info("Too much silence, stopping early")
+                            break
+                    else:
+                        silent_chunks = 0
+            return (np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int16)), rate
+        finally:
+            subscription.close()
+
     def calibrate_threshold(self, calibration_seconds=3):
         """Calibrate the threshold based on ambient noise"""
-        if self.p is None:
-            return
-            
-        FORMAT = pyaudio.paInt16
-        CHANNELS = 1
-        RATE = 44100
-        CHUNK = 1024
-        
         try:
-            stream = self.p.open(format=FORMAT,
-                                channels=CHANNELS,
-                                rate=RATE,
-                                input=True,
-                                frames_per_buffer=CHUNK)
-            frames = []
-            
-            for _ in range(0, int(RATE / CHUNK * calibration_seconds)):
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                frames.append(data)
-                
-            audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
+            audio_data, _ = self._record("voice_calibration", calibration_seconds)
+            if not len(audio_data):
+                logging.error("Calibration failed: no audio captured")
+                return
             energy = np.abs(audio_data).mean()
             self.threshold = (energy / 32767) * 1.5  # 1.5x ambient noise
             logging.info(f"Calibrated threshold to {self.threshold}")
-            
-            stream.stop_stream()
-            stream.close()
-            
         except Exception as e:
             logging.error(f"Calibration failed: {str(e)}")
 
     def detect_voice(self):
         """Record audio and detect voice with dynamic silence detection"""
-        if self.p is None:
-            return False, None
-            
-        FORMAT = pyaudio.paInt16
-        CHANNELS = 1
-        RATE = 44100
-        CHUNK = 1024
-        frames = []
-        silent_frames = 0
-        max_silent_frames = int(RATE / CHUNK * 2)  # 2 seconds of allowed silence
-        
+        logging.info("Recording started with dynamic silence detection")
+        print("Recording... Speak now")
         try:
-            stream = self.p.open(format=FORMAT,
-                                channels=CHANNELS,
-                                rate=RATE,
-                                input=True,
-                                frames_per_buffer=CHUNK)
-            
-            logging.info("Recording started with dynamic silence detection")
-            print("Recording... Speak now")
-            
-            for _ in range(0, int(RATE / CHUNK * self.record_seconds)):
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                frames.append(data)
-                
-                # Real-time energy analysis
-                audio_chunk = np.frombuffer(data, dtype=np.int16)
-                chunk_energy = np.abs(audio_chunk).mean()
-                
-                if chunk_energy < self.threshold * 32767:
-                    silent_frames += 1
-                    if silent_frames > max_silent_frames:
-                        logging.info("Too much silence, stopping early")
-                        break
-                else:
-                    silent_frames = 0
-                    
-            stream.stop_stream()
-            stream.close()
-
+            audio_data, rate = self._record("detect_voice", self.record_seconds, stop_on_silence=True)
         except Exception as e:
             logging.error(f"Recording error: {str(e)}")
             return False, None
+        if not len(audio_data):
+            return False, None
 
-        # Save recording
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"voice_{timestamp}.wav"
-        filepath = os.path.join(self.recordings_dir, filename)
-        
         try:
-            with wave.open(filepath, 'wb') as wf:
-                wf.setnchannels(CHANNELS)
-                wf.setsampwidth(self.p.get_sample_size(FORMAT))
-                wf.setframerate(RATE)
-                wf.writeframes(b''.join(frames))
-                
-            audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
             energy = np.abs(audio_data).mean()
             has_voice = energy > self.threshold * 32767
-            
+
+            # Only recordings with voice are kept, written off this thread.
+            filename = None
             if has_voice:
+                self.clip_writer.start()
+                filename = self.clip_writer.submit(audio_data, rate, f"voice_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
                 event = {
                     "timestamp": time.time(),
                     "event": "Human Voice Detected",
@@ -146,3 +146,166 @@ class VoiceDetector:
         except Exception as e:
             logging.error(f"Saving/Analysis error: {str(e)}")
             return False, None
+
+    # Streaming voice activity detection
+
+    def start(self, source=None):
+        """
+        Start continuous VAD on the shared capture service, or on a private one
+        wrapping `source` (e.g. a WavFileSource) if given.
+        """
+        if self.is_running:
+            return
+        self.audio = AudioCaptureService(source_factory=lambda: source) if source is not None else self._get_capture()
+        self.subscription = self.audio.subscribe("voice_detector")
+        if not self.subscription.active:
+            logging.error("Cannot start voice activity detection: no audio input")
+            self.subscription.close()
+            return
+        self.vad = VoiceActivityDetector(self.audio.rate, **self.vad_options)
+        self.ring = self.audio.ring  # Clips are cut from the shared capture ring.
+        self.read_index = self.subscription.cursor
+        self.speaking = False
+        self.pending_clips = []
+        self.stream_started_at = self.audio.started_at  # sample index 0 on the capture clock
+        self.clip_writer.start()
+        self.is_running = True
+        self.vad_thread = threading.Thread(target=self._vad_loop, daemon=True)
+        self.vad_thread.start()
+        logging.info("Voice activity detection started")
+
+    def stop(self):
+        self.is_running = False
+        if self.vad_thread is not None:
+            self.vad_thread.join()
+            self.vad_thread = None
+        self.clip_writer.stop()
+        logging.info("Voice activity detection stopped")
+
+    def _vad_loop(self):
+        # Wake every 5 frames (100 ms); take up to 50 frames at once when behind.
+        batch = self.vad.frame_length * 5
+        pending = np.empty(0, dtype=np.int16)  # samples short of a whole frame
+        while self.is_running and self.subscription.active:
+            samples, start = self.subscription.read(batch, batch * 10, timeout=0.5)
+            if not len(samples):
+                continue
+            if start != self.read_index + len(pending):
+                # Fell behind the ring and lost audio; restart framing at what we got.
+                pending = np.empty(0, dtype=np.int16)
+                self.read_index = start
+            pending = np.concatenate([pending, samples])
+            first = self.read_index
+            self.process_samples(pending, first)
+            pending = pending[self.read_index - first:]
+            self._flush_clips()
+        self._finish_segment(self.read_index + len(pending))
+        self._flush_clips(force=True)
+        self.subscription.close()
+        self.is_running = False
+
+    def _flush_clips(self, force=False):
+        """Cut clips whose post-roll audio is in the ring (all of them if force) and queue them"""
+        waiting = []
+        for first, last, name in self.pending_clips:
+            if last > self.ring.written and not force:
+                waiting.append((first, last, name))
+                continue
+            samples, _ = self.ring.read(first, last - first)
+            if len(samples):
+                self.clip_writer.submit(samples, self.vad.rate, name)
+        self.pending_clips = waiting
+
+    def process_samples(self, samples, start_index):
+        """Run VAD over int16 `samples` starting at absolute sample `start_index`"""
+        transitions, consumed = self.vad.process(samples, start_index)
+        self.read_index = start_index + consumed
+        for kind, index, info in transitions:
+            self._emit_transition(kind, index, info)
+
+    def _finish_segment(self, end_index):
+        transition = self.vad.finish(end_index)
+        if transition:
+            self._emit_transition(*transition)
+
+    def _emit_transition(self, kind, index, info):
+        rate = self.vad.rate
+        timestamp = self.stream_started_at + index / rate
+        if kind == "start":
+            self.speaking = True
+            event = {"timestamp": timestamp, "event": "Voice segment started"}
+        else:
+            self.speaking = False
+            self.segments_detected += 1
+            start_time = timestamp - info["duration"]
+            event = {
+                "timestamp": timestamp,
+                "event": "Voice segment ended",
+                "start_time": start_time,
+                "duration": info["duration"]
+            }
+            if self.ring is not None:
+                # The clip is written once post_roll seconds more audio have arrived.
+                name = "voice_" + datetime.fromtimestamp(start_time).strftime("%Y%m%d_%H%M%S_%f")[:-3]
+                first = max(0, info["start_index"] - int(self.pre_roll * rate))
+                self.pending_clips.append((first, index + int(self.post_roll * rate), name))
+                event["recording_file"] = f"{name}.{self.clip_writer.format}"
+            if info["energy_db"] is not None:
+                event["energy_db"] = info["energy_db"]
+        self.event_log.append(event)
+        logging.info(f"{event['event']} at {timestamp:.2f}")
+        if self.callback:
+            self.callback(event)
+
+    def analyze_file(self, path):
+        """Run VAD over a WAV file synchronously, without threads; returns the events it logged"""
+        if self.is_running:
+            raise RuntimeError("analyze_file cannot run while streaming VAD is active")
+        source = WavFileSource(path)
+        self.vad = VoiceActivityDetector(source.rate, **self.vad_options)
+        self.ring = None  # No clips: the file is the recording.
+        self.stream_started_at = time.time()
+        self.read_index = 0
+        first_seq = self.event_log.last_seq
+        with wave.open(path, "rb") as wf:
+            pending = np.empty(0, dtype=np.int16)
+            while True:
+                data = wf.readframes(source.rate)
+                if not data:
+                    break
+                samples = np.frombuffer(data, dtype=np.int16)
+                if source.channels > 1:
+                    samples = samples.reshape(-1, source.channels).mean(axis=1).astype(np.int16)
+                pending = np.concatenate([pending, samples])
+                start = self.read_index
+                self.process_samples(pending, start)
+                pending = pending[self.read_index - start:]
+        self._finish_segment(self.read_index + len(pending))
+        return self.event_log.since(first_seq)[0]
+
+    def get_status(self):
+        return {
+            "running": self.is_running,
+            "speaking": self.speaking,
+            "segments_detected": self.segments_detected,
+            "noise_floor_db": self.vad.noise_floor_db if self.vad else None,
+            "audio_lost_seconds": self.subscription.get_stats()["lost_seconds"] if self.subscription else 0,
+            "pending_clips": len(self.pending_clips),
+            "clips": self.clip_writer.get_stats()
+        }
+
+
+if __name__ == '__main__':
+    import sys
+    detector = VoiceDetector(callback=print)
+    if len(sys.argv) > 1:
+        # Headless: python voice_detector.py recording.wav
+        for event in detector.analyze_file(sys.argv[1]):
+            print(event)
+    else:
+        detector.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            detector.stop()
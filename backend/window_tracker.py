@@ -1,16 +1,29 @@
 import time
 import threading
 import logging
-import win32gui
+from event_log import EventLog
+
+
+class Win32WindowSource:
+    """Foreground window title from the Win32 API (the default WindowTracker source)."""
+
+    def get_active_window(self):
+        import win32gui  # Windows only; imported here so the tracker can run from other sources.
+        hwnd = win32gui.GetForegroundWindow()
+        return win32gui.GetWindowText(hwnd)
 
 
 class WindowTracker:
-    def __init__(self, poll_interval=0.5, callback=None):
+    def __init__(self, poll_interval=0.5, callback=None, source=None):
         self.poll_interval = poll_interval
         self.callback = callback
+        # Anything with get_active_window() -> title; see trace_replay for recorded sessions.
+        self.source = source if source is not None else Win32WindowSource()
         self.current_window = None
         self.current_start_time = None
-        self.event_log = []
+        self.event_log = EventLog(schema={
+            "timestamp": "float", "window": "str", "duration": "float", "risk": "int", "details": "str"
+        })
         self.running = False
         self.risk_score = 0
         self.logger = logging.getLogger("WindowTracker")
@@ -22,48 +35,47 @@ class WindowTracker:
             self.logger.addHandler(handler)
 
     def get_active_window(self):
-        hwnd = win32gui.GetForegroundWindow()
-        return win32gui.GetWindowText(hwnd)
+        return self.source.get_active_window()
+
+    def observe(self, active_window, now):
+        """Process one observation of the foreground window title taken at time `now`."""
+        # Initialization: first run.
+        if self.current_window is None:
+            self.current_window = active_window
+            self.current_start_time = now
+
+        # When a window change is detected.
+        if active_window.lower() != self.current_window.lower():
+            duration = now - self.current_start_time
+            # Calculate duration risk: +10 points for every 20 seconds.
+            duration_risk = int(duration // 20) * 10
+            # Tab switch risk: +20 points.
+            switch_risk = 20
+            total_risk = switch_risk + duration_risk
+
+            # Update risk score.
+            self.risk_score += total_risk
+
+            event = {
+                "timestamp": self.current_start_time,
+                "window": self.current_window,
+                "duration": duration,
+                "risk": total_risk,
+                "details": f"Tab switch risk +{switch_risk}, Duration risk +{duration_risk}"
+            }
+            self.event_log.append(event)
+            self.logger.info("Window changed: '%s' was active for %.2f seconds; risk +%d",
+                             self.current_window, duration, total_risk)
+            if self.callback:
+                self.callback(event)
+
+            # Update for new window.
+            self.current_window = active_window
+            self.current_start_time = now
 
     def _poll(self):
         while self.running:
-            active_window = self.get_active_window()
-            now = time.time()
-
-            # Initialization: first run.
-            if self.current_window is None:
-                self.current_window = active_window
-                self.current_start_time = now
-
-            # When a window change is detected.
-            if active_window.lower() != self.current_window.lower():
-                duration = now - self.current_start_time
-                # Calculate duration risk: +10 points for every 20 seconds.
-                duration_risk = int(duration // 20) * 10
-                # Tab switch risk: +20 points.
-                switch_risk = 20
-                total_risk = switch_risk + duration_risk
-
-                # Update risk score.
-                self.risk_score += total_risk
-
-                event = {
-                    "timestamp": self.current_start_time,
-                    "window": self.current_window,
-                    "duration": duration,
-                    "risk": total_risk,
-                    "details": f"Tab switch risk +{switch_risk}, Duration risk +{duration_risk}"
-                }
-                self.event_log.append(event)
-                self.logger.info("Window changed: '%s' was active for %.2f seconds; risk +%d",
-                                 self.current_window, duration, total_risk)
-                if self.callback:
-                    self.callback(event)
-
-                # Update for new window.
-                self.current_window = active_window
-                self.current_start_time = now
-
+            self.observe(self.get_active_window(), time.time())
             time.sleep(self.poll_interval)
 
     def start(self):